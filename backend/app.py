@@ -8,22 +8,25 @@ Request for Proposal (RFP) documents. It integrates with Azure Cosmos DB, Azure
 """
 
 # Standard library imports
+import hashlib
+import importlib
 import os
+import threading
 
 # Third-party imports
-from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, make_response, request
+from flask import Flask, Response, g, jsonify, make_response, request, stream_with_context
 from flask_cors import CORS
 
 # Local imports
-from chat import run_interaction
-from extraction import get_extraction_progress, start_extraction_thread
-from global_vars import get_all_rfps
-from response import respond_to_requirement
-from search import search
-from upload import process_rfp
+# Route modules (chat, upload, extraction, ...) pull in LangChain, NumPy and the Azure SDKs, so they
+# are imported inside the routes that need them rather than at startup; see ROUTE_MODULES.
+from global_vars import get_all_rfps, get_drafting_job
+from json_responses import compress_response, configure_json, parse_fields, parse_pagination
+from common.cosmos_usage import usage_stats
 from common.cosmosdb import CosmosDBManager
+from common.lazy import LazyClient
+from common.metrics import finish_request, render_metrics, start_request
 
 
 
@@ -32,29 +35,62 @@ load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Content-Range", "Accept-Ranges", "ETag"])
+configure_json(app)
 
 
+@app.after_request
+def compress(response):
+    """Compress large JSON responses for clients that accept gzip or Brotli."""
+    return compress_response(response, request.headers.get("Accept-Encoding", ""))
 
 
-# # Azure Blob Storage configuration
-# STORAGE_ACCOUNT_CONNECTION_STRING = os.getenv("STORAGE_ACCOUNT_CONNECTION_STRING")
-# STORAGE_ACCOUNT_CONTAINER = "rfp"
-# STORAGE_ACCOUNT_RESUME_CONTAINER = os.getenv("STORAGE_ACCOUNT_RESUME_CONTAINER")
+@app.before_request
+def start_request_metrics():
+    """Count the request as in progress under its route pattern (e.g. /resume), not its URL."""
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.metrics_started_at = start_request(g.metrics_route)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request duration once the response is fully sent, so streamed responses count in full."""
+    route, method, started_at = g.metrics_route, request.method, g.metrics_started_at
+    response.call_on_close(lambda: finish_request(route, method, response.status_code, started_at))
+    return response
+
+
+
+
+# Azure Blob Storage configuration
+STORAGE_ACCOUNT_RESUME_CONTAINER = os.getenv("STORAGE_ACCOUNT_RESUME_CONTAINER")
 
 # Azure OpenAI configuration
 AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 
-# # Initialize Azure clients
-# blob_service_client = BlobServiceClient.from_connection_string(STORAGE_ACCOUNT_CONNECTION_STRING)
-# blob_container_client = blob_service_client.get_container_client(STORAGE_ACCOUNT_CONTAINER)
-# blob_resume_container_client = blob_service_client.get_container_client(STORAGE_ACCOUNT_RESUME_CONTAINER)
+cosmos_manager = LazyClient(CosmosDBManager)
+
+# Modules imported lazily by the routes. Unless PRELOAD_ROUTE_MODULES is "false" they are imported in
+# a background thread once the app is created, so the server accepts requests immediately and the
+# first request to a route usually finds its module already loaded.
+ROUTE_MODULES = ["blob_responses", "chat", "dedup", "drafting", "extraction", "requirements_view",
+                 "response", "search", "upload"]
+PRELOAD_ROUTE_MODULES = os.getenv("PRELOAD_ROUTE_MODULES", "true").lower() == "true"
 
 
+def preload_route_modules():
+    """Import the route modules ahead of their first request."""
+    for module_name in ROUTE_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Error preloading module {module_name}: {str(e)}")
 
-cosmos_manager = CosmosDBManager()
+
+if PRELOAD_ROUTE_MODULES:
+    threading.Thread(target=preload_route_modules, name="preload-route-modules", daemon=True).start()
 
 
 # Global variables
@@ -114,8 +150,11 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
     
     try:
-        file_content = file.read()
-        return process_rfp(file_content, file.filename)
+        # Pass the upload stream through so the file is streamed to storage in blocks instead of
+        # being read into memory. stream_with_context keeps the request (and its file) open while
+        # the response generator runs.
+        from upload import process_rfp
+        return Response(stream_with_context(process_rfp(file.stream, file.filename)))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -126,73 +165,114 @@ def run():
     user_message = data['message']
     rfp_name = data['rfp_name']
     print(f"User Message: {user_message}, RFP Name: {rfp_name}")
+    from chat import run_interaction
     return Response(run_interaction(user_message, rfp_name), mimetype='text/event-stream')
 
 @app.route('/get-rfp-sections', methods=['GET'])
 def get_rfp_sections():
-    """Get sections of a specific RFP."""
+    """
+    Get sections of a specific RFP.
+
+    Supports pagination with `offset` and `limit`, and `fields` (a comma-separated subset of
+    `content` and `requirements`) to leave large fields out of the payload.
+    """
     rfp_name = request.args.get('rfp_name')
     if not rfp_name:
         return jsonify({"error": "RFP name is required"}), 400
 
     try:
-        query = f"SELECT * FROM c WHERE c.partitionKey = '{rfp_name}'"
-        items = cosmos_manager.query_items(query)
-        
-        if not items:
+        offset, limit = parse_pagination(request.args)
+        fields = parse_fields(request.args, ["content", "requirements"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Only project the requested fields so Cosmos DB does not ship unused section content
+        projection = ["c.section_id"]
+        if "content" in fields:
+            projection.append("c.section_content")
+        if "requirements" in fields:
+            projection.append("c.requirements.output")
+        conditions = ["IS_DEFINED(c.section_id)", "IS_DEFINED(c.section_content)", "c.section_content != ''"]
+
+        if limit is None:
+            # An offset skips sections in the same order as pages do
+            items = cosmos_manager.query_partition(rfp_name, ", ".join(projection), conditions=conditions,
+                                                   suffix="ORDER BY c.id" if offset else "")
+            total = len(items)
+            items = items[offset:]
+        else:
+            # Pages need a stable order, or consecutive pages may repeat or skip sections; the id is
+            # unique and range-indexed by default, so no composite index is needed
+            items = cosmos_manager.query_partition(rfp_name, ", ".join(projection), conditions=conditions,
+                                                   parameters={"@offset": offset, "@limit": limit},
+                                                   suffix="ORDER BY c.id OFFSET @offset LIMIT @limit")
+            total = cosmos_manager.count_partition(rfp_name, conditions=conditions)
+
+        if not total:
             return jsonify({"error": "No sections found for the specified RFP"}), 404
-        
+
         sections = []
         for item in items:
-            section_id = item.get('section_id')
-            section_content = item.get('section_content')
-            
-            if section_id and section_content:
-                section = {
-                    "section_id": section_id,
-                    "content": section_content,
-                    "requirements": []
-                }
-                
-                requirements = item.get('requirements', {}).get('output', [])
-                for req in requirements:
-                    if isinstance(req, dict):
-                        section["requirements"].append({
-                            "section_name": req.get('section_name', ''),
-                            "page_number": req.get('page_number', ''),
-                            "section_number": req.get('section_number', ''),
-                            "content": req.get('content', ''),
-                            "is_requirement": req.get('is_requirement', 'no')
-                        })
-                
-                sections.append(section)
-        
-        return jsonify({"sections": sections}), 200
+            section = {"section_id": item['section_id']}
+            if "content" in fields:
+                section["content"] = item['section_content']
+            if "requirements" in fields:
+                section["requirements"] = [{
+                    "section_name": req.get('section_name', ''),
+                    "page_number": req.get('page_number', ''),
+                    "section_number": req.get('section_number', ''),
+                    "content": req.get('content', ''),
+                    "is_requirement": req.get('is_requirement', 'no')
+                } for req in item.get('output') or [] if isinstance(req, dict)]
+            sections.append(section)
+
+        return jsonify({"sections": sections, "total": total, "offset": offset, "limit": limit}), 200
     except Exception as e:
         print(f"Error fetching RFP sections: {str(e)}")
         return jsonify({"error": "An error occurred while fetching RFP sections"}), 500
 
 @app.route('/get-requirements', methods=['GET'])
 def get_requirements():
-    """Get requirements for a specific RFP."""
+    """
+    Get requirements for a specific RFP from its requirements view.
+
+    Supports filtering by `section_id`, `section_name` and `page_number`, pagination with `offset`
+    and `limit`, and `unique=true` to return the deduplicated canonical requirements instead.
+    """
     rfp_name = request.args.get('rfp_name')
     if not rfp_name:
         return jsonify({"error": "RFP name is required"}), 400
 
     try:
-        query = f"SELECT c.requirements.output FROM c WHERE c.partitionKey = '{rfp_name}'"
-        items = cosmos_manager.query_items(query)
-        
-        if not items:
+        offset, limit = parse_pagination(request.args)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+
+    try:
+        if request.args.get('unique', '').lower() == 'true':
+            from dedup import get_canonical_requirements
+            canonical_requirements = get_canonical_requirements(rfp_name)
+            if canonical_requirements is None:
+                return jsonify({"error": "No deduplicated requirements found for the specified RFP"}), 404
+            return jsonify({"requirements": canonical_requirements}), 200
+
+        from requirements_view import query_requirements
+        result = query_requirements(
+            rfp_name,
+            section_id=request.args.get('section_id'),
+            section_name=request.args.get('section_name'),
+            page_number=request.args.get('page_number'),
+            offset=offset,
+            limit=limit
+        )
+        if not result["section_count"]:
             return jsonify({"error": "No requirements found for the specified RFP"}), 404
-        
-        all_requirements = []
-        for item in items:
-            if 'output' in item:
-                requirements = [req for req in item['output'] if req.get('is_requirement') == 'yes']
-                all_requirements.extend(requirements)
-        
-        return jsonify({"requirements": all_requirements}), 200
+
+        # The view only changes when it is rebuilt, so its timestamp and the query identify the payload
+        response = jsonify(result)
+        response.set_etag(hashlib.sha1(f"{result['updated_at']}?{request.query_string.decode()}".encode("utf-8")).hexdigest())
+        return response.make_conditional(request)
     except Exception as e:
         print(f"Error fetching requirements: {str(e)}")
         return jsonify({"error": "An error occurred while fetching requirements"}), 500
@@ -209,8 +289,7 @@ def update_requirements():
         return jsonify({"error": "Missing required data"}), 400
 
     try:
-        query = f"SELECT * FROM c WHERE c.partitionKey = '{rfp_name}' AND c.section_id = '{section_id}'"
-        items = cosmos_manager.query_items(query)
+        items = cosmos_manager.query_partition(rfp_name, equals={"section_id": section_id})
 
         if not items:
             return jsonify({"error": "Section not found"}), 404
@@ -220,6 +299,8 @@ def update_requirements():
         doc['reviewed'] = True
 
         cosmos_manager.update_item(doc['id'], doc, doc['partitionKey'])
+        from requirements_view import update_section_view
+        update_section_view(rfp_name, section_id, requirements)
 
         return jsonify({"message": "Requirements updated and section marked as reviewed"}), 200
 
@@ -238,6 +319,7 @@ def response_to_requirement():
         return jsonify({"error": "Requirement is required"}), 400
 
     try:
+        from response import respond_to_requirement
         return Response(respond_to_requirement(user_message, requirement), mimetype='text/event-stream')
     except Exception as e:
         print(f"Error generating response: {str(e)}")
@@ -252,13 +334,10 @@ def get_progress():
         return jsonify({"error": "No RFP name provided"}), 400
     
     try:
-        total_query = f"SELECT VALUE COUNT(1) FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.section_content)"
-        extracted_query = f"SELECT VALUE COUNT(1) FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.requirements) AND IS_DEFINED(c.section_content)"
-        reviewed_query = f"SELECT VALUE COUNT(1) FROM c WHERE c.partitionKey = '{rfp_name}' AND c.reviewed = true AND IS_DEFINED(c.section_content)"
-
-        total_count = cosmos_manager.query_items(total_query)[0]
-        extracted_count = cosmos_manager.query_items(extracted_query)[0]
-        reviewed_count = cosmos_manager.query_items(reviewed_query)[0]
+        is_section = "IS_DEFINED(c.section_content)"
+        total_count = cosmos_manager.count_partition(rfp_name, conditions=[is_section])
+        extracted_count = cosmos_manager.count_partition(rfp_name, conditions=["IS_DEFINED(c.requirements)", is_section])
+        reviewed_count = cosmos_manager.count_partition(rfp_name, equals={"reviewed": True}, conditions=[is_section])
 
         extraction_progress = (extracted_count / total_count) * 100 if total_count > 0 else 0
         review_progress = (reviewed_count / total_count) * 100 if total_count > 0 else 0
@@ -281,11 +360,8 @@ def get_rfp_analysis():
         return jsonify({"error": "RFP name is required"}), 400
     
     try:
-        query = "SELECT c.skills_and_experience FROM c WHERE c.partitionKey = @rfp_name"
-        print("Query:", query)
-
-        parameters = [{"name": "@rfp_name", "value": rfp_name}]
-        items = cosmos_manager.query_items(query, parameters)
+        items = cosmos_manager.query_partition(rfp_name, "c.skills_and_experience",
+                                               conditions=["IS_DEFINED(c.skills_and_experience)"])
         for item in items:
             print(item)
             if 'skills_and_experience' in item:
@@ -307,6 +383,7 @@ def search_employees():
         return jsonify({"error": "RFP name is required"}), 400
 
     try:
+        from search import search
         results = search(rfp_name, feedback)
         return jsonify({"results": results}), 200
     except Exception as e:
@@ -315,35 +392,37 @@ def search_employees():
 
 @app.route('/resume', methods=['GET'])
 def get_resume():
-    """Get a resume PDF file."""
-    resume_name = request.args.get('resumeName')[:-4] + 'pdf'
-  
-    blob_client = blob_resume_container_client.get_blob_client('pdf/' + resume_name)
-    download_stream = blob_client.download_blob()
-    file_content = download_stream.readall()
-    
-    if file_content:
-        response = make_response(file_content)
-        response.headers['Content-Type'] = 'application/pdf'
-        return response
-    else:
+    """Get a resume PDF file, streamed with Range and ETag support."""
+    resume_name = request.args.get('resumeName')
+    if not resume_name:
+        return jsonify({"error": "Resume name is required"}), 400
+    resume_name = resume_name[:-4] + 'pdf'
+
+    try:
+        from blob_responses import blob_response
+        return blob_response(STORAGE_ACCOUNT_RESUME_CONTAINER, ['pdf/' + resume_name], 'application/pdf')
+    except Exception as e:
+        print(f"Error downloading resume: {str(e)}")
         return make_response('Failed to download file', 500)
-    
 
 
 @app.route('/download', methods=['GET'])
 def download_resume():
+    """Download a resume document, streamed with Range and ETag support."""
     resume_name = request.args.get('resumeName')
-  
-    blob_client = blob_resume_container_client.get_blob_client('processed/' + resume_name)
-    download_stream = blob_client.download_blob()
-    file_content = download_stream.readall()
-    
-    if file_content:
-        response = make_response(file_content)
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        return response
-    else:
+    if not resume_name:
+        return jsonify({"error": "Resume name is required"}), 400
+
+    try:
+        # The indexer now leaves resumes in 'source/'; older deployments moved them to 'processed/'
+        from blob_responses import blob_response
+        return blob_response(
+            STORAGE_ACCOUNT_RESUME_CONTAINER,
+            ['source/' + resume_name, 'processed/' + resume_name],
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        )
+    except Exception as e:
+        print(f"Error downloading resume: {str(e)}")
         return make_response('Failed to download file', 500)
 
 
@@ -355,6 +434,7 @@ def start_extraction():
     if not rfp_name:
         return jsonify({"error": "No RFP name provided"}), 400
     
+    from extraction import start_extraction_thread
     start_extraction_thread(rfp_name)
     
     return jsonify({
@@ -368,11 +448,80 @@ def extraction_progress():
     if not rfp_name:
         return jsonify({"error": "No RFP name provided"}), 400
     
+    from extraction import get_extraction_progress
     progress = get_extraction_progress(rfp_name)
     
     return jsonify({
         "progress": progress
     }), 200
 
+@app.route('/start-drafting', methods=['POST'])
+def start_drafting():
+    """Start drafting responses to all requirements of an RFP in the background."""
+    data = request.json
+    rfp_name = data.get('rfp_name')
+    user_message = data.get('user_message', '')
+
+    if not rfp_name:
+        return jsonify({"error": "No RFP name provided"}), 400
+
+    try:
+        if not cosmos_manager.count_partition(rfp_name, conditions=["IS_DEFINED(c.section_content)"]):
+            return jsonify({"error": "No sections found for the specified RFP"}), 404
+    except Exception as e:
+        print(f"Error checking sections for drafting: {str(e)}")
+        return jsonify({"error": "An error occurred while starting drafting"}), 500
+
+    from drafting import start_drafting_thread
+    if not start_drafting_thread(rfp_name, user_message):
+        return jsonify({"error": "A drafting job is already running for this RFP"}), 409
+
+    return jsonify({
+        "message": "Response drafting started. This can take some time. Please check back periodically for updates."
+    }), 202
+
+@app.route('/drafting-progress', methods=['GET'])
+def drafting_progress():
+    """Get the progress of the bulk drafting job for an RFP."""
+    rfp_name = request.args.get('rfp_name')
+
+    if not rfp_name:
+        return jsonify({"error": "No RFP name provided"}), 400
+
+    job = get_drafting_job(rfp_name)
+    if not job:
+        return jsonify({"error": "No drafting job found for the specified RFP"}), 404
+
+    done = job["completed"] + job["failed"]
+    job["progress"] = (done / job["total"]) * 100 if job["total"] > 0 else 0
+    return jsonify(job), 200
+
+@app.route('/get-drafts', methods=['GET'])
+def get_rfp_drafts():
+    """Get the stored response drafts for an RFP."""
+    rfp_name = request.args.get('rfp_name')
+
+    if not rfp_name:
+        return jsonify({"error": "RFP name is required"}), 400
+
+    try:
+        from drafting import get_drafts
+        return jsonify({"drafts": get_drafts(rfp_name)}), 200
+    except Exception as e:
+        print(f"Error fetching drafts: {str(e)}")
+        return jsonify({"error": "An error occurred while fetching drafts"}), 500
+
+@app.route('/cosmos-usage', methods=['GET'])
+def cosmos_usage():
+    """Cosmos DB RUs and latency per query shape and caller, most expensive first."""
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify({"usage": usage_stats(limit)}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose request, upstream, LLM, job and cache metrics in the Prometheus text format."""
+    payload, content_type = render_metrics()
+    return Response(payload, content_type=content_type)
+
 if __name__ == '__main__':
     app.run(debug=True, threaded=True)
\ No newline at end of file
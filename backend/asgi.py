@@ -0,0 +1,103 @@
+"""
+ASGI entry point for the RFP processing backend.
+
+Under WSGI every server-sent event stream pins a worker thread for the whole LLM generation, so the
+number of concurrent chats is capped by the thread count. This module serves the streaming endpoints
+(/chat and /respond-to-requirement) natively on the event loop, where thousands of concurrent streams
+share one loop per worker process, and forwards every other route to the existing Flask app.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+# Standard library imports
+import asyncio
+import contextlib
+
+# Third-party imports
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Local imports
+from app import app as flask_app
+from common.cosmosdb_async import AsyncCosmosDBManager
+from common.metrics import finish_request, start_request
+
+
+async def chat(request: Request):
+    """Handle chat interactions."""
+    data = await request.json()
+    user_message = data['message']
+    rfp_name = data['rfp_name']
+    print(f"User Message: {user_message}, RFP Name: {rfp_name}")
+    from chat import arun_interaction
+    return StreamingResponse(arun_interaction(user_message, rfp_name), media_type='text/event-stream')
+
+
+async def respond_to_requirement(request: Request):
+    """Generate a response to a specific requirement."""
+    data = await request.json()
+    requirement = data.get('requirement')
+    user_message = data.get('user_message', '')
+
+    if not requirement:
+        return JSONResponse({"error": "Requirement is required"}, status_code=400)
+
+    from response import arespond_to_requirement
+    return StreamingResponse(arespond_to_requirement(user_message, requirement), media_type='text/event-stream')
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # Release the async Cosmos DB connection pool of this worker's event loop
+    if asyncio.get_running_loop() in AsyncCosmosDBManager._instances:
+        manager = await AsyncCosmosDBManager.get_instance()
+        await manager.close()
+
+
+streaming_app = Starlette(
+    routes=[
+        Route('/chat', chat, methods=['POST']),
+        Route('/respond-to-requirement', respond_to_requirement, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
+
+STREAMING_PATHS = {route.path for route in streaming_app.routes}
+
+wsgi_app = WSGIMiddleware(flask_app)
+
+
+async def timed_streaming_app(scope, receive, send):
+    """Serve a streaming endpoint, recording its duration in the request metrics like the Flask routes."""
+    route = scope["path"]
+    status = 500
+    started_at = start_request(route)
+
+    async def send_with_status(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    try:
+        await streaming_app(scope, receive, send_with_status)
+    finally:
+        finish_request(route, scope["method"], status, started_at)
+
+
+async def app(scope, receive, send):
+    """Dispatch streaming endpoints to the async app and everything else to Flask."""
+    if scope["type"] == "lifespan":
+        await streaming_app(scope, receive, send)
+    elif scope.get("path") in STREAMING_PATHS:
+        await timed_streaming_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,238 @@
+"""
+Blob download responses for the Flask app.
+
+This module builds streaming HTTP responses for files held in Azure Blob Storage. Instead of
+downloading a whole blob into worker memory before sending it, responses stream the blob in chunks
+straight to the client. Responses honor conditional requests (If-None-Match against the blob's
+ETag) and single byte-range requests (Range), so PDF viewers can fetch only the pages they need.
+
+Blobs can optionally be served from a local LRU disk cache (BLOB_CACHE_DIR). A full download of
+an uncached blob is written to the cache as it streams to the client; cache entries are keyed by
+the blob's ETag, so a changed blob is never served stale.
+"""
+
+# Standard library imports
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Third-party imports
+from azure.core.exceptions import ResourceNotFoundError
+from dotenv import load_dotenv
+from flask import Response, request, send_file
+
+# Local imports
+from common.adls import ADLSManager
+
+# Load environment variables
+load_dotenv()
+
+# Local disk cache configuration (disabled when BLOB_CACHE_DIR is empty)
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", "")
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class BlobDiskCache:
+    """
+    Size-bounded LRU cache of blob contents on local disk.
+
+    Args:
+        directory (str): The cache directory.
+        max_bytes (int): The total size above which least recently used entries are evicted.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Rebuild the LRU order from the files already on disk, oldest first
+        existing = []
+        for name in os.listdir(directory):
+            if name.endswith(".blob"):
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                existing.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(existing):
+            self._entries[path] = size
+            self._total_bytes += size
+
+    def path_for(self, container_name, blob_name, etag):
+        key = hashlib.sha256(f"{container_name}/{blob_name}/{etag}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.blob")
+
+    def get(self, container_name, blob_name, etag):
+        """Return the cached file path for this blob version, or None on a miss."""
+        path = self.path_for(container_name, blob_name, etag)
+        with self._lock:
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(path, 0)
+            return None
+        return path
+
+    def tee(self, chunks, container_name, blob_name, etag, expected_size):
+        """
+        Yield chunks unchanged while writing them to the cache.
+
+        The entry is only added once the full blob has been written, so an aborted download never
+        leaves a truncated file behind.
+        """
+        path = self.path_for(container_name, blob_name, etag)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        written = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+            if written == expected_size:
+                os.replace(tmp_path, path)
+                self._add(path, written)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _add(self, path, size):
+        evicted = []
+        with self._lock:
+            self._total_bytes -= self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+blob_cache = BlobDiskCache(BLOB_CACHE_DIR, BLOB_CACHE_MAX_BYTES) if BLOB_CACHE_DIR else None
+
+
+def parse_range(range_header, size):
+    """
+    Parse a single-range `Range` header.
+
+    Args:
+        range_header (str): The header value, e.g. "bytes=0-1023" or "bytes=-500".
+        size (int): The blob size in bytes.
+
+    Returns:
+        tuple or None: (start, end) inclusive offsets, None to serve the full blob (no header, or
+        a multi-range request), or "invalid" when the range cannot be satisfied.
+    """
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        # Multi-range and unknown units are allowed to be ignored
+        return None
+
+    start, end = match.groups()
+    if start == "" and end == "":
+        return "invalid"
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            return "invalid"
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match, etag):
+    """Return True when an If-None-Match header matches the blob's ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    normalized = etag.strip('"')
+    return any(candidate.removeprefix("W/").strip('"') == normalized for candidate in candidates)
+
+
+def blob_response(container_name, blob_names, mimetype):
+    """
+    Build a streaming, range-capable response for the first existing blob among `blob_names`.
+
+    Args:
+        container_name (str): The container holding the blob.
+        blob_names (list): Candidate blob names, tried in order.
+        mimetype (str): The Content-Type of the response.
+
+    Returns:
+        Response: 200/206 streaming the blob, 304 if the client's copy is current, 404 if no
+        candidate exists, or 416 for an unsatisfiable range.
+    """
+    adls_manager = ADLSManager()
+
+    properties = None
+    for blob_name in blob_names:
+        try:
+            properties = adls_manager.get_blob_properties(blob_name, container_name)
+            break
+        except ResourceNotFoundError:
+            continue
+    if properties is None:
+        return Response('File not found', status=404)
+
+    etag = properties.etag
+    size = properties.size
+    common_headers = {
+        "ETag": etag if etag.startswith('"') else f'"{etag}"',
+        "Last-Modified": properties.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate"
+    }
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status=304, headers=common_headers)
+
+    if blob_cache is not None:
+        cached_path = blob_cache.get(container_name, blob_name, etag)
+        if cached_path:
+            # send_file handles Range and conditional requests for local files
+            return send_file(cached_path, mimetype=mimetype, conditional=True, etag=etag.strip('"'),
+                             last_modified=properties.last_modified, max_age=0)
+
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range == "invalid":
+        return Response(status=416, headers={**common_headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        chunks = adls_manager.iter_blob_chunks(blob_name, container_name, etag=etag)
+        if blob_cache is not None:
+            chunks = blob_cache.tee(chunks, container_name, blob_name, etag, size)
+        return Response(chunks, status=200, mimetype=mimetype,
+                        headers={**common_headers, "Content-Length": str(size)})
+
+    start, end = byte_range
+    length = end - start + 1
+    chunks = adls_manager.iter_blob_chunks(blob_name, container_name, offset=start, length=length, etag=etag)
+    return Response(chunks, status=206, mimetype=mimetype, headers={
+        **common_headers,
+        "Content-Length": str(length),
+        "Content-Range": f"bytes {start}-{end}/{size}"
+    })
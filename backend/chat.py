@@ -10,9 +10,12 @@ import os
 
 # Third-party imports
 from common.cosmosdb import CosmosDBManager
+from common.cosmosdb_async import AsyncCosmosDBManager
+from common.lazy import LazyClient
+from common.llm_router import INTERACTIVE, RoutedChatModel
+from common.tracing import span, traced
 from dotenv import load_dotenv
 from langchain_core.tools import tool
-from langchain_openai import AzureChatOpenAI
 
 # Load environment variables
 load_dotenv()
@@ -23,22 +26,8 @@ COSMOS_MASTER_KEY = os.getenv('COSMOS_MASTER_KEY')
 COSMOS_DATABASE_ID = os.getenv('COSMOS_DATABASE_ID')
 COSMOS_CONTAINER_ID = os.getenv('COSMOS_CONTAINER_ID')
 
-# Azure OpenAI configuration
-AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-
 # Initialize Azure OpenAI client
-primary_llm = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT
-)
+primary_llm = RoutedChatModel(INTERACTIVE)
 
 # Define tools for the LLM
 #TO DO: build the 'search' tool to run a hybrid search over the RFP chunks
@@ -66,7 +55,7 @@ tools = [
 
 llm_with_tools = primary_llm.bind_tools(tools)
 
-cosmos_manager = CosmosDBManager()
+cosmos_manager = LazyClient(CosmosDBManager)
 
 @tool
 def get_full_rfp(rfp_name):
@@ -82,8 +71,7 @@ def get_full_rfp(rfp_name):
     context = ""
     try:
         print(f"Fetching files from CosmosDB for partitionKey: {rfp_name}")
-        query = f"SELECT * FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.section_content)"
-        items = cosmos_manager.query_items(query)
+        items = cosmos_manager.query_partition(rfp_name, "c.section_content", conditions=["IS_DEFINED(c.section_content)"])
         print(f"Found {len(items)} files in CosmosDB for partitionKey: {rfp_name} with section_content")
         for item in items:
             context += item['section_content']
@@ -108,8 +96,9 @@ def get_sections(sections, rfp_name):
     context = ""
     try:
         print(f"Fetching sections from CosmosDB for partitionKey: {rfp_name} and sections: {sections}")
-        query = f"SELECT * FROM c WHERE c.partitionKey = '{rfp_name}' AND CONTAINS(c.section_id, '{sections}')"
-        items = cosmos_manager.query_items(query)
+        items = cosmos_manager.query_partition(rfp_name, "c.section_content",
+                                               conditions=["CONTAINS(c.section_id, @sections)", "IS_DEFINED(c.section_content)"],
+                                               parameters={"@sections": sections})
         print(f"Found {len(items)} sections in CosmosDB for partitionKey: {rfp_name} with section_header containing '{sections}'")
         for item in items:
             context += item['section_content']
@@ -119,6 +108,24 @@ def get_sections(sections, rfp_name):
 
     return context
 
+def build_routing_messages(user_message):
+    """Build the messages that let the LLM choose which tool retrieves the context."""
+    return [
+        {"role": "system", "content": "You are a helpful AI assistant. "},
+        {"role": "user", "content": user_message},
+    ]
+
+def build_answer_messages(user_message, context):
+    """Build the messages that answer the user's question from the retrieved context."""
+    llm_input = f"<Start Context>\n{context}\n<End Context>\n{user_message}"
+    print(llm_input)
+
+    return [
+        {"role": "system", "content": "You are a helpful AI assistant that answers questions about RFPs. please output in markdown"},
+        {"role": "user", "content": llm_input},
+    ]
+
+@traced("chat.interaction")
 def run_interaction(user_message, rfp_name):
     """
     Run a chat interaction based on the user's message and the RFP.
@@ -135,38 +142,82 @@ def run_interaction(user_message, rfp_name):
     """
     context = ""
 
-    messages = [
-        {"role": "system", "content": "You are a helpful AI assistant. "},
-        {"role": "user", "content": user_message},
-    ]
-
     print("Deciding what to do...")
-    raw_response = llm_with_tools.invoke(messages)
+    raw_response = llm_with_tools.invoke(build_routing_messages(user_message))
     tool_calls = raw_response.tool_calls
     print(tool_calls)
     function_name = tool_calls[0]['name']
 
-    if function_name == "get_full_rfp":
-        context = get_full_rfp(rfp_name)
+    with span("chat.retrieve_context", rfp_name=rfp_name, **{"chat.tool": function_name}) as current:
+        if function_name == "get_full_rfp":
+            context = get_full_rfp(rfp_name)
 
-    if function_name == "get_sections":
-        args = tool_calls[0]['args']
-        combined_args = {
-            "sections": args['sections'],
-            "rfp_name": rfp_name
-        }
-        context = get_sections.invoke(combined_args)
+        if function_name == "get_sections":
+            args = tool_calls[0]['args']
+            combined_args = {
+                "sections": args['sections'],
+                "rfp_name": rfp_name
+            }
+            context = get_sections.invoke(combined_args)
+        current.set_attribute("context.characters", len(context))
 
+    for chunk in primary_llm.stream(build_answer_messages(user_message, context)):
+        yield chunk.content
 
-    llm_input = f"<Start Context>\n{context}\n<End Context>\n{user_message}"
-    print(llm_input)
+    return "success"
 
-    messages = [
-        {"role": "system", "content": "You are a helpful AI assistant that answers questions about RFPs. please output in markdown"},
-        {"role": "user", "content": llm_input},
-    ]
-    
-    for chunk in primary_llm.stream(messages):
-        yield chunk.content
+@traced("chat.retrieve_context")
+async def aget_context(function_name, args, rfp_name):
+    """
+    Retrieve the context selected by the LLM's tool call without blocking the event loop.
 
-    return "success"
\ No newline at end of file
+    Args:
+        function_name (str): The name of the tool the LLM chose.
+        args (dict): The tool call arguments.
+        rfp_name (str): The name of the RFP document.
+
+    Returns:
+        str: The content of the requested sections or of the full RFP.
+    """
+    cosmos = await AsyncCosmosDBManager.get_instance()
+    try:
+        if function_name == "get_full_rfp":
+            items = await cosmos.query_partition(rfp_name, "c.section_content", conditions=["IS_DEFINED(c.section_content)"])
+        elif function_name == "get_sections":
+            items = await cosmos.query_partition(rfp_name, "c.section_content",
+                                                 conditions=["CONTAINS(c.section_id, @sections)", "IS_DEFINED(c.section_content)"],
+                                                 parameters={"@sections": args['sections']})
+        else:
+            return ""
+        print(f"Found {len(items)} sections in CosmosDB for partitionKey: {rfp_name}")
+        return "".join(item['section_content'] for item in items)
+    except Exception as e:
+        print(f"An unexpected error occurred: {str(e)}")
+        return ""
+
+@traced("chat.interaction")
+async def arun_interaction(user_message, rfp_name):
+    """
+    Async variant of `run_interaction` for the ASGI server.
+
+    The tool choice, the Cosmos DB reads and the streamed answer are all awaited, so a chat stream
+    holds no thread while it waits on the LLM.
+
+    Args:
+        user_message (str): The user's input message.
+        rfp_name (str): The name of the RFP document.
+
+    Yields:
+        str: Chunks of the AI's response.
+    """
+    print("Deciding what to do...")
+    raw_response = await llm_with_tools.ainvoke(build_routing_messages(user_message))
+    tool_calls = raw_response.tool_calls
+    print(tool_calls)
+
+    context = ""
+    if tool_calls:
+        context = await aget_context(tool_calls[0]['name'], tool_calls[0]['args'], rfp_name)
+
+    async for chunk in primary_llm.astream(build_answer_messages(user_message, context)):
+        yield chunk.content
@@ -14,47 +14,30 @@ from concurrent.futures import ThreadPoolExecutor
 
 # Third-party imports
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 
 # Local imports
 from common.cosmosdb import CosmosDBManager
+from common.lazy import LazyClient
+from common.llm_router import BATCH, RoutedChatModel
+from common.tracing import current_span, propagate, span, traced
 from prompts import toc_prompt, section_validator_prompt_with_toc
 
 # Load environment variables
 load_dotenv()
 
-# Azure OpenAI configuration
-AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+# Section heading validation fan-out. The LLM router's rate limiter decides how many calls actually
+# run at once, so this only bounds the number of waiting threads
+SECTION_VALIDATION_MAX_WORKERS = int(os.getenv("SECTION_VALIDATION_MAX_WORKERS", "16"))
 
 # Initialize CosmosDBManager
-cosmos_manager = CosmosDBManager()
+cosmos_manager = LazyClient(CosmosDBManager)
 
 # Initialize Azure OpenAI clients
-primary_llm = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT
-)
-
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
+primary_llm = RoutedChatModel(BATCH)
 
+primary_llm_json = RoutedChatModel(BATCH, json_mode=True)
+
+@traced("chunking.table_of_contents")
 def get_table_of_contents(adi_result_object):
     """
     Extract the table of contents from the document.
@@ -106,6 +89,7 @@ def validate_section(section, table_of_contents):
         print(f"Error loading JSON or extracting fields: {e}. Section in question: {section}")
         return None
 
+@traced("chunking.validate_headings")
 def set_valid_sections(adi_result_object, table_of_contents):
     """
     Determine valid sections in the document.
@@ -123,9 +107,9 @@ def set_valid_sections(adi_result_object, table_of_contents):
         if paragraph.role in ["title", "sectionHeading"]:
             content_dict[paragraph.content] = ""
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
+    with ThreadPoolExecutor(max_workers=SECTION_VALIDATION_MAX_WORKERS) as executor:
         section_args = ((section, table_of_contents) for section in content_dict.keys())
-        validation_results = list(executor.map(lambda args: validate_section(*args), section_args))
+        validation_results = list(executor.map(propagate(lambda args: validate_section(*args)), section_args))
 
     print("Completed initial validation of section headings")
     invalid_sections = set()
@@ -137,8 +121,10 @@ def set_valid_sections(adi_result_object, table_of_contents):
         print(f"Removing invalid section: {section}")
         del content_dict[section]
 
+    current_span().set_attributes({"headings.candidates": len(validation_results), "headings.valid": len(content_dict)})
     return content_dict
 
+@traced("chunking.populate_sections")
 def populate_sections(adi_result_object, content_dict):
     """
     Populate the content of each valid section.
@@ -172,8 +158,10 @@ def populate_sections(adi_result_object, content_dict):
                 continue
             content_dict[current_key] += paragraph.content + "\n"
 
+    current_span().set_attribute("sections.count", len(content_dict))
     return content_dict
 
+@traced("cosmos.write_sections")
 def upload_to_cosmos(filename, content_dict, table_of_contents):
     """
     Upload processed document sections and table of contents to Cosmos DB.
@@ -183,6 +171,7 @@ def upload_to_cosmos(filename, content_dict, table_of_contents):
         content_dict: A dictionary of document sections and their content.
         table_of_contents: The extracted table of contents.
     """
+    current_span().set_attribute("cosmos.items", len(content_dict) + 1)
     try:
         # Upload sections
         for key, value in content_dict.items():
@@ -215,21 +204,22 @@ def chunking(adi_result_object, original_filename):
         original_filename: The name of the original file.
     """
     try:
-        print("Getting table of contents")
-        table_of_contents = get_table_of_contents(adi_result_object)
-        print("Table of contents retrieved")
-
-        print("Setting valid sections")
-        content_dict = set_valid_sections(adi_result_object, table_of_contents)
-        print("Valid sections set")
-
-        print("Populating sections")
-        content_dict = populate_sections(adi_result_object, content_dict)
-        print("Sections populated")
-
-        print("Uploading to Cosmos DB")
-        upload_to_cosmos(original_filename, content_dict, table_of_contents)
-        print("Upload to Cosmos DB complete")
+        with span("chunking", rfp_name=original_filename):
+            print("Getting table of contents")
+            table_of_contents = get_table_of_contents(adi_result_object)
+            print("Table of contents retrieved")
+
+            print("Setting valid sections")
+            content_dict = set_valid_sections(adi_result_object, table_of_contents)
+            print("Valid sections set")
+
+            print("Populating sections")
+            content_dict = populate_sections(adi_result_object, content_dict)
+            print("Sections populated")
+
+            print("Uploading to Cosmos DB")
+            upload_to_cosmos(original_filename, content_dict, table_of_contents)
+            print("Upload to Cosmos DB complete")
     except Exception as e:
         print(f"Error in chunking process for {original_filename}: {str(e)}")
 
@@ -241,4 +231,4 @@ def start_chunking_process(adi_result_object, original_filename):
         adi_result_object: The document analysis result object.
         original_filename: The name of the original file.
     """
-    threading.Thread(target=chunking, args=(adi_result_object, original_filename)).start()
\ No newline at end of file
+    threading.Thread(target=propagate(chunking), args=(adi_result_object, original_filename)).start()
\ No newline at end of file
@@ -2,22 +2,36 @@
 ### adls.py ###
 
 This module handles interactions with Azure Data Lake Storage Gen2 (which is built on Azure Blob Storage).
-It provides functionality to upload files, list blobs, and move blobs between containers. The goal of this module is to provide 
-clear and concise examples of how to run basic ADLS operations using a particular SDK version. 
+It provides functionality to upload files (streamed as concurrently staged blocks), stream downloads,
+list blobs (prefix filtered server-side, paged and streamed), and move blobs between containers (atomic
+Data Lake renames where possible, otherwise server-side copies that are awaited before the source is
+deleted). The goal of this module is to provide clear and concise examples of how to run basic ADLS
+operations using a particular SDK version. 
 
 Requirements:
     azure-storage-blob==12.22.0
+    azure-storage-file-datalake==12.14.0
     python-dotenv
 """
 
 import os
+import time
+import base64
+import hashlib
 import logging
-from typing import Union, Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Dict, Any, List, Iterator, Optional, Sequence, Tuple
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import BlobServiceClient, BlobProperties, BlobClient, BlobBlock, ContentSettings
+from azure.storage.filedatalake import DataLakeServiceClient
 from azure.identity import DefaultAzureCredential
 import io
 
+from common.metrics import BLOB, upstream_hooks
+
 # Set up logging
 logging.basicConfig(level=logging.WARNING)  # Set to WARNING to suppress INFO logs
 logger = logging.getLogger(__name__)
@@ -28,6 +42,47 @@ logging.getLogger('azure').setLevel(logging.WARNING)
 logging.getLogger('azure.storage').setLevel(logging.WARNING)
 logging.getLogger('azure.identity').setLevel(logging.WARNING)
 
+def wait_for_copy(blob_client: BlobClient, copy: Dict[str, Any], timeout: float = 600.0) -> None:
+    """
+    Wait for a server-side copy started with `start_copy_from_url` to finish.
+
+    Copies within one storage account usually complete synchronously, in which case this returns
+    immediately. Otherwise the destination's copy status is polled with exponential backoff.
+    Raises if the copy fails, is aborted, or does not finish within `timeout` seconds.
+    """
+    status = copy.get("copy_status")
+    poll_interval = 0.2
+    deadline = time.monotonic() + timeout
+    while status == "pending":
+        if time.monotonic() > deadline:
+            blob_client.abort_copy(copy["copy_id"])
+            raise TimeoutError(f"Copy to {blob_client.blob_name} did not finish within {timeout:.0f}s")
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, 5.0)
+        properties = blob_client.get_blob_properties()
+        status = properties.copy.status
+        if status not in ("pending", "success"):
+            raise RuntimeError(f"Copy to {blob_client.blob_name} ended with status '{status}': {properties.copy.status_description}")
+    if status not in (None, "success", "pending"):
+        raise RuntimeError(f"Copy to {blob_client.blob_name} ended with status '{status}'")
+
+def read_block(stream: io.IOBase, size: int) -> bytes:
+    """
+    Read `size` bytes from a stream, or fewer only at the end of the stream.
+
+    A single `read` on a raw or non-buffered stream may return fewer bytes than requested before
+    the end, so reads are repeated until the block is full or the stream returns no data.
+    """
+    parts = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
 class ADLSManager:
     _instance = None
     _is_initialized = False
@@ -45,6 +100,7 @@ class ADLSManager:
             logger.info("Initializing ADLSManager")
             self._load_env_variables()
             self.blob_service_client = self._get_blob_service_client()
+            self._datalake_service_client: Optional[DataLakeServiceClient] = None
             ADLSManager._is_initialized = True
 
     def _load_env_variables(self):
@@ -53,65 +109,318 @@ class ADLSManager:
         self.storage_account_key = os.environ.get("STORAGE_ACCOUNT_KEY")
         self.storage_account_container = os.environ.get("STORAGE_ACCOUNT_CONTAINER_RFP")
         self.tenant_id = os.environ.get("TENANT_ID", '16b3c013-d300-468d-ac64-7eda0820b6d3')
+        self.hierarchical_namespace = os.environ.get("STORAGE_ACCOUNT_HNS_ENABLED", "false").lower() == "true"
+        self.move_max_concurrency = int(os.environ.get("STORAGE_MOVE_MAX_CONCURRENCY", "16"))
+        self.upload_block_size = int(os.environ.get("STORAGE_UPLOAD_BLOCK_SIZE", str(8 * 1024 * 1024)))
+        self.upload_max_concurrency = int(os.environ.get("STORAGE_UPLOAD_MAX_CONCURRENCY", "4"))
+        # Downloads are fetched in requests of at most this size, so streaming starts after one chunk
+        self.download_chunk_size = int(os.environ.get("STORAGE_DOWNLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
 
         if not self.storage_account_name:
             raise ValueError("STORAGE_ACCOUNT_NAME environment variable is not set")
 
+    def _get_credential(self):
+        if self.storage_account_key:
+            return {"account_name": self.storage_account_name, "account_key": self.storage_account_key}
+        return DefaultAzureCredential(
+            interactive_browser_tenant_id=self.tenant_id,
+            visual_studio_code_tenant_id=self.tenant_id,
+            workload_identity_tenant_id=self.tenant_id,
+            shared_cache_tenant_id=self.tenant_id
+        )
+
+    def _download_options(self) -> Dict[str, int]:
+        """
+        Client settings that keep downloads streaming. By default the SDK reads the first 32 MiB of a
+        blob in a single request before yielding anything, which buffers most files whole.
+        """
+        return {"max_single_get_size": self.download_chunk_size, "max_chunk_get_size": self.download_chunk_size}
+
     def _get_blob_service_client(self) -> BlobServiceClient:
         logger.info("Initializing Blob service client")
         if self.storage_account_key:
             logger.info("Using key-based authentication for Blob storage")
             connection_string = f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net"
-            return BlobServiceClient.from_connection_string(connection_string)
+            return BlobServiceClient.from_connection_string(connection_string, **self._download_options(), **upstream_hooks(BLOB))
         else:
             logger.info("Using DefaultAzureCredential for Blob storage authentication")
             account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
-            credential = DefaultAzureCredential(
-                interactive_browser_tenant_id=self.tenant_id,
-                visual_studio_code_tenant_id=self.tenant_id,
-                workload_identity_tenant_id=self.tenant_id,
-                shared_cache_tenant_id=self.tenant_id
-            )
-            return BlobServiceClient(account_url=account_url, credential=credential)
+            return BlobServiceClient(account_url=account_url, credential=self._get_credential(), **self._download_options(), **upstream_hooks(BLOB))
+
+    @property
+    def datalake_service_client(self) -> DataLakeServiceClient:
+        """Data Lake client for the same account, created on first use (only needed for renames)."""
+        if self._datalake_service_client is None:
+            account_url = f"https://{self.storage_account_name}.dfs.core.windows.net"
+            self._datalake_service_client = DataLakeServiceClient(account_url=account_url, credential=self._get_credential(), **upstream_hooks(BLOB))
+        return self._datalake_service_client
 
     def upload_to_blob(self, file_content: Union[bytes, io.IOBase], filename: str, container_name: str = None) -> Dict[str, str]:
+        if hasattr(file_content, "read"):
+            # Stream file-like content in blocks instead of reading it all into memory
+            return self.upload_stream(file_content, filename, container_name)
+
         container_name = container_name or self.storage_account_container
         container_client = self.blob_service_client.get_container_client(container_name)
         blob_client = container_client.get_blob_client(filename)
         
-        if isinstance(file_content, io.IOBase):
-            blob_client.upload_blob(file_content.read(), overwrite=True)
-        else:
-            blob_client.upload_blob(file_content, overwrite=True)
+        blob_client.upload_blob(file_content, overwrite=True)
         
         logger.info(f"File {filename} uploaded successfully")
         return {"message": f"File {filename} uploaded successfully", "blob_url": blob_client.url}
 
-    def list_blobs_in_folder(self, folder_name: str, container_name: str = None) -> List[Any]:
+    def upload_stream(self, stream: io.IOBase, filename: str,
+                      container_name: str = None,
+                      block_size: int = None,
+                      max_concurrency: int = None) -> Dict[str, str]:
+        """
+        Upload a file-like object as staged blocks without holding the whole file in memory.
+
+        Blocks of `block_size` bytes are read from the stream one at a time, hashed, and staged
+        concurrently; at most `max_concurrency` blocks are in flight, which bounds memory use to
+        roughly `block_size * (max_concurrency + 1)`. The block list is committed once every block
+        is staged; content smaller than one block is sent with a single Put Blob instead. The SHA-256 of the content is computed on the fly and stored in the blob's
+        metadata, and the MD5 is set as the blob's Content-MD5.
+
+        Parameters
+        ----------
+        stream : io.IOBase
+            The readable stream to upload, e.g. the stream of an uploaded Flask file.
+        block_size : int, optional
+            Bytes per block. Defaults to STORAGE_UPLOAD_BLOCK_SIZE (8 MiB).
+        max_concurrency : int, optional
+            Blocks staged in parallel. Defaults to STORAGE_UPLOAD_MAX_CONCURRENCY (4).
+
+        Returns
+        -------
+        Dict[str, str]
+            `message`, `blob_url`, `sha256` and `size` of the uploaded blob.
+        """
         container_name = container_name or self.storage_account_container
+        block_size = block_size or self.upload_block_size
+        max_concurrency = max_concurrency or self.upload_max_concurrency
         container_client = self.blob_service_client.get_container_client(container_name)
-        
-        return [blob for blob in container_client.list_blobs() if blob.name.startswith(folder_name)]
+        blob_client = container_client.get_blob_client(filename)
+
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        size = 0
+        block_ids: List[str] = []
+        in_flight = threading.BoundedSemaphore(max_concurrency)
+        futures = []
+
+        def stage(block_id: str, data: bytes) -> None:
+            try:
+                blob_client.stage_block(block_id, data, length=len(data))
+            finally:
+                in_flight.release()
+
+        data = read_block(stream, block_size)
+        if len(data) < block_size:
+            # The whole file fits in one block, so a single Put Blob is cheaper than stage + commit
+            digest = hashlib.sha256(data).hexdigest()
+            blob_client.upload_blob(
+                data, overwrite=True,
+                content_settings=ContentSettings(content_md5=bytearray(hashlib.md5(data).digest())),
+                metadata={"sha256": digest}
+            )
+            logger.info(f"File {filename} uploaded successfully ({len(data)} bytes)")
+            return {
+                "message": f"File {filename} uploaded successfully",
+                "blob_url": blob_client.url,
+                "sha256": digest,
+                "size": len(data)
+            }
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while data:
+                sha256.update(data)
+                md5.update(data)
+                size += len(data)
+
+                # Block ids must be the same length for every block in the blob
+                block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+                block_ids.append(block_id)
+
+                in_flight.acquire()
+                futures.append(executor.submit(stage, block_id, data))
+
+                # Surface a failed block early rather than after reading the rest of the stream
+                failed = next((future for future in futures if future.done() and future.exception()), None)
+                if failed:
+                    failed.result()
+
+                data = read_block(stream, block_size)
+
+            for future in futures:
+                future.result()
+
+        blob_client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=ContentSettings(content_md5=bytearray(md5.digest())),
+            metadata={"sha256": sha256.hexdigest()}
+        )
+
+        logger.info(f"File {filename} uploaded successfully ({size} bytes in {len(block_ids)} blocks)")
+        return {
+            "message": f"File {filename} uploaded successfully",
+            "blob_url": blob_client.url,
+            "sha256": sha256.hexdigest(),
+            "size": size
+        }
+
+    def get_blob_properties(self, blob_name: str, container_name: str = None) -> BlobProperties:
+        """Return a blob's properties (size, ETag, last modified, ...) without downloading it."""
+        container_name = container_name or self.storage_account_container
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(blob_name)
+        return blob_client.get_blob_properties()
+
+    def iter_blob_chunks(self, blob_name: str,
+                         container_name: str = None,
+                         offset: Optional[int] = None,
+                         length: Optional[int] = None,
+                         etag: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Stream a blob, or a byte range of it, in chunks instead of reading it into memory. Chunks are
+        fetched one request at a time, of at most STORAGE_DOWNLOAD_CHUNK_SIZE bytes.
+
+        When `etag` is given the download fails if the blob has changed since that ETag was read,
+        so a response never mixes two versions of a file.
+        """
+        container_name = container_name or self.storage_account_container
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(blob_name)
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        downloader = blob_client.download_blob(offset=offset, length=length, **conditions)
+        yield from downloader.chunks()
+
+    def iter_blob_pages(self, prefix: str = "",
+                        container_name: str = None,
+                        include_metadata: bool = False,
+                        results_per_page: int = 5000,
+                        continuation_token: Optional[str] = None) -> Iterator[Tuple[List[BlobProperties], Optional[str]]]:
+        """
+        Stream the blobs under a prefix one page at a time.
+
+        The prefix is applied by the storage service, so only matching blobs are returned, and each
+        page is fetched lazily when the previous one has been consumed. Pages are plain lists, which
+        makes them easy to hand to worker threads. Each page comes with the continuation token of the
+        next one (None after the last page), which resumes an interrupted listing when passed back as
+        `continuation_token`. The token belongs to the caller's listing, so concurrent listings do not
+        interfere.
+        """
+        container_name = container_name or self.storage_account_container
+        container_client = self.blob_service_client.get_container_client(container_name)
+
+        pager = container_client.list_blobs(
+            name_starts_with=prefix or None,
+            include=["metadata"] if include_metadata else None,
+            results_per_page=results_per_page
+        ).by_page(continuation_token=continuation_token)
+
+        for page in pager:
+            blobs = list(page)
+            yield blobs, pager.continuation_token
+
+    def iter_blobs(self, prefix: str = "",
+                   container_name: str = None,
+                   include_metadata: bool = False,
+                   results_per_page: int = 5000) -> Iterator[BlobProperties]:
+        """Stream the blobs under a prefix one at a time, fetching pages from the service as needed."""
+        for page, _ in self.iter_blob_pages(prefix, container_name, include_metadata, results_per_page):
+            yield from page
+
+    def list_blobs_in_folder(self, folder_name: str, container_name: str = None) -> List[Any]:
+        return list(self.iter_blobs(folder_name, container_name))
+
+    def _rename_blob(self, source_blob_name: str, destination_blob_name: str,
+                     source_container_name: str, destination_container_name: str) -> None:
+        file_system_client = self.datalake_service_client.get_file_system_client(source_container_name)
+        file_client = file_system_client.get_file_client(source_blob_name)
+        file_client.rename_file(f"{destination_container_name}/{destination_blob_name}")
+
+    def _copy_and_delete_blob(self, source_blob_name: str, destination_blob_name: str,
+                              source_container_name: str, destination_container_name: str) -> None:
+        source_container_client = self.blob_service_client.get_container_client(source_container_name)
+        destination_container_client = self.blob_service_client.get_container_client(destination_container_name)
+
+        source_blob = source_container_client.get_blob_client(source_blob_name)
+        destination_blob = destination_container_client.get_blob_client(destination_blob_name)
+
+        copy = destination_blob.start_copy_from_url(source_blob.url)
+        # Only delete the source once the copy has actually completed
+        wait_for_copy(destination_blob, copy)
+        source_blob.delete_blob()
 
     def move_blob(self, source_blob_name: str, 
                   destination_blob_name: str, 
                   source_container_name: str = None, 
                   destination_container_name: str = None) -> Dict[str, str]:
+        """
+        Move a blob, using an atomic Data Lake rename on hierarchical-namespace accounts.
+
+        Falls back to a server-side copy, awaited until complete, followed by deleting the source
+        when the rename is not available (flat namespace, or the destination folder does not exist).
+        """
         source_container_name = source_container_name or self.storage_account_container
         destination_container_name = destination_container_name or source_container_name
 
-        source_container_client = self.blob_service_client.get_container_client(source_container_name)
-        destination_container_client = self.blob_service_client.get_container_client(destination_container_name)
+        renamed = False
+        if self.hierarchical_namespace:
+            try:
+                self._rename_blob(source_blob_name, destination_blob_name, source_container_name, destination_container_name)
+                renamed = True
+            except HttpResponseError as e:
+                logger.info(f"Rename of {source_blob_name} failed ({e.reason}); falling back to copy and delete")
+
+        if not renamed:
+            self._copy_and_delete_blob(source_blob_name, destination_blob_name, source_container_name, destination_container_name)
 
-        source_blob = source_container_client.get_blob_client(source_blob_name)
-        destination_blob = destination_container_client.get_blob_client(destination_blob_name)
-        
-        destination_blob.start_copy_from_url(source_blob.url)
-        source_blob.delete_blob()
         message = f"Moved blob from {source_blob_name} to {destination_blob_name}"
         logger.info(message)
         return {"message": message}
 
+    def move_blobs(self, moves: Sequence[Tuple[str, str]],
+                   source_container_name: str = None,
+                   destination_container_name: str = None,
+                   max_concurrency: int = None) -> List[Dict[str, Any]]:
+        """
+        Move many blobs concurrently with bounded parallelism.
+
+        Parameters
+        ----------
+        moves : Sequence[Tuple[str, str]]
+            (source_blob_name, destination_blob_name) pairs.
+        max_concurrency : int, optional
+            The maximum number of moves in flight. Defaults to STORAGE_MOVE_MAX_CONCURRENCY.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            One result per move, in input order, with `source`, `destination`, `success` and
+            either `message` or `error`. A failed move does not stop the others.
+        """
+        def move(pair: Tuple[str, str]) -> Dict[str, Any]:
+            source_blob_name, destination_blob_name = pair
+            result = {"source": source_blob_name, "destination": destination_blob_name}
+            try:
+                result.update(self.move_blob(source_blob_name, destination_blob_name,
+                                             source_container_name, destination_container_name))
+                result["success"] = True
+            except Exception as e:
+                logger.error(f"Failed to move {source_blob_name}: {str(e)}")
+                result.update({"success": False, "error": str(e)})
+            return result
+
+        if not moves:
+            return []
+        max_workers = min(max_concurrency or self.move_max_concurrency, len(moves))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(move, moves))
+
+        failed = sum(1 for result in results if not result["success"])
+        logger.info(f"Moved {len(results) - failed} of {len(results)} blobs ({failed} failed)")
+        return results
+
 def run_examples():
     try:
         # Create an instance - will reuse the same instance if already created
@@ -136,6 +445,10 @@ def run_examples():
         blobs = adls_manager.list_blobs_in_folder("source/")
         logger.info(f"Found {len(blobs)} blobs in the 'source' folder")
 
+        # Example of streaming a large folder page by page, with blob metadata
+        for page, continuation_token in adls_manager.iter_blob_pages("source/", include_metadata=True, results_per_page=1000):
+            logger.info(f"Fetched a page of {len(page)} blobs; more pages: {continuation_token is not None}")
+
         # Example of moving a blob
         if blobs:
             source_blob_name = blobs[0].name
@@ -144,6 +457,11 @@ def run_examples():
             move_result = adls_manager.move_blob(source_blob_name, destination_blob_name)
             logger.info(move_result['message'])
 
+        # Example of moving many blobs concurrently
+        moves = [(blob.name, blob.name.replace("source/", "processed/")) for blob in blobs[1:]]
+        results = adls_manager.move_blobs(moves)
+        logger.info(f"Moved {sum(1 for result in results if result['success'])} of {len(results)} blobs")
+
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}")
 
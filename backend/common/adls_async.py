@@ -0,0 +1,377 @@
+"""
+### adls_async.py ###
+
+This module is the asyncio counterpart of adls.py. It exposes the same method surface as ADLSManager
+(uploads streamed as concurrently staged blocks, streamed downloads, paged listings and moves) on top
+of the `azure.storage.blob.aio` and `azure.storage.filedatalake.aio` clients, so pipelines can run
+thousands of concurrent storage operations on one event loop instead of one thread per operation.
+
+Async clients are bound to the event loop they are used on, so there is one manager per event loop.
+All coroutines on a loop share that manager's clients and their connection pools. Obtain it with
+`AsyncADLSManager.get_instance()`.
+
+Requirements:
+    azure-storage-blob==12.22.0
+    azure-storage-file-datalake==12.14.0
+    aiohttp
+"""
+
+import asyncio
+import base64
+import hashlib
+import inspect
+import io
+import logging
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError
+from azure.identity.aio import DefaultAzureCredential
+from azure.storage.blob import BlobBlock, BlobProperties, ContentSettings
+from azure.storage.blob.aio import BlobClient, BlobServiceClient
+from azure.storage.filedatalake.aio import DataLakeServiceClient
+
+from common.adls import ADLSManager
+from common.metrics import BLOB, upstream_hooks
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+async def wait_for_copy(blob_client: BlobClient, copy: Dict[str, Any], timeout: float = 600.0) -> None:
+    """
+    Wait for a server-side copy started with `start_copy_from_url` to finish.
+
+    Same semantics as `adls.wait_for_copy`, but polls without blocking the event loop.
+    """
+    status = copy.get("copy_status")
+    poll_interval = 0.2
+    deadline = time.monotonic() + timeout
+    while status == "pending":
+        if time.monotonic() > deadline:
+            await blob_client.abort_copy(copy["copy_id"])
+            raise TimeoutError(f"Copy to {blob_client.blob_name} did not finish within {timeout:.0f}s")
+        await asyncio.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, 5.0)
+        properties = await blob_client.get_blob_properties()
+        status = properties.copy.status
+        if status not in ("pending", "success"):
+            raise RuntimeError(f"Copy to {blob_client.blob_name} ended with status '{status}': {properties.copy.status_description}")
+    if status not in (None, "success", "pending"):
+        raise RuntimeError(f"Copy to {blob_client.blob_name} ended with status '{status}'")
+
+async def _read(stream: Any, size: int) -> bytes:
+    """
+    Read `size` bytes from a synchronous or asynchronous file-like object, or fewer only at the end
+    of the stream (see `read_block`).
+    """
+    parts = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if inspect.isawaitable(data):
+            data = await data
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+class AsyncADLSManager:
+    _instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncADLSManager]" = weakref.WeakKeyDictionary()
+
+    # Configuration is read exactly as in the synchronous manager
+    _load_env_variables = ADLSManager._load_env_variables
+    _download_options = ADLSManager._download_options
+
+    def __init__(self):
+        """Create the async clients. Use `get_instance` rather than calling this directly."""
+        logger.info("Initializing AsyncADLSManager")
+        self._load_env_variables()
+        self.credential: Optional[DefaultAzureCredential] = None
+        self.blob_service_client = self._get_blob_service_client()
+        self._datalake_service_client: Optional[DataLakeServiceClient] = None
+
+    @classmethod
+    def get_instance(cls) -> "AsyncADLSManager":
+        """Return the manager for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        instance = cls._instances.get(loop)
+        if instance is None:
+            instance = cls()
+            cls._instances[loop] = instance
+        return instance
+
+    def _get_credential(self):
+        if self.storage_account_key:
+            return {"account_name": self.storage_account_name, "account_key": self.storage_account_key}
+        if self.credential is None:
+            self.credential = DefaultAzureCredential(
+                interactive_browser_tenant_id=self.tenant_id,
+                visual_studio_code_tenant_id=self.tenant_id,
+                workload_identity_tenant_id=self.tenant_id,
+                shared_cache_tenant_id=self.tenant_id
+            )
+        return self.credential
+
+    def _get_blob_service_client(self) -> BlobServiceClient:
+        if self.storage_account_key:
+            logger.info("Using key-based authentication for async Blob storage client")
+            connection_string = f"DefaultEndpointsProtocol=https;AccountName={self.storage_account_name};AccountKey={self.storage_account_key};EndpointSuffix=core.windows.net"
+            return BlobServiceClient.from_connection_string(connection_string, **self._download_options(), **upstream_hooks(BLOB))
+        logger.info("Using DefaultAzureCredential for async Blob storage client")
+        account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
+        return BlobServiceClient(account_url=account_url, credential=self._get_credential(), **self._download_options(), **upstream_hooks(BLOB))
+
+    @property
+    def datalake_service_client(self) -> DataLakeServiceClient:
+        """Data Lake client for the same account, created on first use (only needed for renames)."""
+        if self._datalake_service_client is None:
+            account_url = f"https://{self.storage_account_name}.dfs.core.windows.net"
+            self._datalake_service_client = DataLakeServiceClient(account_url=account_url, credential=self._get_credential(), **upstream_hooks(BLOB))
+        return self._datalake_service_client
+
+    async def close(self) -> None:
+        """Close the clients and their connection pools, and forget the manager for this loop."""
+        await self.blob_service_client.close()
+        if self._datalake_service_client is not None:
+            await self._datalake_service_client.close()
+        if self.credential is not None:
+            await self.credential.close()
+        try:
+            self._instances.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            pass
+
+    async def upload_to_blob(self, file_content: Union[bytes, io.IOBase], filename: str, container_name: str = None) -> Dict[str, str]:
+        if hasattr(file_content, "read"):
+            # Stream file-like content in blocks instead of reading it all into memory
+            return await self.upload_stream(file_content, filename, container_name)
+
+        container_name = container_name or self.storage_account_container
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(filename)
+
+        await blob_client.upload_blob(file_content, overwrite=True)
+
+        logger.info(f"File {filename} uploaded successfully")
+        return {"message": f"File {filename} uploaded successfully", "blob_url": blob_client.url}
+
+    async def upload_stream(self, stream: Any, filename: str,
+                            container_name: str = None,
+                            block_size: int = None,
+                            max_concurrency: int = None) -> Dict[str, str]:
+        """
+        Upload a file-like object as staged blocks without holding the whole file in memory.
+
+        Same behavior as `ADLSManager.upload_stream`; `stream.read` may be a regular method or a
+        coroutine. At most `max_concurrency` blocks are staged concurrently.
+        """
+        container_name = container_name or self.storage_account_container
+        block_size = block_size or self.upload_block_size
+        max_concurrency = max_concurrency or self.upload_max_concurrency
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(filename)
+
+        data = await _read(stream, block_size)
+        if len(data) < block_size:
+            # The whole file fits in one block, so a single Put Blob is cheaper than stage + commit
+            sha256 = hashlib.sha256(data).hexdigest()
+            await blob_client.upload_blob(
+                data, overwrite=True,
+                content_settings=ContentSettings(content_md5=bytearray(hashlib.md5(data).digest())),
+                metadata={"sha256": sha256}
+            )
+            logger.info(f"File {filename} uploaded successfully ({len(data)} bytes)")
+            return {"message": f"File {filename} uploaded successfully", "blob_url": blob_client.url,
+                    "sha256": sha256, "size": len(data)}
+
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        size = 0
+        block_ids: List[str] = []
+        in_flight = asyncio.Semaphore(max_concurrency)
+        tasks: List[asyncio.Task] = []
+
+        async def stage(block_id: str, block: bytes) -> None:
+            try:
+                await blob_client.stage_block(block_id, block, length=len(block))
+            finally:
+                in_flight.release()
+
+        try:
+            while data:
+                sha256.update(data)
+                md5.update(data)
+                size += len(data)
+
+                # Block ids must be the same length for every block in the blob
+                block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+                block_ids.append(block_id)
+
+                await in_flight.acquire()
+                tasks.append(asyncio.create_task(stage(block_id, data)))
+
+                # Surface a failed block early rather than after reading the rest of the stream
+                failed = next((task for task in tasks if task.done() and task.exception()), None)
+                if failed:
+                    failed.result()
+
+                data = await _read(stream, block_size)
+
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        await blob_client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=ContentSettings(content_md5=bytearray(md5.digest())),
+            metadata={"sha256": sha256.hexdigest()}
+        )
+
+        logger.info(f"File {filename} uploaded successfully ({size} bytes in {len(block_ids)} blocks)")
+        return {"message": f"File {filename} uploaded successfully", "blob_url": blob_client.url,
+                "sha256": sha256.hexdigest(), "size": size}
+
+    async def get_blob_properties(self, blob_name: str, container_name: str = None) -> BlobProperties:
+        """Return a blob's properties (size, ETag, last modified, ...) without downloading it."""
+        container_name = container_name or self.storage_account_container
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(blob_name)
+        return await blob_client.get_blob_properties()
+
+    async def iter_blob_chunks(self, blob_name: str,
+                               container_name: str = None,
+                               offset: Optional[int] = None,
+                               length: Optional[int] = None,
+                               etag: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Stream a blob, or a byte range of it, in chunks (see `ADLSManager.iter_blob_chunks`)."""
+        container_name = container_name or self.storage_account_container
+        blob_client = self.blob_service_client.get_container_client(container_name).get_blob_client(blob_name)
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        downloader = await blob_client.download_blob(offset=offset, length=length, **conditions)
+        async for chunk in downloader.chunks():
+            yield chunk
+
+    async def iter_blob_pages(self, prefix: str = "",
+                              container_name: str = None,
+                              include_metadata: bool = False,
+                              results_per_page: int = 5000,
+                              continuation_token: Optional[str] = None) -> AsyncIterator[Tuple[List[BlobProperties], Optional[str]]]:
+        """Stream the blobs under a prefix one page at a time (see `ADLSManager.iter_blob_pages`)."""
+        container_name = container_name or self.storage_account_container
+        container_client = self.blob_service_client.get_container_client(container_name)
+
+        pager = container_client.list_blobs(
+            name_starts_with=prefix or None,
+            include=["metadata"] if include_metadata else None,
+            results_per_page=results_per_page
+        ).by_page(continuation_token=continuation_token)
+
+        async for page in pager:
+            blobs = [blob async for blob in page]
+            yield blobs, pager.continuation_token
+
+    async def iter_blobs(self, prefix: str = "",
+                         container_name: str = None,
+                         include_metadata: bool = False,
+                         results_per_page: int = 5000) -> AsyncIterator[BlobProperties]:
+        """Stream the blobs under a prefix one at a time, fetching pages from the service as needed."""
+        async for page, _ in self.iter_blob_pages(prefix, container_name, include_metadata, results_per_page):
+            for blob in page:
+                yield blob
+
+    async def list_blobs_in_folder(self, folder_name: str, container_name: str = None) -> List[Any]:
+        return [blob async for blob in self.iter_blobs(folder_name, container_name)]
+
+    async def _rename_blob(self, source_blob_name: str, destination_blob_name: str,
+                           source_container_name: str, destination_container_name: str) -> None:
+        file_system_client = self.datalake_service_client.get_file_system_client(source_container_name)
+        file_client = file_system_client.get_file_client(source_blob_name)
+        await file_client.rename_file(f"{destination_container_name}/{destination_blob_name}")
+
+    async def _copy_and_delete_blob(self, source_blob_name: str, destination_blob_name: str,
+                                    source_container_name: str, destination_container_name: str) -> None:
+        source_blob = self.blob_service_client.get_container_client(source_container_name).get_blob_client(source_blob_name)
+        destination_blob = self.blob_service_client.get_container_client(destination_container_name).get_blob_client(destination_blob_name)
+
+        copy = await destination_blob.start_copy_from_url(source_blob.url)
+        # Only delete the source once the copy has actually completed
+        await wait_for_copy(destination_blob, copy)
+        await source_blob.delete_blob()
+
+    async def move_blob(self, source_blob_name: str,
+                        destination_blob_name: str,
+                        source_container_name: str = None,
+                        destination_container_name: str = None) -> Dict[str, str]:
+        """Move a blob, using an atomic Data Lake rename where possible (see `ADLSManager.move_blob`)."""
+        source_container_name = source_container_name or self.storage_account_container
+        destination_container_name = destination_container_name or source_container_name
+
+        renamed = False
+        if self.hierarchical_namespace:
+            try:
+                await self._rename_blob(source_blob_name, destination_blob_name, source_container_name, destination_container_name)
+                renamed = True
+            except HttpResponseError as e:
+                logger.info(f"Rename of {source_blob_name} failed ({e.reason}); falling back to copy and delete")
+
+        if not renamed:
+            await self._copy_and_delete_blob(source_blob_name, destination_blob_name, source_container_name, destination_container_name)
+
+        message = f"Moved blob from {source_blob_name} to {destination_blob_name}"
+        logger.info(message)
+        return {"message": message}
+
+    async def move_blobs(self, moves: Sequence[Tuple[str, str]],
+                         source_container_name: str = None,
+                         destination_container_name: str = None,
+                         max_concurrency: int = None) -> List[Dict[str, Any]]:
+        """
+        Move many blobs concurrently with bounded parallelism (see `ADLSManager.move_blobs`).
+
+        Returns one result per move, in input order; a failed move does not stop the others.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.move_max_concurrency)
+
+        async def move(source_blob_name: str, destination_blob_name: str) -> Dict[str, Any]:
+            result = {"source": source_blob_name, "destination": destination_blob_name}
+            async with semaphore:
+                try:
+                    result.update(await self.move_blob(source_blob_name, destination_blob_name,
+                                                       source_container_name, destination_container_name))
+                    result["success"] = True
+                except Exception as e:
+                    logger.error(f"Failed to move {source_blob_name}: {str(e)}")
+                    result.update({"success": False, "error": str(e)})
+            return result
+
+        results = await asyncio.gather(*[move(source, destination) for source, destination in moves])
+
+        failed = sum(1 for result in results if not result["success"])
+        logger.info(f"Moved {len(results) - failed} of {len(results)} blobs ({failed} failed)")
+        return list(results)
+
+async def run_examples():
+    adls_manager = AsyncADLSManager.get_instance()
+    try:
+        # Example of streaming a large folder page by page
+        async for page, continuation_token in adls_manager.iter_blob_pages("source/", results_per_page=1000):
+            logger.info(f"Fetched a page of {len(page)} blobs; more pages: {continuation_token is not None}")
+
+        # Example of fetching many blob properties concurrently on one event loop
+        blobs = await adls_manager.list_blobs_in_folder("source/")
+        properties = await asyncio.gather(*[adls_manager.get_blob_properties(blob.name) for blob in blobs])
+        logger.info(f"Fetched properties of {len(properties)} blobs")
+
+        # Example of moving many blobs concurrently
+        moves = [(blob.name, blob.name.replace("source/", "processed/")) for blob in blobs]
+        results = await adls_manager.move_blobs(moves)
+        logger.info(f"Moved {sum(1 for result in results if result['success'])} of {len(results)} blobs")
+
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}")
+    finally:
+        await adls_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_examples())
@@ -0,0 +1,95 @@
+"""
+### cache.py ###
+
+This module provides a small thread-safe, in-memory cache with per-entry expiry (TTL) and a bounded
+number of entries (least recently used entries are evicted first). It is used to avoid repeating
+expensive upstream calls, such as LLM query rewrites and search requests, for the same inputs.
+"""
+
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+# Caches created with a name, reported by the /metrics endpoint
+_named_caches: "weakref.WeakValueDictionary[str, TTLCache]" = weakref.WeakValueDictionary()
+
+
+def named_caches() -> Dict[str, "TTLCache"]:
+    """Return the live caches that were given a name, keyed by name."""
+    return dict(_named_caches)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after they are stored.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds an entry stays valid.
+    max_entries : int
+        Maximum number of entries kept; the least recently used entry is evicted first.
+    name : str, optional
+        Name under which the cache's hit and miss counts are reported.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, name: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if name:
+            _named_caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, optionally with a TTL other than the cache default."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, computing and storing it with `factory` on a miss.
+
+        The factory runs outside the lock, so concurrent misses for the same key may each call it;
+        that is acceptable for idempotent lookups and keeps slow factories from blocking the cache.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
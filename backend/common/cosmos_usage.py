@@ -0,0 +1,301 @@
+"""
+### cosmos_usage.py ###
+
+This module accounts for the request units (RUs) and latency of Cosmos DB calls. The Cosmos SDK
+returns the charge of every request in the `x-ms-request-charge` response header; the Cosmos DB
+managers pass `record_response` to their client, and wrap each operation in `track_usage`, which
+sums the charges of all its requests (every page of a query) and times it.
+
+Calls are aggregated per query shape and caller:
+
+    shape   the query text with literals replaced by `?` ("read_item", "upsert_item", ... for point
+            operations); queries built by `build_partition_query` already carry their values as
+            parameters, so their shape is their text
+    caller  the function outside the Cosmos DB modules that made the call, e.g. `app.get_progress`
+    scope   "partition" for single-partition calls, "cross-partition" for fan-out queries
+
+Thresholds:
+
+    COSMOS_SLOW_QUERY_MS          calls slower than this are logged (default 500)
+    COSMOS_EXPENSIVE_QUERY_RU     calls charging more than this are logged (default 50)
+    COSMOS_RU_ALERT_PER_MINUTE    alert when the RUs charged over the last minute exceed this, with
+                                  the top consumers (default 0, disabled)
+    COSMOS_SLOW_QUERY_LOG         optional file the slow and expensive calls are appended to, one
+                                  JSON object per line
+
+Totals per shape and caller are exported to Prometheus (see metrics.py) and returned by
+`usage_stats`.
+"""
+
+import contextvars
+import json
+import os
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+
+from common.metrics import COSMOS_ALERTS, COSMOS_CALL_REQUEST_UNITS, COSMOS_CALL_SECONDS, COSMOS_CALLS
+
+# Load environment variables
+load_dotenv()
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Accounting configuration
+COSMOS_SLOW_QUERY_MS = float(os.getenv("COSMOS_SLOW_QUERY_MS", "500"))
+COSMOS_EXPENSIVE_QUERY_RU = float(os.getenv("COSMOS_EXPENSIVE_QUERY_RU", "50"))
+COSMOS_RU_ALERT_PER_MINUTE = float(os.getenv("COSMOS_RU_ALERT_PER_MINUTE", "0"))
+COSMOS_SLOW_QUERY_LOG = os.getenv("COSMOS_SLOW_QUERY_LOG", "")
+COSMOS_USAGE_MAX_SHAPES = int(os.getenv("COSMOS_USAGE_MAX_SHAPES", "500"))
+
+# Modules whose frames are skipped when looking for the caller of a Cosmos DB call
+INTERNAL_MODULES = {__name__, "common.cosmosdb", "common.cosmosdb_async", "common.lazy", "contextlib", "functools"}
+
+ALERT_WINDOW_SECONDS = 60.0
+MAX_SHAPE_LENGTH = 300
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# Numbers outside identifiers and parameters, except the constant of COUNT(1)
+NUMBER_LITERAL = re.compile(r"(?<![\w@.])(?<!COUNT\()-?\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(query: str) -> str:
+    """Normalize a query to its shape: literals become `?` and whitespace is collapsed."""
+    shape = STRING_LITERAL.sub("?", query)
+    shape = NUMBER_LITERAL.sub("?", shape)
+    shape = WHITESPACE.sub(" ", shape).strip()
+    return shape if len(shape) <= MAX_SHAPE_LENGTH else shape[:MAX_SHAPE_LENGTH] + "..."
+
+
+def find_caller() -> str:
+    """Name the first function on the stack outside the Cosmos DB modules, as `module.function`."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in INTERNAL_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class Usage:
+    """RUs and requests of one tracked call, accumulated while it runs."""
+
+    def __init__(self):
+        self.request_charge = 0.0
+        self.requests = 0
+        self.items: Optional[int] = None
+
+
+_current_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar("cosmos_usage", default=None)
+
+
+def record_response(pipeline_response: Any) -> None:
+    """Response hook of the Cosmos DB clients: add the request charge to the call being tracked."""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    usage.requests += 1
+    charge = pipeline_response.http_response.headers.get("x-ms-request-charge")
+    try:
+        usage.request_charge += float(charge or 0)
+    except ValueError:
+        pass
+
+
+class ShapeStats:
+    """Totals of the calls of one (shape, caller, scope)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.request_charge = 0.0
+        self.max_request_charge = 0.0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.items = 0
+        self.slow = 0
+        self.expensive = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "request_charge": round(self.request_charge, 2),
+            "mean_request_charge": round(self.request_charge / self.calls, 2) if self.calls else 0.0,
+            "max_request_charge": round(self.max_request_charge, 2),
+            "mean_ms": round(1000 * self.seconds / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(1000 * self.max_seconds, 1),
+            "items": self.items,
+            "slow": self.slow,
+            "expensive": self.expensive,
+        }
+
+
+class UsageTracker:
+    """Aggregates tracked calls, logs slow and expensive ones and raises RU-rate alerts."""
+
+    def __init__(self):
+        self.shapes: Dict[tuple, ShapeStats] = {}
+        # (time, request charge, key) of the calls in the alert window, and their total charge
+        self.recent: deque = deque()
+        self.window_charge = 0.0
+        self.last_alert: Optional[float] = None
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def record(self, operation: str, shape: str, caller: str, scope: str, usage: Usage, seconds: float) -> None:
+        charge = usage.request_charge
+        slow = seconds * 1000 > COSMOS_SLOW_QUERY_MS
+        expensive = charge > COSMOS_EXPENSIVE_QUERY_RU
+
+        now = time.monotonic()
+        alert = None
+        with self._lock:
+            key = (shape, caller, scope)
+            stats = self.shapes.get(key)
+            if stats is None:
+                if len(self.shapes) >= COSMOS_USAGE_MAX_SHAPES:
+                    # Keep the number of tracked (and exported) shapes bounded
+                    key = ("other", "other", scope)
+                stats = self.shapes.setdefault(key, ShapeStats())
+            stats.calls += 1
+            stats.request_charge += charge
+            stats.max_request_charge = max(stats.max_request_charge, charge)
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.items += usage.items or 0
+            stats.slow += slow
+            stats.expensive += expensive
+
+            if COSMOS_RU_ALERT_PER_MINUTE > 0:
+                self.recent.append((now, charge, key))
+                self.window_charge += charge
+                while self.recent[0][0] < now - ALERT_WINDOW_SECONDS:
+                    self.window_charge -= self.recent.popleft()[1]
+                if self.window_charge > COSMOS_RU_ALERT_PER_MINUTE and (
+                        self.last_alert is None or now - self.last_alert >= ALERT_WINDOW_SECONDS):
+                    self.last_alert = now
+                    alert = (self.window_charge, self._top_consumers())
+
+        COSMOS_CALLS.labels(*key).inc()
+        COSMOS_CALL_REQUEST_UNITS.labels(*key).inc(charge)
+        COSMOS_CALL_SECONDS.labels(*key).inc(seconds)
+
+        if slow or expensive:
+            self._log_call(operation, shape, caller, scope, usage, seconds, slow, expensive)
+        if alert is not None:
+            window_charge, top = alert
+            COSMOS_ALERTS.labels("ru_rate").inc()
+            consumers = "; ".join(f"{top_caller} [{top_shape}] {total:.1f} RU" for (top_shape, top_caller, _), total in top)
+            logger.error(f"Cosmos DB RU alert: {window_charge:.1f} RU in the last minute exceeds "
+                         f"COSMOS_RU_ALERT_PER_MINUTE={COSMOS_RU_ALERT_PER_MINUTE:g}. Top consumers: {consumers}")
+
+    def _top_consumers(self, limit: int = 3) -> List[tuple]:
+        """RUs per key over the alert window, highest first; must be called with the lock held."""
+        totals: Dict[tuple, float] = {}
+        for _, charge, key in self.recent:
+            totals[key] = totals.get(key, 0.0) + charge
+        return sorted(totals.items(), key=lambda entry: entry[1], reverse=True)[:limit]
+
+    def _log_call(self, operation: str, shape: str, caller: str, scope: str, usage: Usage, seconds: float,
+                  slow: bool, expensive: bool) -> None:
+        if slow:
+            COSMOS_ALERTS.labels("slow").inc()
+        if expensive:
+            COSMOS_ALERTS.labels("expensive").inc()
+        kind = " and ".join(label for label, flag in (("slow", slow), ("expensive", expensive)) if flag)
+        logger.warning(f"Cosmos DB {kind} {operation} from {caller}: {1000 * seconds:.0f} ms, "
+                       f"{usage.request_charge:.1f} RU, {usage.requests} requests ({scope}): {shape}")
+        if not COSMOS_SLOW_QUERY_LOG:
+            return
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "operation": operation,
+            "shape": shape,
+            "caller": caller,
+            "scope": scope,
+            "duration_ms": round(1000 * seconds, 1),
+            "request_charge": round(usage.request_charge, 2),
+            "requests": usage.requests,
+            "items": usage.items,
+            "slow": slow,
+            "expensive": expensive,
+        }
+        try:
+            directory = os.path.dirname(COSMOS_SLOW_QUERY_LOG)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._log_lock, open(COSMOS_SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write to COSMOS_SLOW_QUERY_LOG: {str(e)}")
+
+    def stats(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Totals per shape, caller and scope, most expensive first."""
+        with self._lock:
+            entries = [
+                {"shape": shape, "caller": caller, "scope": scope, **stats.snapshot()}
+                for (shape, caller, scope), stats in self.shapes.items()
+            ]
+        entries.sort(key=lambda entry: entry["request_charge"], reverse=True)
+        return entries[:limit] if limit else entries
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+            self.recent.clear()
+            self.window_charge = 0.0
+
+
+tracker = UsageTracker()
+
+
+@contextmanager
+def track_usage(operation: str, query: Optional[str] = None, cross_partition: bool = False) -> Iterator[Usage]:
+    """
+    Account for the RUs and latency of one Cosmos DB call.
+
+    Parameters
+    ----------
+    operation : str
+        The manager operation, e.g. "query_items" or "upsert_item".
+    query : str, optional
+        The query text; its shape identifies the call. Point operations are identified by `operation`.
+    cross_partition : bool
+        The call fans out across partitions.
+
+    Yields
+    ------
+    Usage
+        The accumulator; callers may set `items` to the number of items returned.
+    """
+    usage = Usage()
+    caller = find_caller()
+    token = _current_usage.set(usage)
+    started_at = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        seconds = time.perf_counter() - started_at
+        _current_usage.reset(token)
+        shape = query_shape(query) if query is not None else operation
+        scope = "cross-partition" if cross_partition else "partition"
+        try:
+            tracker.record(operation, shape, caller, scope, usage, seconds)
+        except Exception as e:
+            # Accounting must never break the call it observes
+            logger.warning(f"Could not record Cosmos DB usage: {str(e)}")
+
+
+def usage_stats(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return RU and latency totals per query shape and caller, most expensive first."""
+    return tracker.stats(limit)
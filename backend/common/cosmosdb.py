@@ -10,15 +10,20 @@ Requirements:
 """
 
 import os
+import re
+import hashlib
 import logging
-from functools import wraps
-from typing import List, Dict, Any, Optional
+from functools import lru_cache, wraps
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 from azure.cosmos import CosmosClient, exceptions, PartitionKey
 from azure.cosmos.container import ContainerProxy
 from azure.cosmos.database import DatabaseProxy
 from azure.identity import DefaultAzureCredential
 
+from common.cosmos_usage import record_response, track_usage
+from common.metrics import COSMOS, upstream_hooks
+
 # Load environment variables
 load_dotenv()
 
@@ -38,9 +43,38 @@ COSMOS_MASTER_KEY = os.environ.get("COSMOS_MASTER_KEY")
 COSMOS_DATABASE_ID = os.environ.get("COSMOS_DATABASE_ID")
 COSMOS_CONTAINER_ID = os.environ.get("COSMOS_CONTAINER_ID")
 
+# Skip the create-if-not-exists round trips at startup: "true" always, "false" never, or "auto" (the
+# default) once this machine has verified the database and container, as recorded by a marker file
+COSMOS_SKIP_CREATE = os.environ.get("COSMOS_SKIP_CREATE", "auto").lower()
+COSMOS_INIT_MARKER_DIR = os.environ.get("COSMOS_INIT_MARKER_DIR", ".cache")
+
 # Azure AD Tenant ID
 TENANT_ID = '16b3c013-d300-468d-ac64-7eda0820b6d3'
 
+# Document paths that may be used in generated queries, e.g. "section_id" or "requirements.output"
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+def _init_marker_path() -> str:
+    key = hashlib.sha1(f"{COSMOS_HOST}/{COSMOS_DATABASE_ID}/{COSMOS_CONTAINER_ID}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(COSMOS_INIT_MARKER_DIR, f"cosmos-{key}.initialized")
+
+def should_skip_create() -> bool:
+    """Return True when the database and container can be assumed to exist (see COSMOS_SKIP_CREATE)."""
+    if COSMOS_SKIP_CREATE in ("true", "false"):
+        return COSMOS_SKIP_CREATE == "true"
+    return os.path.exists(_init_marker_path())
+
+def mark_initialized() -> None:
+    """Record that the database and container exist, so later starts can skip creating them."""
+    if COSMOS_SKIP_CREATE != "auto":
+        return
+    try:
+        os.makedirs(COSMOS_INIT_MARKER_DIR, exist_ok=True)
+        with open(_init_marker_path(), "w"):
+            pass
+    except OSError as e:
+        logger.warning(f"Could not write Cosmos DB init marker: {e}")
+
 def cosmos_error_handler(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -51,6 +85,45 @@ def cosmos_error_handler(func):
             raise
     return wrapper
 
+@lru_cache(maxsize=256)
+def build_partition_query(select: str = "*", equals: Tuple[str, ...] = (), conditions: Tuple[str, ...] = (), suffix: str = "") -> str:
+    """
+    Build the text of a parameterized query scoped to a single partition.
+
+    The text only depends on the shape of the query, never on its values, so it is built once per
+    shape and reused.
+
+    Parameters
+    ----------
+    select : str
+        The SELECT clause, e.g. "*", "c.section_id, c.section_content" or "VALUE COUNT(1)".
+    equals : Tuple[str, ...]
+        Document paths compared for equality with a parameter named after the path
+        ("section_id" becomes "c.section_id = @section_id").
+    conditions : Tuple[str, ...]
+        Additional predicates, which must reference values through parameters only.
+    suffix : str
+        Trailing clauses such as "ORDER BY ..." or "OFFSET @offset LIMIT @limit".
+
+    Returns
+    -------
+    str
+        The query text.
+
+    Raises
+    ------
+    ValueError
+        If a path in `equals` is not a plain document path.
+    """
+    clauses = ["c.partitionKey = @partitionKey"]
+    for field in equals:
+        if not FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field name in query: {field}")
+        clauses.append(f"c.{field} = @{field.replace('.', '_')}")
+    clauses.extend(conditions)
+    query = f"SELECT {select} FROM c WHERE {' AND '.join(clauses)}"
+    return f"{query} {suffix}" if suffix else query
+
 class CosmosDBManager:
     _instance = None
     _is_initialized = False
@@ -80,7 +153,7 @@ class CosmosDBManager:
 
             if COSMOS_MASTER_KEY:
                 logger.info("Using key-based authentication for Cosmos DB")
-                self.client: CosmosClient = CosmosClient(COSMOS_HOST, {'masterKey': COSMOS_MASTER_KEY})
+                self.client: CosmosClient = CosmosClient(COSMOS_HOST, {'masterKey': COSMOS_MASTER_KEY}, **upstream_hooks(COSMOS, record_response))
             else:
                 logger.info("Using DefaultAzureCredential for Cosmos DB authentication")
                 credential = DefaultAzureCredential(
@@ -89,7 +162,7 @@ class CosmosDBManager:
                     workload_identity_tenant_id=TENANT_ID,
                     shared_cache_tenant_id=TENANT_ID
                 )
-                self.client: CosmosClient = CosmosClient(COSMOS_HOST, credential=credential)
+                self.client: CosmosClient = CosmosClient(COSMOS_HOST, credential=credential, **upstream_hooks(COSMOS, record_response))
 
             self.database: Optional[DatabaseProxy] = None
             self.container: Optional[ContainerProxy] = None
@@ -101,11 +174,19 @@ class CosmosDBManager:
         """
         Create database and container if they don't exist.
 
+        On warm starts (see COSMOS_SKIP_CREATE) the clients are created without any network calls.
+
         Raises
         ------
         exceptions.CosmosHttpResponseError
             If there's an error in creating or getting the database or container.
         """
+        if should_skip_create():
+            self.database = self.client.get_database_client(COSMOS_DATABASE_ID)
+            self.container = self.database.get_container_client(COSMOS_CONTAINER_ID)
+            logger.info("Skipping Cosmos DB database and container creation")
+            return
+
         try:
             try:
                 self.database = self.client.create_database(id=COSMOS_DATABASE_ID)
@@ -120,6 +201,7 @@ class CosmosDBManager:
             except exceptions.CosmosResourceExistsError:
                 self.container = self.database.get_container_client(COSMOS_CONTAINER_ID)
                 logger.info(f'Container with id \'{COSMOS_CONTAINER_ID}\' was found')
+            mark_initialized()
         except exceptions.CosmosHttpResponseError as e:
             logger.error(f'An error occurred: {e.message}')
             raise
@@ -127,14 +209,16 @@ class CosmosDBManager:
     @cosmos_error_handler
     def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new item in the container."""
-        created_item = self.container.create_item(body=item)
+        with track_usage("create_item"):
+            created_item = self.container.create_item(body=item)
         logger.info(f"Item created with id: {created_item['id']}")
         return created_item
 
     @cosmos_error_handler
     def read_item(self, item_id: str, partition_key: str) -> Dict[str, Any]:
         """Read an item from the container."""
-        item = self.container.read_item(item=item_id, partition_key=partition_key)
+        with track_usage("read_item"):
+            item = self.container.read_item(item=item_id, partition_key=partition_key)
         logger.info(f"Item read with id: {item['id']}")
         return item
 
@@ -143,33 +227,84 @@ class CosmosDBManager:
         """Update an item in the container."""
         item = self.read_item(item_id, partition_key)
         item.update(updates)
-        updated_item = self.container.upsert_item(body=item)
+        with track_usage("upsert_item"):
+            updated_item = self.container.upsert_item(body=item)
         logger.info(f"Item updated with id: {updated_item['id']}")
         return updated_item
 
+    @cosmos_error_handler
+    def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Create an item, or replace it if an item with the same id already exists."""
+        with track_usage("upsert_item"):
+            upserted_item = self.container.upsert_item(body=item)
+        logger.info(f"Item upserted with id: {upserted_item['id']}")
+        return upserted_item
+
     @cosmos_error_handler
     def delete_item(self, item_id: str, partition_key: str) -> None:
         """Delete an item from the container."""
-        self.container.delete_item(item=item_id, partition_key=partition_key)
+        with track_usage("delete_item"):
+            self.container.delete_item(item=item_id, partition_key=partition_key)
         logger.info(f"Item deleted with id: {item_id}")
 
     @cosmos_error_handler
     def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None, partition_key: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Query items from the container."""
-        items = list(self.container.query_items(
-            query=query,
-            parameters=parameters,
-            partition_key=partition_key,
-            enable_cross_partition_query=(partition_key is None)
-        ))
-        logger.info(f"Query returned {len(items)} items")
+        """Query items from the container, accounting for its RUs and latency per query shape and caller."""
+        with track_usage("query_items", query, cross_partition=partition_key is None) as usage:
+            items = list(self.container.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=partition_key,
+                enable_cross_partition_query=(partition_key is None)
+            ))
+            usage.items = len(items)
+        logger.info(f"Query returned {len(items)} items ({usage.request_charge:.1f} RU)")
         return items
 
+    def query_partition(self, partition_key: str, select: str = "*", equals: Optional[Dict[str, Any]] = None,
+                        conditions: Sequence[str] = (), parameters: Optional[Dict[str, Any]] = None,
+                        suffix: str = "") -> List[Dict[str, Any]]:
+        """
+        Run a parameterized query within a single partition.
+
+        Single-partition queries are routed straight to the partition that owns the key, skipping
+        the query plan request and fan-out of cross-partition queries.
+
+        Parameters
+        ----------
+        partition_key : str
+            The partition to query (the RFP name).
+        select : str
+            The SELECT clause.
+        equals : Optional[Dict[str, Any]]
+            Equality filters, mapping document paths to values.
+        conditions : Sequence[str]
+            Additional predicates, referencing values through `parameters`.
+        parameters : Optional[Dict[str, Any]]
+            Values for parameters used in `conditions` or `suffix`, keyed by name (e.g. "@offset").
+        suffix : str
+            Trailing clauses such as "OFFSET @offset LIMIT @limit".
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The matching items.
+        """
+        equals = equals or {}
+        query = build_partition_query(select, tuple(equals), tuple(conditions), suffix)
+        query_parameters = [{"name": "@partitionKey", "value": partition_key}]
+        query_parameters += [{"name": f"@{field.replace('.', '_')}", "value": value} for field, value in equals.items()]
+        query_parameters += [{"name": name, "value": value} for name, value in (parameters or {}).items()]
+        return self.query_items(query, query_parameters, partition_key)
+
+    def count_partition(self, partition_key: str, equals: Optional[Dict[str, Any]] = None,
+                        conditions: Sequence[str] = (), parameters: Optional[Dict[str, Any]] = None) -> int:
+        """Count the items of a partition matching the given filters (see `query_partition`)."""
+        return self.query_partition(partition_key, "VALUE COUNT(1)", equals, conditions, parameters)[0]
+
     def get_items_by_partition_key(self, partition_key: str) -> List[Dict[str, Any]]:
         """Retrieve all items for a specific partition key."""
-        query = "SELECT * FROM c WHERE c.partitionKey = @partitionKey"
-        parameters = [{"name": "@partitionKey", "value": partition_key}]
-        return self.query_items(query, parameters, partition_key)
+        return self.query_partition(partition_key)
 
 
 
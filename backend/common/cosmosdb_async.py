@@ -0,0 +1,244 @@
+"""
+This module is the asyncio counterpart of cosmosdb.py. It exposes the same method surface as
+CosmosDBManager (CRUD operations, raw queries and the parameterized single-partition query helpers)
+on top of the `azure.cosmos.aio` client, so pipelines can run thousands of concurrent Cosmos DB
+operations on one event loop instead of one thread per operation.
+
+Async clients are bound to the event loop they are used on, so there is one manager per event loop.
+All coroutines on a loop share that manager's client and its connection pool. Obtain it with
+`await AsyncCosmosDBManager.get_instance()`.
+
+Requirements:
+    azure-cosmos==4.5.1
+    azure-identity==1.17.1
+    aiohttp
+"""
+
+import asyncio
+import logging
+import weakref
+from functools import wraps
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import ContainerProxy, CosmosClient, DatabaseProxy
+from azure.identity.aio import DefaultAzureCredential
+
+from common.cosmosdb import (
+    COSMOS_CONTAINER_ID,
+    COSMOS_DATABASE_ID,
+    COSMOS_HOST,
+    COSMOS_MASTER_KEY,
+    TENANT_ID,
+    build_partition_query,
+    mark_initialized,
+    should_skip_create,
+)
+from common.cosmos_usage import record_response, track_usage
+from common.metrics import COSMOS, upstream_hooks
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def async_cosmos_error_handler(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f"Cosmos DB error in {func.__name__}: {e.message}")
+            raise
+    return wrapper
+
+class AsyncCosmosDBManager:
+    # One initialization task per event loop; awaiting it yields that loop's manager
+    _instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        """
+        Create the async CosmosDB client. Use `get_instance` rather than calling this directly.
+
+        Raises
+        ------
+        ValueError
+            If any of the required Cosmos DB configuration values are missing.
+        """
+        if not all([COSMOS_HOST, COSMOS_DATABASE_ID, COSMOS_CONTAINER_ID]):
+            raise ValueError("Cosmos DB configuration is incomplete")
+
+        self.credential: Optional[DefaultAzureCredential] = None
+        if COSMOS_MASTER_KEY:
+            logger.info("Using key-based authentication for async Cosmos DB client")
+            self.client: CosmosClient = CosmosClient(COSMOS_HOST, {'masterKey': COSMOS_MASTER_KEY}, **upstream_hooks(COSMOS, record_response))
+        else:
+            logger.info("Using DefaultAzureCredential for async Cosmos DB client")
+            self.credential = DefaultAzureCredential(
+                interactive_browser_tenant_id=TENANT_ID,
+                visual_studio_code_tenant_id=TENANT_ID,
+                workload_identity_tenant_id=TENANT_ID,
+                shared_cache_tenant_id=TENANT_ID
+            )
+            self.client: CosmosClient = CosmosClient(COSMOS_HOST, credential=self.credential, **upstream_hooks(COSMOS, record_response))
+
+        self.database: Optional[DatabaseProxy] = None
+        self.container: Optional[ContainerProxy] = None
+
+    @classmethod
+    async def get_instance(cls) -> "AsyncCosmosDBManager":
+        """
+        Return the manager for the running event loop, creating it on first use.
+
+        Concurrent first calls on the same loop share a single initialization.
+        """
+        loop = asyncio.get_running_loop()
+        task = cls._instances.get(loop)
+        if task is None or (task.done() and task.exception() is not None):
+            task = loop.create_task(cls._create())
+            cls._instances[loop] = task
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _create(cls) -> "AsyncCosmosDBManager":
+        logger.info("Initializing AsyncCosmosDBManager")
+        manager = cls()
+        await manager._initialize_database_and_container()
+        return manager
+
+    async def _initialize_database_and_container(self) -> None:
+        """
+        Create database and container if they don't exist, unless this is a warm start (see
+        COSMOS_SKIP_CREATE in cosmosdb.py).
+
+        Raises
+        ------
+        exceptions.CosmosHttpResponseError
+            If there's an error in creating or getting the database or container.
+        """
+        if should_skip_create():
+            self.database = self.client.get_database_client(COSMOS_DATABASE_ID)
+            self.container = self.database.get_container_client(COSMOS_CONTAINER_ID)
+            logger.info("Skipping Cosmos DB database and container creation")
+            return
+
+        try:
+            self.database = await self.client.create_database_if_not_exists(id=COSMOS_DATABASE_ID)
+            self.container = await self.database.create_container_if_not_exists(
+                id=COSMOS_CONTAINER_ID, partition_key=PartitionKey(path='/partitionKey'))
+            logger.info(f"Using database '{COSMOS_DATABASE_ID}' and container '{COSMOS_CONTAINER_ID}'")
+            mark_initialized()
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error(f'An error occurred: {e.message}')
+            raise
+
+    async def close(self) -> None:
+        """Close the client and its connection pool, and forget the manager for this loop."""
+        await self.client.close()
+        if self.credential is not None:
+            await self.credential.close()
+        try:
+            self._instances.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            pass
+
+    @async_cosmos_error_handler
+    async def create_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new item in the container."""
+        with track_usage("create_item"):
+            created_item = await self.container.create_item(body=item)
+        logger.info(f"Item created with id: {created_item['id']}")
+        return created_item
+
+    @async_cosmos_error_handler
+    async def read_item(self, item_id: str, partition_key: str) -> Dict[str, Any]:
+        """Read an item from the container."""
+        with track_usage("read_item"):
+            item = await self.container.read_item(item=item_id, partition_key=partition_key)
+        logger.info(f"Item read with id: {item['id']}")
+        return item
+
+    @async_cosmos_error_handler
+    async def update_item(self, item_id: str, updates: Dict[str, Any], partition_key: str) -> Dict[str, Any]:
+        """Update an item in the container."""
+        item = await self.read_item(item_id, partition_key)
+        item.update(updates)
+        with track_usage("upsert_item"):
+            updated_item = await self.container.upsert_item(body=item)
+        logger.info(f"Item updated with id: {updated_item['id']}")
+        return updated_item
+
+    @async_cosmos_error_handler
+    async def upsert_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Create an item, or replace it if an item with the same id already exists."""
+        with track_usage("upsert_item"):
+            upserted_item = await self.container.upsert_item(body=item)
+        logger.info(f"Item upserted with id: {upserted_item['id']}")
+        return upserted_item
+
+    @async_cosmos_error_handler
+    async def delete_item(self, item_id: str, partition_key: str) -> None:
+        """Delete an item from the container."""
+        with track_usage("delete_item"):
+            await self.container.delete_item(item=item_id, partition_key=partition_key)
+        logger.info(f"Item deleted with id: {item_id}")
+
+    async def iter_query(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None,
+                         partition_key: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the results of a query, fetching pages from the service as they are consumed."""
+        # The async client queries across partitions automatically when no partition key is given
+        async for item in self.container.query_items(query=query, parameters=parameters, partition_key=partition_key):
+            yield item
+
+    @async_cosmos_error_handler
+    async def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None, partition_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Query items from the container, accounting for its RUs and latency per query shape and caller."""
+        with track_usage("query_items", query, cross_partition=partition_key is None) as usage:
+            items = [item async for item in self.iter_query(query, parameters, partition_key)]
+            usage.items = len(items)
+        logger.info(f"Query returned {len(items)} items ({usage.request_charge:.1f} RU)")
+        return items
+
+    async def query_partition(self, partition_key: str, select: str = "*", equals: Optional[Dict[str, Any]] = None,
+                              conditions: Sequence[str] = (), parameters: Optional[Dict[str, Any]] = None,
+                              suffix: str = "") -> List[Dict[str, Any]]:
+        """Run a parameterized query within a single partition (see `CosmosDBManager.query_partition`)."""
+        equals = equals or {}
+        query = build_partition_query(select, tuple(equals), tuple(conditions), suffix)
+        query_parameters = [{"name": "@partitionKey", "value": partition_key}]
+        query_parameters += [{"name": f"@{field.replace('.', '_')}", "value": value} for field, value in equals.items()]
+        query_parameters += [{"name": name, "value": value} for name, value in (parameters or {}).items()]
+        return await self.query_items(query, query_parameters, partition_key)
+
+    async def count_partition(self, partition_key: str, equals: Optional[Dict[str, Any]] = None,
+                              conditions: Sequence[str] = (), parameters: Optional[Dict[str, Any]] = None) -> int:
+        """Count the items of a partition matching the given filters (see `query_partition`)."""
+        return (await self.query_partition(partition_key, "VALUE COUNT(1)", equals, conditions, parameters))[0]
+
+    async def get_items_by_partition_key(self, partition_key: str) -> List[Dict[str, Any]]:
+        """Retrieve all items for a specific partition key."""
+        return await self.query_partition(partition_key)
+
+async def run_examples():
+    """Example usage of the AsyncCosmosDBManager class."""
+    cosmos_db = await AsyncCosmosDBManager.get_instance()
+    try:
+        logger.info("Connected to Cosmos DB")
+
+        # Create many items concurrently on one event loop
+        await asyncio.gather(*[
+            cosmos_db.upsert_item({'id': f'item{i}', 'partitionKey': 'example_partition', 'value': i})
+            for i in range(100)
+        ])
+
+        # Query them back from the single partition
+        items = await cosmos_db.get_items_by_partition_key('example_partition')
+        logger.info(f"Found {len(items)} items")
+
+        # Delete them concurrently
+        await asyncio.gather(*[cosmos_db.delete_item(item['id'], 'example_partition') for item in items])
+
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}")
+    finally:
+        await cosmos_db.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_examples())
@@ -0,0 +1,228 @@
+"""
+### embeddings.py ###
+
+This module provides a shared embedding service on top of Azure OpenAI. It replaces the per-module
+`generate_embeddings` helpers, which sent one string per request, with a service that:
+
+    - batches many inputs into a single embeddings API call
+    - deduplicates identical inputs before calling the API
+    - caches vectors by text hash, in memory and on disk (compact float32 files)
+    - sends independent batches concurrently
+
+The disk cache lives in EMBEDDING_CACHE_DIR (default `.cache/embeddings`) and can be disabled by
+setting it to an empty string. Each vector is stored as raw float32 values in a file named after
+the SHA-256 of the model name and input text.
+
+Requirements:
+    openai==1.35.13
+    python-dotenv
+"""
+
+import os
+import logging
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+from openai import AzureOpenAI
+
+from common.metrics import LLM, observe_upstream
+
+# Load environment variables
+load_dotenv()
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING)  # Set to WARNING to suppress INFO logs
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)  # Set our logger to INFO
+
+# Disable other loggers
+logging.getLogger('openai').setLevel(logging.WARNING)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Embedding configuration
+EMBEDDING_DEPLOYMENT = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_MAX_WORKERS = int(os.environ.get("EMBEDDING_MAX_WORKERS", "4"))
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_MEMORY_CACHE_SIZE = int(os.environ.get("EMBEDDING_MEMORY_CACHE_SIZE", "10000"))
+
+
+class EmbeddingService:
+    _instance = None
+    _is_initialized = False
+
+    def __new__(cls):
+        """Control instance creation to ensure only one instance exists."""
+        if cls._instance is None:
+            logger.info("Creating new EmbeddingService instance")
+            cls._instance = super(EmbeddingService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Initialize the Azure OpenAI client and the embedding caches if not already initialized."""
+        if not self._is_initialized:
+            logger.info("Initializing EmbeddingService")
+            self.model = EMBEDDING_DEPLOYMENT
+            self.batch_size = max(1, EMBEDDING_BATCH_SIZE)
+            self.max_workers = max(1, EMBEDDING_MAX_WORKERS)
+            self.cache_dir = EMBEDDING_CACHE_DIR or None
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+
+            self.client = AzureOpenAI(
+                azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+                api_key=os.environ.get("AZURE_OPENAI_API_KEY") or os.environ.get("AZURE_OPENAI_KEY"),
+                api_version="2024-02-01"
+            )
+
+            self._memory_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+            self._memory_cache_size = EMBEDDING_MEMORY_CACHE_SIZE
+            self._cache_lock = threading.Lock()
+            EmbeddingService._is_initialized = True
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.f32")
+
+    def _get_cached(self, key: str) -> Optional[List[float]]:
+        with self._cache_lock:
+            vector = self._memory_cache.get(key)
+            if vector is not None:
+                self._memory_cache.move_to_end(key)
+                return vector
+
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self._cache_path(key), "rb") as f:
+                values = array("f")
+                values.frombytes(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable embedding cache entry {key}: {str(e)}")
+            return None
+
+        vector = values.tolist()
+        self._remember(key, vector)
+        return vector
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._cache_lock:
+            self._memory_cache[key] = vector
+            self._memory_cache.move_to_end(key)
+            while len(self._memory_cache) > self._memory_cache_size:
+                self._memory_cache.popitem(last=False)
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        self._remember(key, vector)
+        if not self.cache_dir:
+            return
+
+        path = self._cache_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(array("f", vector).tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write embedding cache entry {key}: {str(e)}")
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with observe_upstream(LLM, "embeddings"):
+            response = self.client.embeddings.create(input=texts, model=self.model)
+        # The API does not guarantee ordering, so place each vector by its index
+        vectors: List[List[float]] = [None] * len(texts)
+        for item in response.data:
+            vectors[item.index] = item.embedding
+        return vectors
+
+    def generate_embeddings_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many texts, using the cache and batching the misses.
+
+        Parameters
+        ----------
+        texts : Sequence[str]
+            The texts to embed. Duplicates are embedded only once.
+
+        Returns
+        -------
+        List[List[float]]
+            One embedding vector per input text, in input order.
+        """
+        keys = [self._cache_key(text) for text in texts]
+        vectors_by_key: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in vectors_by_key or key in missing:
+                continue
+            cached = self._get_cached(key)
+            if cached is not None:
+                vectors_by_key[key] = cached
+            else:
+                missing[key] = text
+
+        if missing:
+            missing_keys = list(missing.keys())
+            batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+            logger.info(f"Embedding {len(missing_keys)} texts in {len(batches)} batches "
+                        f"({len(texts) - len(missing_keys)} served from cache or deduplicated)")
+
+            def embed(batch_keys: List[str]) -> None:
+                batch_vectors = self._embed_batch([missing[key] for key in batch_keys])
+                for key, vector in zip(batch_keys, batch_vectors):
+                    self._store(key, vector)
+                    vectors_by_key[key] = vector
+
+            if len(batches) == 1:
+                embed(batches[0])
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                    # list() re-raises the first batch failure
+                    list(executor.map(embed, batches))
+
+        return [vectors_by_key[key] for key in keys]
+
+    def generate_embeddings(self, text: str) -> List[float]:
+        """Generate the embedding for a single text, using the cache when possible."""
+        return self.generate_embeddings_batch([text])[0]
+
+
+def generate_embeddings(text: str) -> List[float]:
+    """Generate the embedding for a single text with the shared EmbeddingService."""
+    return EmbeddingService().generate_embeddings(text)
+
+
+def generate_embeddings_batch(texts: Sequence[str]) -> List[List[float]]:
+    """Generate embeddings for many texts with the shared EmbeddingService."""
+    return EmbeddingService().generate_embeddings_batch(texts)
+
+
+def run_examples():
+    try:
+        embedding_service = EmbeddingService()
+
+        # Single text
+        vector = embedding_service.generate_embeddings("Cloud migration experience")
+        logger.info(f"Generated a vector with {len(vector)} dimensions")
+
+        # Many texts in one call; the repeated text is only embedded once
+        texts = ["Project management", "Data engineering", "Project management"]
+        vectors = embedding_service.generate_embeddings_batch(texts)
+        logger.info(f"Generated {len(vectors)} vectors")
+
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}")
+
+if __name__ == "__main__":
+    run_examples()
@@ -0,0 +1,56 @@
+"""
+### lazy.py ###
+
+This module provides LazyClient, a proxy that defers constructing a client until it is first used.
+Modules keep declaring their clients at module level (`cosmos_manager = LazyClient(CosmosDBManager)`),
+but importing a module no longer opens connections, resolves credentials or builds HTTP clients, which
+keeps application startup fast. Construction happens once, on first attribute access, and is
+thread-safe.
+"""
+
+import threading
+from typing import Any, Callable
+
+_UNSET = object()
+
+
+class LazyClient:
+    """
+    Proxy that builds its target with `factory` on first attribute access and forwards to it.
+
+    Parameters
+    ----------
+    factory : Callable[[], Any]
+        Zero-argument callable returning the client, e.g. a class or a lambda.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_instance", _UNSET)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+
+    def resolve(self) -> Any:
+        """Return the underlying client, constructing it if needed."""
+        instance = self._lazy_instance
+        if instance is _UNSET:
+            with self._lazy_lock:
+                instance = self._lazy_instance
+                if instance is _UNSET:
+                    instance = self._lazy_factory()
+                    object.__setattr__(self, "_lazy_instance", instance)
+        return instance
+
+    @property
+    def is_resolved(self) -> bool:
+        return self._lazy_instance is not _UNSET
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self) -> str:
+        if self.is_resolved:
+            return f"LazyClient({self._lazy_instance!r})"
+        return f"LazyClient(<unresolved {getattr(self._lazy_factory, '__name__', 'factory')}>)"
@@ -0,0 +1,759 @@
+"""
+### llm_router.py ###
+
+This module routes chat completions across several Azure OpenAI deployments. Every module used to
+send its requests to the single AZURE_OPENAI_DEPLOYMENT_NAME, so a large extraction run exhausted
+the quota that interactive chat needed. The router:
+
+    - knows several deployments, each with its own TPM/RPM limits and the workload classes it serves
+    - routes each call by workload class ("interactive" for user-facing calls, "batch" for pipelines)
+    - load-balances with least-outstanding-tokens, relative to each deployment's TPM limit
+    - fails over to another deployment on 429s (honouring Retry-After), timeouts and 5xx errors
+    - admits calls only within each deployment's token and request budgets and its adaptive
+      concurrency limit (see rate_limit.py), so callers queue instead of retrying into 429s
+    - gives queued interactive calls priority over batch calls (see llm_scheduler.py)
+
+Deployments are configured with AZURE_OPENAI_DEPLOYMENTS, a JSON list such as:
+
+    [
+        {"name": "gpt4o-east", "deployment": "gpt-4o", "endpoint": "https://east.openai.azure.com/",
+         "api_key": "...", "tpm": 450000, "rpm": 2700, "workloads": ["interactive"]},
+        {"name": "gpt4o-west", "deployment": "gpt-4o", "endpoint": "https://west.openai.azure.com/",
+         "api_key": "...", "tpm": 300000, "rpm": 1800, "workloads": ["interactive", "batch"]}
+    ]
+
+`api_key`, `api_version` and `endpoint` default to the single-deployment settings, and `workloads`
+defaults to both classes. Without AZURE_OPENAI_DEPLOYMENTS the router uses AZURE_OPENAI_DEPLOYMENT_NAME
+alone, so existing environments keep working. Endpoints may point at local fake servers for testing,
+or `LLMRouter().configure(client_factory=...)` can replace the clients altogether.
+
+Modules declare their models with `RoutedChatModel`, which exposes the `invoke`/`stream`/`ainvoke`/
+`astream`/`bind_tools` surface of `AzureChatOpenAI`.
+
+Requirements:
+    langchain-openai==0.1.15
+    openai==1.35.13
+"""
+
+import asyncio
+import json
+import os
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import openai
+from dotenv import load_dotenv
+from langchain_openai import AzureChatOpenAI
+
+from common.llm_scheduler import BATCH, INTERACTIVE, WORKLOADS, PriorityScheduler
+from common.metrics import LLM, LLM_QUEUE_WAIT, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS, UPSTREAM_RETRIES
+from common.metrics import UPSTREAM_SECONDS, UPSTREAM_THROTTLES, outcome_of
+from common.rate_limit import RateLimiter
+from common.tracing import end_span, span, start_span
+
+# Load environment variables
+load_dotenv()
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Router configuration
+AZURE_OPENAI_DEPLOYMENTS = os.getenv("AZURE_OPENAI_DEPLOYMENTS", "")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-05-01-preview")
+LLM_ROUTER_MAX_ATTEMPTS = int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", "4"))
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "10"))
+LLM_ROUTER_ERROR_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_ERROR_COOLDOWN_SECONDS", "2"))
+LLM_ROUTER_MAX_WAIT_SECONDS = float(os.getenv("LLM_ROUTER_MAX_WAIT_SECONDS", "60"))
+LLM_ROUTER_COMPLETION_TOKENS = int(os.getenv("LLM_ROUTER_COMPLETION_TOKENS", "1000"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+
+ATTEMPTS = max(1, LLM_ROUTER_MAX_ATTEMPTS)
+# Upper bound on a single wait, so waiting callers periodically re-check budgets and cooldowns
+MAX_IDLE_WAIT_SECONDS = 1.0
+# Async callers cannot be notified when a call finishes, so they poll for a free concurrency slot
+ASYNC_POLL_SECONDS = 0.05
+
+# Rough characters-per-token ratio used to estimate prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+class NoDeploymentAvailable(RuntimeError):
+    """Raised when no deployment serves a workload, or all of them stay unavailable for too long."""
+
+
+class Deployment:
+    """
+    One Azure OpenAI deployment and its routing state.
+
+    Parameters
+    ----------
+    name : str
+        Unique name used in logs and statistics.
+    deployment : str
+        Azure OpenAI deployment name.
+    endpoint : str
+        Azure OpenAI endpoint URL.
+    api_key : str
+        API key for the endpoint.
+    api_version : str
+        Azure OpenAI API version.
+    tpm : int, optional
+        Tokens-per-minute limit of the deployment; enforced client-side and used to weight load
+        balancing.
+    rpm : int, optional
+        Requests-per-minute limit of the deployment; enforced client-side.
+    workloads : Sequence[str]
+        Workload classes this deployment serves.
+    """
+
+    def __init__(self, name: str, deployment: str, endpoint: str, api_key: str,
+                 api_version: str = AZURE_OPENAI_API_VERSION, tpm: Optional[int] = None,
+                 rpm: Optional[int] = None, workloads: Sequence[str] = WORKLOADS):
+        unknown = set(workloads) - set(WORKLOADS)
+        if unknown:
+            raise ValueError(f"Deployment '{name}' has unknown workload classes: {sorted(unknown)}")
+        self.name = name
+        self.deployment = deployment
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.tpm = tpm
+        self.rpm = rpm
+        self.workloads = tuple(workloads)
+        self.limiter = RateLimiter(name, tpm, rpm)
+
+        self.outstanding_tokens = 0
+        self.outstanding_requests = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def serves(self, workload: str) -> bool:
+        return workload in self.workloads
+
+    def load(self) -> float:
+        """Outstanding tokens relative to the deployment's TPM limit (absolute when unknown)."""
+        return self.outstanding_tokens / self.tpm if self.tpm else float(self.outstanding_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "deployment": self.deployment,
+            "workloads": list(self.workloads),
+            "tpm": self.tpm,
+            "rpm": self.rpm,
+            "outstanding_tokens": self.outstanding_tokens,
+            "outstanding_requests": self.outstanding_requests,
+            "cooling_down_for": max(0.0, self.cooldown_until - time.monotonic()),
+            "requests": self.requests,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            **self.limiter.stats(),
+        }
+
+    def __repr__(self) -> str:
+        return f"Deployment({self.name!r}, deployment={self.deployment!r}, workloads={self.workloads!r})"
+
+
+def load_deployments() -> List[Deployment]:
+    """
+    Build the deployment list from AZURE_OPENAI_DEPLOYMENTS, or from the single-deployment settings.
+
+    Raises
+    ------
+    ValueError
+        If AZURE_OPENAI_DEPLOYMENTS is not a JSON list of deployment objects.
+    """
+    default_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+    default_key = os.getenv("AZURE_OPENAI_API_KEY")
+
+    if not AZURE_OPENAI_DEPLOYMENTS.strip():
+        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+        return [Deployment(deployment or "default", deployment, default_endpoint, default_key)]
+
+    try:
+        entries = json.loads(AZURE_OPENAI_DEPLOYMENTS)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"AZURE_OPENAI_DEPLOYMENTS is not valid JSON: {str(e)}")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("AZURE_OPENAI_DEPLOYMENTS must be a non-empty JSON list")
+
+    deployments = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("deployment"):
+            raise ValueError(f"AZURE_OPENAI_DEPLOYMENTS entry {index} must be an object with a 'deployment'")
+        deployments.append(Deployment(
+            name=entry.get("name", f"{entry['deployment']}-{index}"),
+            deployment=entry["deployment"],
+            endpoint=entry.get("endpoint", default_endpoint),
+            api_key=entry.get("api_key", default_key),
+            api_version=entry.get("api_version", AZURE_OPENAI_API_VERSION),
+            tpm=entry.get("tpm"),
+            rpm=entry.get("rpm"),
+            workloads=entry.get("workloads", WORKLOADS),
+        ))
+
+    names = [deployment.name for deployment in deployments]
+    if len(set(names)) != len(names):
+        raise ValueError("AZURE_OPENAI_DEPLOYMENTS entries must have unique names")
+    return deployments
+
+
+def build_azure_client(deployment: Deployment, json_mode: bool, **client_kwargs: Any) -> AzureChatOpenAI:
+    """
+    Create the LangChain client for a deployment.
+
+    Retries are disabled on the client: the router handles them by failing over to another deployment.
+    `client_kwargs` are passed on to `AzureChatOpenAI`, e.g. `http_client` to send the requests
+    through a different transport.
+    """
+    model_kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+    return AzureChatOpenAI(
+        azure_deployment=deployment.deployment,
+        api_version=deployment.api_version,
+        temperature=0,
+        max_tokens=None,
+        timeout=LLM_REQUEST_TIMEOUT,
+        max_retries=0,
+        api_key=deployment.api_key,
+        azure_endpoint=deployment.endpoint,
+        model_kwargs=model_kwargs,
+        **client_kwargs
+    )
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Estimate the tokens a call consumes: its prompt size plus the expected completion size."""
+    if isinstance(messages, str):
+        messages = [messages]
+    characters = 0
+    for message in messages:
+        if isinstance(message, dict):
+            content = message.get("content")
+        elif isinstance(message, (tuple, list)) and len(message) == 2:
+            content = message[1]
+        else:
+            content = getattr(message, "content", message)
+        characters += len(content) if isinstance(content, str) else len(str(content))
+    return characters // CHARS_PER_TOKEN + LLM_ROUTER_COMPLETION_TOKENS
+
+
+def reported_tokens(result: Any) -> Optional[int]:
+    """Total tokens the service reported for a completed call, if available."""
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+def reported_completion_tokens(result: Any) -> Optional[int]:
+    """Output tokens the service reported for a completed call, if available."""
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    return usage.get("completion_tokens")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After delay from a throttled response, if the service sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+
+def failover_cooldown(error: Exception) -> Optional[float]:
+    """
+    Decide whether a failed call should move to another deployment.
+
+    Returns
+    -------
+    Optional[float]
+        Seconds to take the failing deployment out of rotation, or None if the error is not
+        retryable (e.g. a bad request, which would fail on every deployment).
+    """
+    if isinstance(error, openai.RateLimitError):
+        retry_after = retry_after_seconds(error)
+        return LLM_ROUTER_COOLDOWN_SECONDS if retry_after is None else retry_after
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return LLM_ROUTER_ERROR_COOLDOWN_SECONDS
+    return None
+
+
+class Lease:
+    """Capacity reserved on a deployment for one call."""
+
+    def __init__(self, deployment: Deployment, tokens: int, workload: str):
+        self.deployment = deployment
+        self.tokens = tokens
+        self.workload = workload
+        self.started_at = time.monotonic()
+
+    def prompt_tokens(self) -> int:
+        """Estimated prompt tokens, i.e. the reservation without the expected completion."""
+        return max(0, self.tokens - LLM_ROUTER_COMPLETION_TOKENS)
+
+
+def call_attributes(workload: str, json_mode: bool, tokens: int) -> Dict[str, Any]:
+    """Span attributes describing an LLM call before it is routed."""
+    return {
+        "gen_ai.system": "az.ai.openai",
+        "llm.workload": workload,
+        "llm.json_mode": json_mode,
+        "llm.estimated_tokens": tokens,
+    }
+
+
+def trace_attempt(current: Any, lease: "Lease", requested_at: float, attempt: int) -> None:
+    current.set_attributes({
+        "llm.deployment": lease.deployment.name,
+        "gen_ai.request.model": lease.deployment.deployment,
+        "llm.attempts": attempt + 1,
+        "llm.queue_seconds": lease.started_at - requested_at,
+    })
+
+
+def record_failover(current: Any, lease: "Lease", error: Exception) -> None:
+    current.add_event("llm.failover", {"llm.deployment": lease.deployment.name, "exception.type": type(error).__name__})
+    UPSTREAM_RETRIES.labels(LLM).inc()
+
+
+def record_usage(lease: "Lease", result: Any) -> None:
+    """Count the tokens the service reported for a completed call."""
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    for direction, key in (("input", "prompt_tokens"), ("output", "completion_tokens")):
+        if usage.get(key):
+            LLM_TOKENS.labels(lease.deployment.name, lease.workload, direction).inc(usage[key])
+
+
+def trace_usage(current: Any, result: Any) -> None:
+    """Record the token usage the service reported for a completed call."""
+    metadata = getattr(result, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or {}
+    if usage.get("prompt_tokens") is not None:
+        current.set_attribute("gen_ai.usage.input_tokens", usage["prompt_tokens"])
+    if usage.get("completion_tokens") is not None:
+        current.set_attribute("gen_ai.usage.output_tokens", usage["completion_tokens"])
+
+
+class StreamStats:
+    """Time-to-first-token and output size of a streamed call."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.first_chunk_at: Optional[float] = None
+        self.chunks = 0
+        self.characters = 0
+
+    def add(self, chunk: Any) -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+        self.chunks += 1
+        content = getattr(chunk, "content", "")
+        self.characters += len(content) if isinstance(content, str) else 0
+
+    def record(self, lease: "Lease") -> None:
+        """Record time-to-first-token and estimated token counts of the attempt that produced output."""
+        if self.first_chunk_at is not None:
+            LLM_TIME_TO_FIRST_TOKEN.labels(lease.workload).observe(self.first_chunk_at - self.started_at)
+        LLM_TOKENS.labels(lease.deployment.name, lease.workload, "input").inc(lease.prompt_tokens())
+        LLM_TOKENS.labels(lease.deployment.name, lease.workload, "output").inc(self.characters // CHARS_PER_TOKEN)
+
+    def trace(self, current: Any) -> None:
+        if self.first_chunk_at is not None:
+            current.set_attribute("llm.time_to_first_token", self.first_chunk_at - self.started_at)
+        current.set_attributes({
+            "llm.chunks": self.chunks,
+            "llm.output_characters": self.characters,
+            # Streamed responses carry no usage, so output tokens are estimated from the text
+            "gen_ai.usage.output_tokens": self.characters // CHARS_PER_TOKEN,
+        })
+
+
+class LLMRouter:
+    _instance = None
+    _is_initialized = False
+
+    def __new__(cls):
+        """Control instance creation to ensure only one instance exists."""
+        if cls._instance is None:
+            logger.info("Creating new LLMRouter instance")
+            cls._instance = super(LLMRouter, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Load the deployments if not already initialized."""
+        if not self._is_initialized:
+            logger.info("Initializing LLMRouter")
+            self._lock = threading.Lock()
+            # Notified whenever a call finishes, so waiting callers re-check for capacity
+            self._released = threading.Condition(self._lock)
+            self.scheduler = PriorityScheduler()
+            self.configure(load_deployments(), build_azure_client)
+            LLMRouter._is_initialized = True
+
+    def configure(self, deployments: Optional[List[Deployment]] = None,
+                  client_factory: Optional[Callable[[Deployment, bool], Any]] = None) -> None:
+        """
+        Replace the deployments and/or the client factory, e.g. to route to local fakes.
+
+        Parameters
+        ----------
+        deployments : List[Deployment], optional
+            New deployment list.
+        client_factory : Callable[[Deployment, bool], Any], optional
+            Called with (deployment, json_mode); must return an object with the chat model interface.
+        """
+        with self._lock:
+            if deployments is not None:
+                if not deployments:
+                    raise ValueError("At least one deployment is required")
+                self.deployments = list(deployments)
+                logger.info(f"Routing LLM calls across deployments: {[d.name for d in self.deployments]}")
+            if client_factory is not None:
+                self.client_factory = client_factory
+            self._clients: Dict[Tuple[str, bool], Any] = {}
+
+    def get_client(self, deployment: Deployment, json_mode: bool = False, tools: Optional[list] = None) -> Any:
+        """Return the cached client of a deployment, with tools bound when given."""
+        key = (deployment.name, json_mode)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.client_factory(deployment, json_mode)
+                    self._clients[key] = client
+        return client.bind_tools(tools) if tools else client
+
+    def _select(self, workload: str, tokens: int, exclude: Sequence[str]) -> Tuple[Optional[Lease], Optional[float], bool]:
+        """
+        Admit a call on the least-loaded deployment that has rate budget and concurrency for it.
+        Must be called with the lock held.
+
+        Returns
+        -------
+        Tuple[Optional[Lease], Optional[float], bool]
+            The lease if admitted; otherwise the seconds until a budget or cooldown may allow the
+            call (None when it only waits for a call to finish), and whether every deployment for
+            the workload is out of rotation.
+        """
+        candidates = [d for d in self.deployments if d.serves(workload)]
+        if not candidates:
+            raise NoDeploymentAvailable(f"No deployment serves the '{workload}' workload")
+
+        now = time.monotonic()
+        available = [d for d in candidates if d.cooldown_until <= now]
+        if not available:
+            return None, min(d.cooldown_until for d in candidates) - now, True
+
+        # Prefer deployments this call has not failed on yet
+        untried = [d for d in available if d.name not in exclude]
+        waits = []
+        for deployment in sorted(untried or available, key=lambda d: (d.load(), d.outstanding_requests)):
+            if not self.scheduler.may_use(workload, deployment):
+                continue
+            wait = deployment.limiter.try_acquire(tokens, self.scheduler.reserve(workload, deployment))
+            if wait == 0.0:
+                deployment.outstanding_tokens += tokens
+                deployment.outstanding_requests += 1
+                deployment.requests += 1
+                return Lease(deployment, tokens, workload), 0.0, False
+            if wait is not None:
+                waits.append(wait)
+        return None, min(waits) if waits else None, False
+
+    def acquire(self, workload: str, tokens: int, exclude: Sequence[str] = ()) -> Lease:
+        """
+        Reserve capacity for a call, waiting for rate budget, a concurrency slot or the end of a
+        cooldown; interactive calls are served before batch calls. Gives up with
+        NoDeploymentAvailable if every deployment stays out of rotation for longer than
+        LLM_ROUTER_MAX_WAIT_SECONDS.
+        """
+        start = time.monotonic()
+        deadline = start + LLM_ROUTER_MAX_WAIT_SECONDS
+        queued = False
+        with self._released:
+            try:
+                while True:
+                    lease, wait, cooling = self._select(workload, tokens, exclude)
+                    if lease is not None:
+                        self._admitted(workload, start, queued)
+                        queued = False
+                        return lease
+                    if cooling and time.monotonic() + wait > deadline:
+                        raise NoDeploymentAvailable(f"All '{workload}' deployments are unavailable")
+                    if not queued:
+                        self.scheduler.enqueue(workload)
+                        queued = True
+                    self._released.wait(min(wait, MAX_IDLE_WAIT_SECONDS) if wait is not None else MAX_IDLE_WAIT_SECONDS)
+            finally:
+                if queued:
+                    self.scheduler.abandon(workload)
+
+    async def aacquire(self, workload: str, tokens: int, exclude: Sequence[str] = ()) -> Lease:
+        """Async variant of `acquire`; waits without blocking the event loop."""
+        start = time.monotonic()
+        deadline = start + LLM_ROUTER_MAX_WAIT_SECONDS
+        queued = False
+        try:
+            while True:
+                with self._released:
+                    lease, wait, cooling = self._select(workload, tokens, exclude)
+                    if lease is not None:
+                        self._admitted(workload, start, queued)
+                        queued = False
+                        return lease
+                if cooling and time.monotonic() + wait > deadline:
+                    raise NoDeploymentAvailable(f"All '{workload}' deployments are unavailable")
+                if not queued:
+                    self.scheduler.enqueue(workload)
+                    queued = True
+                await asyncio.sleep(min(wait, MAX_IDLE_WAIT_SECONDS) if wait is not None else ASYNC_POLL_SECONDS)
+        finally:
+            # Also runs when the waiting task is cancelled
+            if queued:
+                self.scheduler.abandon(workload)
+
+    def _admitted(self, workload: str, start: float, queued: bool) -> None:
+        """Record an admission; must be called with the lock held."""
+        wait = time.monotonic() - start
+        self.scheduler.admit(workload, wait, queued)
+        LLM_QUEUE_WAIT.labels(workload).observe(wait)
+        if queued and workload == INTERACTIVE:
+            # Batch callers held back for this call may proceed now
+            self._released.notify_all()
+
+    def release(self, lease: Lease, error: Optional[Exception] = None, result: Any = None) -> Optional[float]:
+        """
+        Return a lease, feeding the outcome to the deployment's limiter and taking the deployment
+        out of rotation if the call should fail over.
+
+        Returns
+        -------
+        Optional[float]
+            The cooldown applied, or None if the error (if any) is not retryable.
+        """
+        deployment = lease.deployment
+        cooldown = failover_cooldown(error) if error is not None else None
+        status = 200 if error is None else getattr(error, "status_code", None) or 500
+        UPSTREAM_SECONDS.labels(LLM, deployment.name, outcome_of(status)).observe(time.monotonic() - lease.started_at)
+        if isinstance(error, openai.RateLimitError):
+            UPSTREAM_THROTTLES.labels(LLM).inc()
+        elif error is None and result is not None:
+            record_usage(lease, result)
+        # Streamed calls report no usage (and their duration includes the consumer's), so only
+        # completed non-streamed calls feed the latency signal
+        deployment.limiter.release(
+            lease.started_at, lease.tokens, reported_tokens(result),
+            throttled=isinstance(error, (openai.RateLimitError, openai.APITimeoutError)),
+            succeeded=error is None, completion_tokens=reported_completion_tokens(result),
+            workload=lease.workload
+        )
+        with self._released:
+            deployment.outstanding_tokens -= lease.tokens
+            deployment.outstanding_requests -= 1
+            if error is not None:
+                deployment.failures += 1
+            if cooldown is not None:
+                if isinstance(error, openai.RateLimitError):
+                    deployment.rate_limited += 1
+                deployment.cooldown_until = max(deployment.cooldown_until, time.monotonic() + cooldown)
+            self._released.notify_all()
+        if cooldown is not None:
+            logger.warning(f"Deployment '{deployment.name}' failed ({type(error).__name__}); "
+                           f"out of rotation for {cooldown:.1f}s")
+        return cooldown
+
+    def invoke(self, messages: Any, workload: str = INTERACTIVE, json_mode: bool = False,
+               tools: Optional[list] = None, **kwargs) -> Any:
+        """Run a chat completion on the best deployment for the workload, failing over on errors."""
+        tokens = estimate_tokens(messages)
+        tried: List[str] = []
+        with span("llm.invoke", **call_attributes(workload, json_mode, tokens)) as current:
+            for attempt in range(ATTEMPTS):
+                requested_at = time.monotonic()
+                lease = self.acquire(workload, tokens, tried)
+                trace_attempt(current, lease, requested_at, attempt)
+                result, error = None, None
+                try:
+                    result = self.get_client(lease.deployment, json_mode, tools).invoke(messages, **kwargs)
+                except Exception as e:
+                    error = e
+                finally:
+                    cooldown = self.release(lease, error, result)
+                if error is None:
+                    trace_usage(current, result)
+                    return result
+                if cooldown is None or attempt == ATTEMPTS - 1:
+                    raise error
+                record_failover(current, lease, error)
+                tried.append(lease.deployment.name)
+
+    def stream(self, messages: Any, workload: str = INTERACTIVE, json_mode: bool = False,
+               tools: Optional[list] = None, **kwargs) -> Iterator[Any]:
+        """
+        Stream a chat completion, failing over to another deployment if the stream fails before its
+        first chunk. Once output has been yielded the error is raised, since it cannot be replayed.
+        """
+        tokens = estimate_tokens(messages)
+        tried: List[str] = []
+        # The span is not made current: it stays open across yields to the consumer
+        current = start_span("llm.stream", **call_attributes(workload, json_mode, tokens))
+        output = StreamStats()
+        failure = None
+        try:
+            for attempt in range(ATTEMPTS):
+                requested_at = time.monotonic()
+                lease = self.acquire(workload, tokens, tried)
+                trace_attempt(current, lease, requested_at, attempt)
+                started, error = False, None
+                try:
+                    for chunk in self.get_client(lease.deployment, json_mode, tools).stream(messages, **kwargs):
+                        started = True
+                        output.add(chunk)
+                        yield chunk
+                except Exception as e:
+                    error = e
+                finally:
+                    # Also runs when the consumer closes the stream early
+                    cooldown = self.release(lease, error)
+                    if started:
+                        output.record(lease)
+                if error is None:
+                    return
+                if cooldown is None or started or attempt == ATTEMPTS - 1:
+                    raise error
+                record_failover(current, lease, error)
+                tried.append(lease.deployment.name)
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                failure = e
+            raise
+        finally:
+            output.trace(current)
+            end_span(current, failure)
+
+    async def ainvoke(self, messages: Any, workload: str = INTERACTIVE, json_mode: bool = False,
+                      tools: Optional[list] = None, **kwargs) -> Any:
+        """Async variant of `invoke`."""
+        tokens = estimate_tokens(messages)
+        tried: List[str] = []
+        with span("llm.invoke", **call_attributes(workload, json_mode, tokens)) as current:
+            for attempt in range(ATTEMPTS):
+                requested_at = time.monotonic()
+                lease = await self.aacquire(workload, tokens, tried)
+                trace_attempt(current, lease, requested_at, attempt)
+                result, error = None, None
+                try:
+                    result = await self.get_client(lease.deployment, json_mode, tools).ainvoke(messages, **kwargs)
+                except Exception as e:
+                    error = e
+                finally:
+                    cooldown = self.release(lease, error, result)
+                if error is None:
+                    trace_usage(current, result)
+                    return result
+                if cooldown is None or attempt == ATTEMPTS - 1:
+                    raise error
+                record_failover(current, lease, error)
+                tried.append(lease.deployment.name)
+
+    async def astream(self, messages: Any, workload: str = INTERACTIVE, json_mode: bool = False,
+                      tools: Optional[list] = None, **kwargs) -> AsyncIterator[Any]:
+        """Async variant of `stream`."""
+        tokens = estimate_tokens(messages)
+        tried: List[str] = []
+        current = start_span("llm.stream", **call_attributes(workload, json_mode, tokens))
+        output = StreamStats()
+        failure = None
+        try:
+            for attempt in range(ATTEMPTS):
+                requested_at = time.monotonic()
+                lease = await self.aacquire(workload, tokens, tried)
+                trace_attempt(current, lease, requested_at, attempt)
+                started, error = False, None
+                try:
+                    async for chunk in self.get_client(lease.deployment, json_mode, tools).astream(messages, **kwargs):
+                        started = True
+                        output.add(chunk)
+                        yield chunk
+                except Exception as e:
+                    error = e
+                finally:
+                    # Also runs when the consumer closes the stream early
+                    cooldown = self.release(lease, error)
+                    if started:
+                        output.record(lease)
+                if error is None:
+                    return
+                if cooldown is None or started or attempt == ATTEMPTS - 1:
+                    raise error
+                record_failover(current, lease, error)
+                tried.append(lease.deployment.name)
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                failure = e
+            raise
+        finally:
+            output.trace(current)
+            end_span(current, failure)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-deployment routing and rate-limiting statistics."""
+        with self._lock:
+            return [deployment.stats() for deployment in self.deployments]
+
+    def queue_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue-time statistics per workload class."""
+        return self.scheduler.stats()
+
+
+class RoutedChatModel:
+    """
+    Drop-in replacement for a module-level `AzureChatOpenAI` that routes every call through the
+    shared LLMRouter. Constructing it is cheap; the router and clients are created on first use.
+
+    Parameters
+    ----------
+    workload : str
+        Workload class of the calls: INTERACTIVE or BATCH.
+    json_mode : bool
+        Request JSON object responses (`response_format={"type": "json_object"}`).
+    tools : list, optional
+        Tools bound to every call.
+    """
+
+    def __init__(self, workload: str = INTERACTIVE, json_mode: bool = False, tools: Optional[list] = None):
+        if workload not in WORKLOADS:
+            raise ValueError(f"Unknown workload class '{workload}'")
+        self.workload = workload
+        self.json_mode = json_mode
+        self.tools = tools
+
+    def bind_tools(self, tools: list) -> "RoutedChatModel":
+        return RoutedChatModel(self.workload, self.json_mode, tools)
+
+    def invoke(self, messages: Any, **kwargs) -> Any:
+        return LLMRouter().invoke(messages, self.workload, self.json_mode, self.tools, **kwargs)
+
+    def stream(self, messages: Any, **kwargs) -> Iterator[Any]:
+        return LLMRouter().stream(messages, self.workload, self.json_mode, self.tools, **kwargs)
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        return await LLMRouter().ainvoke(messages, self.workload, self.json_mode, self.tools, **kwargs)
+
+    def astream(self, messages: Any, **kwargs) -> AsyncIterator[Any]:
+        return LLMRouter().astream(messages, self.workload, self.json_mode, self.tools, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"RoutedChatModel(workload={self.workload!r}, json_mode={self.json_mode!r})"
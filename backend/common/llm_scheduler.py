@@ -0,0 +1,133 @@
+"""
+### llm_scheduler.py ###
+
+This module decides the order in which queued LLM calls get capacity. Interactive calls (/chat,
+/respond-to-requirement, /search) and batch calls (chunking, extraction, drafting, indexing scripts)
+share deployments, so without priorities a 500-section extraction run would keep every slot busy
+and analysts would wait behind it for a chat answer. The scheduler:
+
+    - reserves a share (LLM_INTERACTIVE_RESERVE) of every shared deployment's concurrency and
+      token/request budgets for interactive calls; batch calls only use the rest
+    - holds batch calls back from a deployment while interactive calls are waiting for it
+    - records how long calls of each class wait for capacity (queue time), with percentiles
+
+The LLM router consults the scheduler when admitting calls; see llm_router.py.
+"""
+
+import os
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+WORKLOADS = (INTERACTIVE, BATCH)
+
+# Scheduler configuration
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.25"))
+LLM_QUEUE_STATS_WINDOW = int(os.getenv("LLM_QUEUE_STATS_WINDOW", "1024"))
+LLM_QUEUE_WARN_SECONDS = float(os.getenv("LLM_QUEUE_WARN_SECONDS", "5"))
+
+
+class QueueStats:
+    """
+    Queue-time statistics of one workload class.
+
+    Parameters
+    ----------
+    window : int
+        Number of recent waits kept for percentiles.
+    """
+
+    def __init__(self, window: int = LLM_QUEUE_STATS_WINDOW):
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque(maxlen=max(1, window))
+
+    def record(self, wait: float) -> None:
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent.append(wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+
+        return {
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "mean_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "p50_wait": percentile(0.50),
+            "p95_wait": percentile(0.95),
+            "p99_wait": percentile(0.99),
+            "max_wait": self.max_wait,
+        }
+
+
+class PriorityScheduler:
+    """
+    Priority policy between interactive and batch LLM calls.
+
+    Parameters
+    ----------
+    interactive_reserve : float
+        Share (0-1) of each shared deployment's capacity kept free for interactive calls.
+    """
+
+    def __init__(self, interactive_reserve: float = LLM_INTERACTIVE_RESERVE):
+        if not 0.0 <= interactive_reserve < 1.0:
+            raise ValueError("LLM_INTERACTIVE_RESERVE must be in [0, 1)")
+        self.interactive_reserve = interactive_reserve
+        self.queues = {workload: QueueStats() for workload in WORKLOADS}
+        self._lock = threading.Lock()
+
+    def reserve(self, workload: str, deployment: Any) -> float:
+        """Share of the deployment's capacity that a call of this class must leave unused."""
+        if workload == BATCH and deployment.serves(INTERACTIVE):
+            return self.interactive_reserve
+        return 0.0
+
+    def may_use(self, workload: str, deployment: Any) -> bool:
+        """Whether a call may take capacity on the deployment now (batch yields to waiting interactive calls)."""
+        if workload == BATCH and deployment.serves(INTERACTIVE):
+            return self.queues[INTERACTIVE].waiting == 0
+        return True
+
+    def enqueue(self, workload: str) -> None:
+        """Mark a call as waiting for capacity."""
+        with self._lock:
+            queue = self.queues[workload]
+            queue.waiting += 1
+            queue.queued += 1
+
+    def admit(self, workload: str, wait: float, queued: bool) -> None:
+        """Record that a call got capacity after `wait` seconds."""
+        with self._lock:
+            queue = self.queues[workload]
+            if queued:
+                queue.waiting -= 1
+            queue.record(wait)
+        if workload == INTERACTIVE and wait > LLM_QUEUE_WARN_SECONDS:
+            logger.warning(f"Interactive LLM call waited {wait:.1f}s for capacity")
+
+    def abandon(self, workload: str) -> None:
+        """Remove a waiting call that gave up (e.g. no deployment became available)."""
+        with self._lock:
+            self.queues[workload].waiting -= 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue-time statistics per workload class."""
+        with self._lock:
+            return {workload: queue.snapshot() for workload, queue in self.queues.items()}
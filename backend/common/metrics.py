@@ -0,0 +1,311 @@
+"""
+### metrics.py ###
+
+This module defines the Prometheus metrics of the backend, served in the text exposition format by
+the `/metrics` endpoint of app.py:
+
+    - rfp_http_request_duration_seconds        per route, method and status (streamed responses
+                                               are timed until their last byte)
+    - rfp_http_requests_in_progress            per route
+    - rfp_upstream_request_duration_seconds    per upstream service (llm, cosmos, search,
+                                               document_intelligence, blob, bing), operation (the
+                                               deployment for LLM calls) and outcome
+    - rfp_upstream_throttles_total             429 responses per service
+    - rfp_upstream_retries_total               calls retried by the Azure SDKs or failed over by the
+                                               LLM router, per service
+    - rfp_cosmos_request_units_total           Cosmos DB RU charges per operation
+    - rfp_cosmos_call_*                        Cosmos DB calls, RUs and seconds per query shape, caller
+                                               and scope (see cosmos_usage.py)
+    - rfp_cosmos_alerts_total                  slow calls, expensive calls and RU-rate alerts
+    - rfp_llm_tokens_total                     LLM tokens per deployment, workload and direction
+    - rfp_llm_time_to_first_token_seconds      for streamed LLM calls, per workload
+    - rfp_llm_queue_wait_seconds               time LLM calls wait for capacity, per workload
+    - rfp_jobs_in_progress, rfp_cache_*, rfp_llm_deployment_*, rfp_llm_queue_waiting
+                                               read from global_vars, the TTL caches and the LLM
+                                               router when the endpoint is scraped
+
+Azure SDK clients report every HTTP attempt through `upstream_hooks`, passed to their constructors:
+
+    BlobServiceClient(account_url, credential, **upstream_hooks("blob"))
+
+Under several worker processes (gunicorn or `uvicorn --workers`), set PROMETHEUS_MULTIPROC_DIR to an
+empty directory shared by the workers so counters and histograms are aggregated across them. The
+values read at scrape time (jobs, caches, router state) always describe the worker answering the
+scrape, like the in-progress lists of global_vars themselves.
+
+Requirements:
+    prometheus-client==0.20.0
+"""
+
+import os
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from dotenv import load_dotenv
+
+# PROMETHEUS_MULTIPROC_DIR is read when prometheus_client is imported, so load it from .env first
+load_dotenv()
+# prometheus_client enables multiprocess mode when the variable exists at all, even if it is empty
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Upstream services
+LLM = "llm"
+COSMOS = "cosmos"
+SEARCH = "search"
+DOCUMENT_INTELLIGENCE = "document_intelligence"
+BLOB = "blob"
+BING = "bing"
+
+# Responses the Azure SDK retry policies retry (Cosmos DB also retries 449 and 410)
+RETRYABLE_STATUS_CODES = {408, 410, 429, 449, 500, 502, 503, 504}
+
+# Bucket boundaries in seconds: fast Cosmos reads up to multi-minute layout analyses and LLM streams
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "rfp_http_request_duration_seconds", "Duration of HTTP requests, until the last byte of the response",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "rfp_http_requests_in_progress", "HTTP requests being handled", ["route"], multiprocess_mode="livesum"
+)
+UPSTREAM_SECONDS = Histogram(
+    "rfp_upstream_request_duration_seconds", "Duration of requests to upstream services",
+    ["service", "operation", "outcome"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_THROTTLES = Counter(
+    "rfp_upstream_throttles_total", "Requests rejected by an upstream service with 429", ["service"]
+)
+UPSTREAM_RETRIES = Counter(
+    "rfp_upstream_retries_total", "Upstream requests retried or failed over to another deployment", ["service"]
+)
+COSMOS_REQUEST_UNITS = Counter(
+    "rfp_cosmos_request_units_total", "Request units charged by Cosmos DB", ["operation"]
+)
+COSMOS_CALLS = Counter(
+    "rfp_cosmos_calls_total", "Cosmos DB calls per query shape and caller", ["shape", "caller", "scope"]
+)
+COSMOS_CALL_REQUEST_UNITS = Counter(
+    "rfp_cosmos_call_request_units_total", "Request units of Cosmos DB calls per query shape and caller",
+    ["shape", "caller", "scope"]
+)
+COSMOS_CALL_SECONDS = Counter(
+    "rfp_cosmos_call_seconds_total", "Time spent in Cosmos DB calls per query shape and caller",
+    ["shape", "caller", "scope"]
+)
+COSMOS_ALERTS = Counter(
+    "rfp_cosmos_alerts_total", "Slow or expensive Cosmos DB calls and RU-rate alerts", ["kind"]
+)
+LLM_TOKENS = Counter(
+    "rfp_llm_tokens_total", "LLM tokens (estimated for streamed calls)", ["deployment", "workload", "direction"]
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "rfp_llm_time_to_first_token_seconds", "Time until the first chunk of a streamed LLM call",
+    ["workload"], buckets=LATENCY_BUCKETS
+)
+LLM_QUEUE_WAIT = Histogram(
+    "rfp_llm_queue_wait_seconds", "Time LLM calls wait for deployment capacity",
+    ["workload"], buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+def outcome_of(status: int) -> str:
+    """Outcome label of an HTTP status code."""
+    if status == 429:
+        return "throttled"
+    if status >= 500:
+        return "server_error"
+    if status >= 400:
+        return "client_error"
+    return "success"
+
+
+# HTTP requests
+
+def start_request(route: str) -> float:
+    """Count a request as in progress; returns the start time to pass to `finish_request`."""
+    HTTP_REQUESTS_IN_PROGRESS.labels(route).inc()
+    return time.perf_counter()
+
+
+def finish_request(route: str, method: str, status: int, started_at: float) -> None:
+    """Record a finished request started with `start_request`."""
+    HTTP_REQUESTS_IN_PROGRESS.labels(route).dec()
+    HTTP_REQUEST_SECONDS.labels(route, method, str(status)).observe(time.perf_counter() - started_at)
+
+
+# Azure SDK clients
+
+def cosmos_operation(request: Any) -> str:
+    """Name the Cosmos DB operation of an HTTP request (query, read, create, upsert, replace, delete)."""
+    headers = request.headers
+    if headers.get("x-ms-documentdb-isquery", "").lower() == "true" or headers.get("Content-Type") == "application/query+json":
+        return "query"
+    if headers.get("x-ms-documentdb-is-upsert", "").lower() == "true":
+        return "upsert"
+    return {"GET": "read", "POST": "create", "PUT": "replace", "DELETE": "delete"}.get(request.method, request.method.lower())
+
+
+def upstream_hooks(service: str, response_callback: Optional[Callable[[Any], None]] = None) -> Dict[str, Callable[[Any], None]]:
+    """
+    Keyword arguments for an Azure SDK client constructor that record its HTTP requests.
+
+    Every attempt is timed, 429s count as throttles, retryable responses as retries and Cosmos DB
+    request charges as request units.
+
+    Parameters
+    ----------
+    service : str
+        Service label (COSMOS, SEARCH, DOCUMENT_INTELLIGENCE or BLOB).
+    response_callback : Callable[[Any], None], optional
+        Further callback invoked with every pipeline response.
+
+    Returns
+    -------
+    Dict[str, Callable[[Any], None]]
+        `raw_request_hook` and `raw_response_hook` callbacks.
+    """
+    def on_request(pipeline_request: Any) -> None:
+        pipeline_request.context["metrics_started_at"] = time.perf_counter()
+
+    def on_response(pipeline_response: Any) -> None:
+        try:
+            request = pipeline_response.http_request
+            response = pipeline_response.http_response
+            status = response.status_code
+            operation = cosmos_operation(request) if service == COSMOS else request.method.lower()
+            started_at = pipeline_response.context.get("metrics_started_at")
+            if started_at is not None:
+                UPSTREAM_SECONDS.labels(service, operation, outcome_of(status)).observe(time.perf_counter() - started_at)
+            if status == 429:
+                UPSTREAM_THROTTLES.labels(service).inc()
+            if status in RETRYABLE_STATUS_CODES:
+                UPSTREAM_RETRIES.labels(service).inc()
+            charge = response.headers.get("x-ms-request-charge")
+            if charge:
+                COSMOS_REQUEST_UNITS.labels(operation).inc(float(charge))
+        except Exception as e:
+            # Metrics must never break the call they observe
+            logger.warning(f"Could not record {service} request metrics: {str(e)}")
+        if response_callback is not None:
+            response_callback(pipeline_response)
+
+    return {"raw_request_hook": on_request, "raw_response_hook": on_response}
+
+
+@contextmanager
+def observe_upstream(service: str, operation: str) -> Iterator[None]:
+    """
+    Time a call to an upstream service that is not covered by `upstream_hooks`, e.g. a long-running
+    operation made of several HTTP requests.
+
+    Usage:
+        with observe_upstream(DOCUMENT_INTELLIGENCE, "analyze_layout"):
+            result = poller.result()
+    """
+    started_at = time.perf_counter()
+    status = 200
+    try:
+        yield
+    except Exception as e:
+        response = getattr(e, "response", None)
+        status = getattr(e, "status_code", None) or getattr(response, "status_code", None) or 500
+        raise
+    finally:
+        UPSTREAM_SECONDS.labels(service, operation, outcome_of(status)).observe(time.perf_counter() - started_at)
+
+
+# Values read at scrape time
+
+class StateCollector:
+    """Collects in-flight jobs, cache statistics and LLM router state when the metrics are scraped."""
+
+    def collect(self) -> Iterator[Any]:
+        yield from self._jobs()
+        yield from self._caches()
+        yield from self._router()
+
+    def _jobs(self) -> Iterator[Any]:
+        import global_vars
+
+        jobs = GaugeMetricFamily("rfp_jobs_in_progress", "Background jobs in progress", labels=["kind"])
+        with global_vars.upload_lock:
+            jobs.add_metric(["upload"], len(global_vars.in_progress_uploads))
+        with global_vars.drafting_lock:
+            drafting = sum(1 for job in global_vars.drafting_jobs.values() if job["status"] == "Processing")
+        jobs.add_metric(["drafting"], drafting)
+        yield jobs
+
+    def _caches(self) -> Iterator[Any]:
+        from common.cache import named_caches
+
+        hits = CounterMetricFamily("rfp_cache_hits", "Cache lookups that found a valid entry", labels=["cache"])
+        misses = CounterMetricFamily("rfp_cache_misses", "Cache lookups that found no valid entry", labels=["cache"])
+        entries = GaugeMetricFamily("rfp_cache_entries", "Entries held by a cache", labels=["cache"])
+        for name, cache in named_caches().items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            entries.add_metric([name], len(cache))
+        yield from (hits, misses, entries)
+
+    def _router(self) -> Iterator[Any]:
+        # Only report the router once it exists; scraping must not create clients
+        from common.llm_router import LLMRouter
+
+        if not LLMRouter._is_initialized:
+            return
+        router = LLMRouter()
+        gauges = {
+            "concurrency_limit": GaugeMetricFamily("rfp_llm_deployment_concurrency_limit", "Adaptive concurrency limit", labels=["deployment"]),
+            "in_flight": GaugeMetricFamily("rfp_llm_deployment_in_flight", "LLM calls in flight", labels=["deployment"]),
+            "outstanding_tokens": GaugeMetricFamily("rfp_llm_deployment_outstanding_tokens", "Estimated tokens of calls in flight", labels=["deployment"]),
+            "token_budget": GaugeMetricFamily("rfp_llm_deployment_token_budget", "Tokens left in the token-per-minute bucket", labels=["deployment"]),
+            "request_budget": GaugeMetricFamily("rfp_llm_deployment_request_budget", "Requests left in the request-per-minute bucket", labels=["deployment"]),
+            "cooling_down_for": GaugeMetricFamily("rfp_llm_deployment_cooldown_seconds", "Seconds until the deployment is back in rotation", labels=["deployment"]),
+        }
+        for deployment in router.stats():
+            for key, gauge in gauges.items():
+                if deployment.get(key) is not None:
+                    gauge.add_metric([deployment["name"]], deployment[key])
+        yield from gauges.values()
+
+        waiting = GaugeMetricFamily("rfp_llm_queue_waiting", "LLM calls waiting for capacity", labels=["workload"])
+        for workload, queue in router.queue_stats().items():
+            waiting.add_metric([workload], queue["waiting"])
+        yield waiting
+
+
+STATE_COLLECTOR = StateCollector()
+REGISTRY.register(STATE_COLLECTOR)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns
+    -------
+    Tuple[bytes, str]
+        The payload and its content type.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(STATE_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
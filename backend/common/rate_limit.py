@@ -0,0 +1,301 @@
+"""
+### rate_limit.py ###
+
+This module provides the client-side throttling used in front of each Azure OpenAI deployment:
+
+    - TokenBucket: a token-per-minute or request-per-minute budget that refills continuously
+    - AIMDConcurrency: an adaptive concurrency limit (additive increase, multiplicative decrease)
+      that grows while calls succeed quickly and shrinks on 429s or when latency degrades
+    - LatencyBaseline: the usual latency of a workload's calls given their output size
+    - RateLimiter: the combination of both for one deployment
+
+Without it every client retried on its own (`max_retries=2`) behind fixed-size thread pools, so the
+application either left quota unused or, with two RFPs processed at once, throttled itself into
+retry storms. The LLM router holds one RateLimiter per deployment and only starts a call when the
+deployment has budget and concurrency for it.
+
+The latency signal is self-calibrating: each limiter learns, per workload, how long successful calls
+usually take for their number of completion tokens, and only a run of calls much slower than that is
+treated like a mild throttle.
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Limiter configuration
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "10"))
+LLM_AIMD_INITIAL_CONCURRENCY = float(os.getenv("LLM_AIMD_INITIAL_CONCURRENCY", "8"))
+LLM_AIMD_MIN_CONCURRENCY = float(os.getenv("LLM_AIMD_MIN_CONCURRENCY", "1"))
+LLM_AIMD_MAX_CONCURRENCY = float(os.getenv("LLM_AIMD_MAX_CONCURRENCY", "64"))
+LLM_AIMD_BACKOFF = float(os.getenv("LLM_AIMD_BACKOFF", "0.5"))
+LLM_AIMD_LATENCY_TOLERANCE = float(os.getenv("LLM_AIMD_LATENCY_TOLERANCE", "2.0"))
+LLM_AIMD_LATENCY_BACKOFF = float(os.getenv("LLM_AIMD_LATENCY_BACKOFF", "0.9"))
+LLM_AIMD_SLOW_CALLS = int(os.getenv("LLM_AIMD_SLOW_CALLS", "3"))
+
+# Weight of each new sample in the latency baseline (exponentially weighted), and the smaller weight
+# of slow samples, so a lasting slowdown keeps being reported for a while before it becomes the norm
+BASELINE_WEIGHT = 0.1
+BASELINE_SLOW_WEIGHT = 0.01
+# Samples a baseline needs before calls are judged against it
+BASELINE_MIN_SAMPLES = 10
+
+
+class TokenBucket:
+    """
+    Budget of `per_minute` units that refills continuously.
+
+    The bucket holds at most `burst_seconds` worth of budget, so a quiet period does not allow a
+    burst of a full minute's quota (Azure OpenAI enforces its limits over short windows too).
+    Not thread-safe on its own; RateLimiter serializes access.
+
+    Parameters
+    ----------
+    per_minute : float
+        Units (tokens or requests) allowed per minute.
+    burst_seconds : float
+        Seconds of budget the bucket can accumulate.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` (a share of capacity) untouched."""
+        self._refill(time.monotonic())
+        kept = self.capacity * reserve
+        # A single call larger than the bucket is let through once the bucket is full
+        needed = min(amount, self.capacity - kept) + kept - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill(time.monotonic())
+        self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) the difference between estimated and actual usage."""
+        self._refill(time.monotonic())
+        self.level = min(self.capacity, self.level - amount)
+
+
+class AIMDConcurrency:
+    """
+    Adaptive concurrency limit.
+
+    Each successful call raises the limit by 1/limit, i.e. by about one per round of calls; a
+    throttled call multiplies it by `backoff`. Only calls that started after the last decrease can
+    trigger another one, so a burst of 429s from calls already in flight counts as a single signal.
+    Not thread-safe on its own; RateLimiter serializes access.
+
+    Parameters
+    ----------
+    initial : float
+        Starting concurrency limit.
+    minimum : float
+        Lowest limit.
+    maximum : float
+        Highest limit.
+    backoff : float
+        Factor applied to the limit on a throttle.
+    """
+
+    def __init__(self, initial: float = LLM_AIMD_INITIAL_CONCURRENCY, minimum: float = LLM_AIMD_MIN_CONCURRENCY,
+                 maximum: float = LLM_AIMD_MAX_CONCURRENCY, backoff: float = LLM_AIMD_BACKOFF):
+        self.minimum = max(1.0, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.backoff = backoff
+        self.in_flight = 0
+        self.last_decrease = 0.0
+
+    def has_capacity(self, reserve: float = 0.0) -> bool:
+        """Whether a call fits while leaving `reserve` (a share of the limit) free; at least one slot is usable."""
+        limit = int(self.limit)
+        return self.in_flight < max(1, limit - int(limit * reserve))
+
+    def increase(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def decrease(self, started_at: float, factor: Optional[float] = None) -> bool:
+        """Shrink the limit unless the call started before the previous decrease. Returns whether it shrank."""
+        if started_at < self.last_decrease:
+            return False
+        self.limit = max(self.minimum, self.limit * (self.backoff if factor is None else factor))
+        self.last_decrease = time.monotonic()
+        return True
+
+
+class LatencyBaseline:
+    """
+    Usual latency of one workload's calls as a function of their completion tokens.
+
+    Fits latency = overhead + seconds per token * completion tokens on exponentially weighted
+    moments of the samples, so calls with a few output tokens (dominated by the fixed overhead) and
+    calls with long outputs are judged on the same scale. Not thread-safe on its own; RateLimiter
+    serializes access.
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.mean_tokens = 0.0
+        self.mean_latency = 0.0
+        self.var_tokens = 0.0
+        self.covariance = 0.0
+
+    def expected(self, tokens: int) -> Optional[float]:
+        """Expected latency of a call with `tokens` completion tokens, or None while still calibrating."""
+        if self.samples < BASELINE_MIN_SAMPLES:
+            return None
+        per_token = max(0.0, self.covariance / self.var_tokens) if self.var_tokens > 0 else 0.0
+        expected = self.mean_latency + per_token * (tokens - self.mean_tokens)
+        return expected if expected > 0 else None
+
+    def add(self, tokens: int, latency: float, weight: float = BASELINE_WEIGHT) -> None:
+        # Plain averages until there are enough samples, so the first sample does not dominate
+        weight = max(weight, 1.0 / (self.samples + 1))
+        d_tokens = tokens - self.mean_tokens
+        d_latency = latency - self.mean_latency
+        self.mean_tokens += weight * d_tokens
+        self.mean_latency += weight * d_latency
+        self.var_tokens = (1 - weight) * (self.var_tokens + weight * d_tokens * d_tokens)
+        self.covariance = (1 - weight) * (self.covariance + weight * d_tokens * d_latency)
+        self.samples += 1
+
+
+class RateLimiter:
+    """
+    Token-rate, request-rate and adaptive concurrency limits of one deployment.
+
+    Parameters
+    ----------
+    name : str
+        Name used in logs.
+    tpm : float, optional
+        Tokens-per-minute limit; no token budget when omitted.
+    rpm : float, optional
+        Requests-per-minute limit; no request budget when omitted.
+    """
+
+    def __init__(self, name: str, tpm: Optional[float] = None, rpm: Optional[float] = None):
+        self.name = name
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.concurrency = AIMDConcurrency()
+        # Per workload: latency baseline and number of consecutive slow calls
+        self.latency_baselines: Dict[str, LatencyBaseline] = {}
+        self.slow_streaks: Dict[str, int] = {}
+        self.throttled = 0
+        self.slow = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int, reserve: float = 0.0) -> Optional[float]:
+        """
+        Start a call of about `tokens` tokens if the limits allow it.
+
+        Parameters
+        ----------
+        tokens : int
+            Estimated tokens of the call.
+        reserve : float
+            Share of every limit the call must leave unused (kept for higher-priority calls).
+
+        Returns
+        -------
+        Optional[float]
+            0.0 if the call was admitted, the seconds until the rate budgets allow it, or None if it
+            is only waiting for a concurrency slot (which frees up when another call finishes).
+        """
+        with self._lock:
+            if not self.concurrency.has_capacity(reserve):
+                return None
+            wait = max(self.tokens.wait_time(tokens, reserve) if self.tokens else 0.0,
+                       self.requests.wait_time(1, reserve) if self.requests else 0.0)
+            if wait > 0:
+                return wait
+            if self.tokens:
+                self.tokens.take(tokens)
+            if self.requests:
+                self.requests.take(1)
+            self.concurrency.in_flight += 1
+            return 0.0
+
+    def release(self, started_at: float, estimated_tokens: int, actual_tokens: Optional[int] = None,
+                throttled: bool = False, succeeded: bool = True, completion_tokens: Optional[int] = None,
+                workload: str = "") -> None:
+        """
+        Finish a call and feed its outcome back into the limits.
+
+        Parameters
+        ----------
+        started_at : float
+            `time.monotonic()` when the call was admitted.
+        estimated_tokens : int
+            Tokens charged when the call was admitted.
+        actual_tokens : int, optional
+            Tokens the service reported; the budget is corrected by the difference.
+        throttled : bool
+            The call was rejected with a 429 or timed out.
+        succeeded : bool
+            The call completed; only successful calls grow the limit and calibrate latency.
+        completion_tokens : int, optional
+            Output tokens the service reported; calls without it do not feed the latency signal.
+        workload : str
+            Workload of the call; each workload has its own latency baseline.
+        """
+        latency = time.monotonic() - started_at
+        with self._lock:
+            self.concurrency.in_flight -= 1
+            if self.tokens and actual_tokens is not None:
+                self.tokens.adjust(actual_tokens - estimated_tokens)
+
+            if throttled:
+                self.throttled += 1
+                if self.concurrency.decrease(started_at):
+                    logger.warning(f"Throttled on '{self.name}'; concurrency limit lowered to {self.concurrency.limit:.1f}")
+                return
+            if not succeeded:
+                return
+
+            if not completion_tokens or not self._is_slow(workload, completion_tokens, latency):
+                self.concurrency.increase()
+            elif self.slow_streaks[workload] >= LLM_AIMD_SLOW_CALLS:
+                # Only persistent slowness lowers the limit; a single slow call may just be an outlier
+                self.slow_streaks[workload] = 0
+                self.concurrency.decrease(started_at, LLM_AIMD_LATENCY_BACKOFF)
+
+    def _is_slow(self, workload: str, completion_tokens: int, latency: float) -> bool:
+        """Fold a call into the workload's baseline and tell whether it was much slower than usual."""
+        baseline = self.latency_baselines.setdefault(workload, LatencyBaseline())
+        expected = baseline.expected(completion_tokens)
+        slow = expected is not None and latency > expected * LLM_AIMD_LATENCY_TOLERANCE
+        baseline.add(completion_tokens, latency, BASELINE_SLOW_WEIGHT if slow else BASELINE_WEIGHT)
+        if slow:
+            self.slow += 1
+            self.slow_streaks[workload] = self.slow_streaks.get(workload, 0) + 1
+        else:
+            self.slow_streaks[workload] = 0
+        return slow
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency_limit": round(self.concurrency.limit, 2),
+                "in_flight": self.concurrency.in_flight,
+                "token_budget": round(self.tokens.level) if self.tokens else None,
+                "request_budget": round(self.requests.level, 1) if self.requests else None,
+                "throttled": self.throttled,
+                "slow": self.slow,
+            }
@@ -0,0 +1,383 @@
+"""
+### tracing.py ###
+
+This module provides structured tracing spans for the RFP pipeline and the request paths (ADLS
+upload, layout analysis, table of contents, heading validation, section population, Cosmos DB
+writes, requirement extraction, knowledge retrieval and LLM calls). Spans carry timings, parent/child
+relationships and attributes such as section counts, token counts and time-to-first-token.
+
+When the OpenTelemetry API (`opentelemetry-api`) is installed, spans are created with it, so they
+reach whatever TracerProvider the deployment configures (e.g. an OTLP exporter). Otherwise a small
+built-in tracer records the same spans in the same JSON shape. TRACING_EXPORTER selects a local
+exporter:
+
+    none     no local export (default)
+    console  one JSON object per span on stdout
+    file     one JSON object per span appended to TRACING_FILE (default `.cache/traces.jsonl`)
+
+Console and file export use the OpenTelemetry SDK when it is installed, and the built-in tracer
+otherwise.
+
+Usage:
+    with span("chunking.table_of_contents", rfp_name=filename) as current:
+        ...
+        current.set_attribute("toc.characters", len(toc))
+
+    @traced("upload.read_pdf")
+    def read_pdf(input_file):
+        ...
+
+Spans follow the current context, which does not cross thread boundaries on its own; wrap functions
+handed to threads or executors with `propagate` to keep them in the caller's trace.
+
+Requirements (optional):
+    opentelemetry-api
+    opentelemetry-sdk
+"""
+
+import contextvars
+import inspect
+import json
+import os
+import logging
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:
+    otel_trace = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Tracing configuration
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join(".cache", "traces.jsonl"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "rfp-accelerator")
+
+EXPORTERS = ("none", "console", "file")
+
+
+def _clean(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep attribute values OpenTelemetry accepts (primitives and lists of them); drop None."""
+    cleaned = {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, (str, bool, int, float)):
+            cleaned[key] = value
+        elif isinstance(value, (list, tuple)):
+            cleaned[key] = [item if isinstance(item, (str, bool, int, float)) else str(item) for item in value]
+        else:
+            cleaned[key] = str(value)
+    return cleaned
+
+
+def _timestamp(epoch_seconds: float) -> str:
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class BuiltinSpan:
+    """Span of the built-in tracer, with the subset of the OpenTelemetry Span API used here."""
+
+    def __init__(self, tracer: "BuiltinTracer", name: str, attributes: Dict[str, Any], parent: Optional["BuiltinSpan"]):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time()
+        self.attributes = _clean(attributes)
+        self.events: List[Dict[str, Any]] = []
+        self.status = "UNSET"
+        self.status_description = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes.update(_clean({key: value}))
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(_clean(attributes))
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({"name": name, "timestamp": _timestamp(time.time()), "attributes": _clean(attributes or {})})
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.add_event("exception", {
+            "exception.type": type(exception).__name__,
+            "exception.message": str(exception),
+        })
+
+    def end(self) -> None:
+        self._tracer.export({
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}"},
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": _timestamp(self.start_time),
+            "end_time": _timestamp(time.time()),
+            "status": {"status_code": self.status, "description": self.status_description},
+            "attributes": self.attributes,
+            "events": self.events,
+            "resource": {"attributes": {"service.name": TRACING_SERVICE_NAME}},
+        })
+
+
+class NoopSpan:
+    """Span that records nothing; returned while tracing is disabled."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+_current_span: contextvars.ContextVar[Optional[BuiltinSpan]] = contextvars.ContextVar("current_span", default=None)
+
+
+class BuiltinTracer:
+    """
+    Dependency-free tracer that writes finished spans as JSON lines.
+
+    Parameters
+    ----------
+    output : file-like, optional
+        Stream the spans are written to; nothing is recorded when None.
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, attributes: Dict[str, Any]):
+        if self.output is None:
+            return NOOP_SPAN
+        return BuiltinSpan(self, name, attributes, _current_span.get())
+
+    @contextmanager
+    def use_span(self, current) -> Iterator[None]:
+        if current is NOOP_SPAN:
+            yield
+            return
+        token = _current_span.set(current)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def end_span(self, current, error: Optional[BaseException] = None) -> None:
+        if current is NOOP_SPAN:
+            return
+        if error is not None:
+            current.record_exception(error)
+            current.status, current.status_description = "ERROR", f"{type(error).__name__}: {error}"
+        current.end()
+
+    def export(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self.output.write(line)
+            self.output.flush()
+
+
+class OpenTelemetryTracer:
+    """Adapter over the OpenTelemetry API, using the globally configured TracerProvider."""
+
+    def __init__(self):
+        self.tracer = otel_trace.get_tracer(__name__)
+
+    def start_span(self, name: str, attributes: Dict[str, Any]):
+        return self.tracer.start_span(name, attributes=_clean(attributes))
+
+    def use_span(self, current):
+        return otel_trace.use_span(current, end_on_exit=False, record_exception=False, set_status_on_exception=False)
+
+    def end_span(self, current, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            current.record_exception(error)
+            current.set_status(Status(StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        current.end()
+
+
+def _open_output():
+    if TRACING_EXPORTER == "console":
+        return sys.stdout
+    if TRACING_EXPORTER == "file":
+        directory = os.path.dirname(TRACING_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(TRACING_FILE, "a", encoding="utf-8")
+    return None
+
+
+def _configure_otel_sdk(output) -> bool:
+    """Install an SDK TracerProvider exporting to `output`; returns False if the SDK is not installed."""
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    exporter = ConsoleSpanExporter(out=output, formatter=lambda finished: finished.to_json(indent=None) + "\n")
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    otel_trace.set_tracer_provider(provider)
+    return True
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the process-wide tracer, creating it (and opening the exporter output) on first use."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                if TRACING_EXPORTER not in EXPORTERS:
+                    logger.warning(f"Unknown TRACING_EXPORTER '{TRACING_EXPORTER}'; tracing locally is disabled")
+                output = _open_output() if TRACING_EXPORTER in EXPORTERS else None
+                if otel_trace is not None and (output is None or _configure_otel_sdk(output)):
+                    _tracer = OpenTelemetryTracer()
+                else:
+                    _tracer = BuiltinTracer(output)
+                logger.info(f"Tracing with {type(_tracer).__name__} (exporter: {TRACING_EXPORTER})")
+    return _tracer
+
+
+def start_span(name: str, **attributes):
+    """Start a span that is not made current; end it with `end_span`."""
+    return get_tracer().start_span(name, attributes)
+
+
+def end_span(current, error: Optional[BaseException] = None) -> None:
+    """End a span, marking it as failed if `error` is given."""
+    get_tracer().end_span(current, error)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Run the enclosed block in a new current span; exceptions mark the span as failed."""
+    tracer = get_tracer()
+    current = tracer.start_span(name, attributes)
+    error = None
+    try:
+        with tracer.use_span(current):
+            yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        tracer.end_span(current, error)
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """
+    Decorator that runs a function in a span named `name` (default: its qualified name).
+
+    Works with plain and async functions and with (async) generators; a generator's span covers its
+    whole iteration, and is current only while the generator body runs.
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.isasyncgenfunction(func):
+            @wraps(func)
+            async def async_generator_wrapper(*args, **kwargs):
+                tracer = get_tracer()
+                current = tracer.start_span(span_name, attributes)
+                generator = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        with tracer.use_span(current):
+                            try:
+                                value = await generator.__anext__()
+                            except StopAsyncIteration:
+                                return
+                        yield value
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        error = e
+                    raise
+                finally:
+                    await generator.aclose()
+                    tracer.end_span(current, error)
+            return async_generator_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                tracer = get_tracer()
+                current = tracer.start_span(span_name, attributes)
+                generator = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        with tracer.use_span(current):
+                            try:
+                                value = next(generator)
+                            except StopIteration as stop:
+                                return stop.value
+                        yield value
+                except BaseException as e:
+                    if not isinstance(e, GeneratorExit):
+                        error = e
+                    raise
+                finally:
+                    generator.close()
+                    tracer.end_span(current, error)
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def coroutine_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return coroutine_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def current_span():
+    """Return the current span, e.g. to add attributes from inside a traced function."""
+    if isinstance(get_tracer(), OpenTelemetryTracer):
+        return otel_trace.get_current_span()
+    return _current_span.get() or NOOP_SPAN
+
+
+def propagate(func: Callable) -> Callable:
+    """Bind `func` to the caller's tracing context, for running it in another thread."""
+    context = contextvars.copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Each call gets its own copy, so concurrent calls from a thread pool do not collide
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
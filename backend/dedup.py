@@ -0,0 +1,196 @@
+"""
+Deduplication module for extracted RFP requirements.
+
+Requirements are extracted per section, and RFPs often restate the same requirement in several
+sections. This module merges those restatements into canonical requirements:
+
+    1. Requirements whose normalized text is identical are merged without any model calls.
+    2. The remaining texts are embedded in batches and clustered by cosine similarity with NumPy;
+       every requirement within REQUIREMENT_DEDUP_THRESHOLD of a cluster's first member joins it.
+
+The canonical requirements, each with back-references to every section it appeared in, are stored
+in a single Cosmos DB document per RFP.
+"""
+
+# Standard library imports
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+
+# Third-party imports
+import numpy as np
+from dotenv import load_dotenv
+
+# Local imports
+from common.cosmosdb import CosmosDBManager
+from common.embeddings import generate_embeddings_batch
+from common.lazy import LazyClient
+
+# Load environment variables
+load_dotenv()
+
+# Deduplication configuration
+REQUIREMENT_DEDUP_THRESHOLD = float(os.getenv("REQUIREMENT_DEDUP_THRESHOLD", "0.95"))
+
+# Initialize CosmosDB manager
+cosmos_manager = LazyClient(CosmosDBManager)
+
+
+def normalize_requirement(content):
+    """
+    Normalize requirement text so trivially different restatements compare equal.
+
+    Args:
+        content (str): The requirement text.
+
+    Returns:
+        str: Lowercased text with punctuation removed and whitespace collapsed.
+    """
+    content = re.sub(r"[^\w\s]", " ", content.lower())
+    return re.sub(r"\s+", " ", content).strip()
+
+
+def canonical_id(content):
+    """Build a stable id for a canonical requirement from its normalized text."""
+    return hashlib.sha1(normalize_requirement(content).encode("utf-8")).hexdigest()[:16]
+
+
+def canonical_document_id(rfp_name):
+    """Build the Cosmos DB id of an RFP's canonical requirements document."""
+    return f"{rfp_name} - canonical_requirements"
+
+
+def get_requirement_occurrences(rfp_name):
+    """
+    Collect every requirement of an RFP, merging occurrences with identical normalized text.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+
+    Returns:
+        list: One dict per distinct requirement text with `content` and `sources`, where `sources`
+        lists the section, page and index of every occurrence.
+    """
+    items = cosmos_manager.query_partition(rfp_name, "c.section_id, c.requirements.output",
+                                           conditions=["IS_DEFINED(c.requirements)"])
+
+    distinct = {}
+    for item in items:
+        for index, req in enumerate(item.get('output') or []):
+            if not isinstance(req, dict) or req.get('is_requirement') != 'yes' or not req.get('content'):
+                continue
+            key = normalize_requirement(req['content'])
+            if not key:
+                continue
+            entry = distinct.setdefault(key, {"content": req['content'], "sources": []})
+            entry["sources"].append({
+                "section_id": item.get('section_id'),
+                "section_name": req.get('section_name', ''),
+                "page_number": req.get('page_number', ''),
+                "index": index
+            })
+    return list(distinct.values())
+
+
+def cluster_by_similarity(vectors, threshold):
+    """
+    Greedily cluster vectors by cosine similarity.
+
+    Each unassigned vector, in input order, starts a cluster and absorbs every other unassigned
+    vector whose cosine similarity to it is at least `threshold`. Similarities for a leader are
+    computed against all remaining vectors in one matrix-vector product.
+
+    Args:
+        vectors: An (n, d) array-like of embeddings.
+        threshold (float): The minimum cosine similarity to join a cluster.
+
+    Returns:
+        list: Clusters as lists of input indices; the first index of each cluster is its leader.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return []
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.maximum(norms, 1e-12)
+
+    unassigned = np.ones(len(matrix), dtype=bool)
+    clusters = []
+    for leader in range(len(matrix)):
+        if not unassigned[leader]:
+            continue
+        candidates = np.flatnonzero(unassigned)
+        similarities = matrix[candidates] @ matrix[leader]
+        members = candidates[similarities >= threshold]
+        # The leader always belongs to its own cluster, even if rounding puts it below threshold
+        members = np.union1d(members, [leader])
+        unassigned[members] = False
+        clusters.append([leader] + [int(member) for member in members if member != leader])
+    return clusters
+
+
+def deduplicate_requirements(rfp_name, threshold=None):
+    """
+    Merge near-duplicate requirements of an RFP and store the canonical requirements.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+        threshold (float): Optional cosine similarity threshold; defaults to REQUIREMENT_DEDUP_THRESHOLD.
+
+    Returns:
+        list: The canonical requirements, each with `canonical_id`, `content`, `section_name`,
+        `page_number` and `sources` (all occurrences, across sections).
+    """
+    threshold = REQUIREMENT_DEDUP_THRESHOLD if threshold is None else threshold
+    occurrences = get_requirement_occurrences(rfp_name)
+
+    if len(occurrences) > 1:
+        vectors = generate_embeddings_batch([occurrence["content"] for occurrence in occurrences])
+        clusters = cluster_by_similarity(vectors, threshold)
+    else:
+        clusters = [[index] for index in range(len(occurrences))]
+
+    canonical_requirements = []
+    for cluster in clusters:
+        leader = occurrences[cluster[0]]
+        sources = [source for index in cluster for source in occurrences[index]["sources"]]
+        canonical_requirements.append({
+            "canonical_id": canonical_id(leader["content"]),
+            "content": leader["content"],
+            "section_name": sources[0]["section_name"],
+            "page_number": sources[0]["page_number"],
+            "sources": sources,
+            "variants": [occurrences[index]["content"] for index in cluster[1:]]
+        })
+
+    total_occurrences = sum(len(occurrence["sources"]) for occurrence in occurrences)
+    print(f"Deduplicated {total_occurrences} requirements of {rfp_name} into {len(canonical_requirements)} canonical requirements")
+
+    cosmos_manager.upsert_item({
+        'id': canonical_document_id(rfp_name),
+        'partitionKey': rfp_name,
+        'canonical_requirements': canonical_requirements,
+        'dedup_threshold': threshold,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    })
+    return canonical_requirements
+
+
+def get_canonical_requirements(rfp_name):
+    """
+    Get the stored canonical requirements of an RFP.
+
+    They are computed at the end of extraction and before drafting; reads never compute them, so a
+    request for an unknown RFP does not store a document under its name.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+
+    Returns:
+        list: The canonical requirements, or None if they have not been computed.
+    """
+    items = cosmos_manager.query_partition(rfp_name, "c.canonical_requirements",
+                                           equals={"id": canonical_document_id(rfp_name)})
+    if items and 'canonical_requirements' in items[0]:
+        return items[0]['canonical_requirements']
+    return None
@@ -0,0 +1,161 @@
+"""
+Drafting module for bulk RFP responses.
+
+This module drafts responses to every requirement of an RFP as a background job. Requirements
+marked `is_requirement == 'yes'` are collected from all sections and deduplicated into canonical
+requirements (see `dedup`) so each is only drafted once, knowledge is retrieved in batches, and responses are drafted
+with bounded concurrency. Each draft is stored in Azure Cosmos DB with back-references to the
+sections the requirement appeared in, and job progress is tracked in `global_vars`.
+"""
+
+# Standard library imports
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+# Third-party imports
+from dotenv import load_dotenv
+
+# Local imports
+from common.cosmosdb import CosmosDBManager
+from common.embeddings import generate_embeddings_batch
+from common.lazy import LazyClient
+from dedup import deduplicate_requirements
+from global_vars import finish_drafting_job, set_drafting_total, start_drafting_job, update_drafting_job
+from response import draft_response, get_knowledge, knowledge_base_search_enabled
+
+# Load environment variables
+load_dotenv()
+
+# Drafting configuration
+DRAFTING_MAX_WORKERS = int(os.getenv("DRAFTING_MAX_WORKERS", "4"))
+DRAFTING_BATCH_SIZE = int(os.getenv("DRAFTING_BATCH_SIZE", "32"))
+
+# Initialize CosmosDB manager
+cosmos_manager = LazyClient(CosmosDBManager)
+
+
+def draft_id(rfp_name, canonical_id):
+    """Build the deterministic Cosmos DB id of a canonical requirement's draft."""
+    return f"{rfp_name} - draft - {canonical_id}"
+
+
+def draft_requirement(rfp_name, requirement, user_message):
+    """Retrieve knowledge for one requirement, draft the response and store it in Cosmos DB."""
+    knowledge_results = get_knowledge(requirement["content"])
+    response_text = draft_response(requirement["content"], knowledge_results, user_message)
+
+    draft = {
+        'id': draft_id(rfp_name, requirement["canonical_id"]),
+        'partitionKey': rfp_name,
+        'draft_requirement': requirement["content"],
+        'draft_response': response_text,
+        'sources': requirement["sources"],
+        'knowledge_sources': sorted(knowledge_results.keys()),
+        'drafted_at': datetime.now(timezone.utc).isoformat()
+    }
+    cosmos_manager.upsert_item(draft)
+    return draft
+
+
+def remove_stale_drafts(rfp_name, requirements):
+    """
+    Delete the drafts of canonical requirements that no longer exist.
+
+    Drafts are keyed by the canonical id, a hash of the requirement text, so editing requirements
+    leaves the drafts of the old texts behind unless they are removed.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+        requirements (list): The current canonical requirements.
+
+    Returns:
+        int: The number of drafts deleted.
+    """
+    current = {draft_id(rfp_name, requirement["canonical_id"]) for requirement in requirements}
+    stale = [item['id'] for item in cosmos_manager.query_partition(rfp_name, "c.id", conditions=["IS_DEFINED(c.draft_response)"])
+             if item['id'] not in current]
+    for item_id in stale:
+        cosmos_manager.delete_item(item_id, rfp_name)
+    if stale:
+        print(f"Removed {len(stale)} stale drafts of {rfp_name}")
+    return len(stale)
+
+
+def drafting_process(rfp_name, user_message=""):
+    """
+    Draft responses to all canonical requirements of an RFP document.
+
+    Args:
+        rfp_name (str): The name of the RFP document to process.
+        user_message (str): Optional extra instructions applied to every draft.
+    """
+    try:
+        # Re-run deduplication so requirements edited since extraction are picked up
+        requirements = deduplicate_requirements(rfp_name)
+        remove_stale_drafts(rfp_name, requirements)
+        set_drafting_total(rfp_name, len(requirements))
+        print(f"Drafting responses for {len(requirements)} canonical requirements of {rfp_name}")
+
+        with ThreadPoolExecutor(max_workers=DRAFTING_MAX_WORKERS) as executor:
+            for start in range(0, len(requirements), DRAFTING_BATCH_SIZE):
+                batch = requirements[start:start + DRAFTING_BATCH_SIZE]
+
+                if knowledge_base_search_enabled:
+                    # Embed the whole batch in one call so the per-requirement KB queries hit the embedding cache
+                    try:
+                        generate_embeddings_batch([requirement["content"] for requirement in batch])
+                    except Exception as e:
+                        print(f"Error pre-computing embeddings for drafting batch: {str(e)}")
+
+                futures = {executor.submit(draft_requirement, rfp_name, requirement, user_message): requirement
+                           for requirement in batch}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                        update_drafting_job(rfp_name, completed=1)
+                    except Exception as e:
+                        print(f"Error drafting response for '{futures[future]['content'][:80]}': {str(e)}")
+                        update_drafting_job(rfp_name, failed=1)
+
+        finish_drafting_job(rfp_name)
+        print(f"Drafting complete for {rfp_name}")
+    except Exception as e:
+        print(f"Error in drafting process for {rfp_name}: {str(e)}")
+        finish_drafting_job(rfp_name, status="Error")
+
+
+def start_drafting_thread(rfp_name, user_message=""):
+    """
+    Start the drafting process in a separate thread.
+
+    Args:
+        rfp_name (str): The name of the RFP document to process.
+        user_message (str): Optional extra instructions applied to every draft.
+
+    Returns:
+        bool: False if a drafting job is already running for this RFP.
+    """
+    if not start_drafting_job(rfp_name):
+        return False
+    thread = threading.Thread(target=drafting_process, args=(rfp_name, user_message))
+    thread.start()
+    return True
+
+
+def get_drafts(rfp_name):
+    """
+    Get all stored drafts for an RFP document.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+
+    Returns:
+        list: The draft documents.
+    """
+    return cosmos_manager.query_partition(
+        rfp_name,
+        "c.draft_requirement, c.draft_response, c.sources, c.knowledge_sources, c.drafted_at",
+        conditions=["IS_DEFINED(c.draft_response)"]
+    )
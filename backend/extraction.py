@@ -7,51 +7,30 @@ and manages the extraction process including progress tracking.
 
 # Standard library imports
 import json
-import os
 import threading
 
 # Third-party imports
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 
 # Local imports
 from common.cosmosdb import CosmosDBManager
+from common.lazy import LazyClient
+from common.llm_router import BATCH, RoutedChatModel
+from common.tracing import propagate, span, traced
+from dedup import deduplicate_requirements
 from prompts import content_parsing_prompt
+from requirements_view import update_section_view
 
 # Load environment variables
 load_dotenv()
 
-# Azure OpenAI configuration
-AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-
 # Initialize CosmosDB manager
-cosmos_manager = CosmosDBManager()
+cosmos_manager = LazyClient(CosmosDBManager)
 
 # Initialize Azure OpenAI clients
-primary_llm = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT
-)
-
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
+primary_llm = RoutedChatModel(BATCH)
+
+primary_llm_json = RoutedChatModel(BATCH, json_mode=True)
 
 def extract_requirements(section_content):
     """
@@ -77,6 +56,7 @@ def extract_requirements(section_content):
 
     return response_json
 
+@traced("extraction.process")
 def extraction_process(rfp_name):
     """
     Process all sections of an RFP document to extract requirements.
@@ -84,24 +64,39 @@ def extraction_process(rfp_name):
     Args:
         rfp_name (str): The name of the RFP document to process.
     """
-    query = f"SELECT * FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.section_content)"
-    items = cosmos_manager.query_items(query)
+    items = cosmos_manager.query_partition(rfp_name, conditions=["IS_DEFINED(c.section_content)"])
     
     total_items = len(items)
     processed_items = 0
     
     for item in items:
-        section_content = item['section_content']
-        requirements_json = extract_requirements(section_content)
-        
-        # Update the item in Cosmos DB
-        item['requirements'] = requirements_json
-        cosmos_manager.update_item(item['id'], item, item['partitionKey'])
+        with span("extraction.section", rfp_name=rfp_name, **{"section.id": item.get('section_id')}) as current:
+            section_content = item['section_content']
+            requirements_json = extract_requirements(section_content)
+            output = requirements_json.get('output')
+            current.set_attribute("requirements.count", len(output) if isinstance(output, list) else 0)
+
+            # Update the item in Cosmos DB
+            with span("cosmos.write", rfp_name=rfp_name, **{"cosmos.items": 1}):
+                item['requirements'] = requirements_json
+                cosmos_manager.update_item(item['id'], item, item['partitionKey'])
+
+            # Keep the requirements view current section by section, so it shows progress as it happens
+            try:
+                update_section_view(rfp_name, item.get('section_id'), requirements_json)
+            except Exception as e:
+                print(f"Error updating the requirements view for {item.get('section_id')}: {str(e)}")
         
         processed_items += 1
         progress = (processed_items / total_items) * 100
         print(f"Extraction progress: {progress:.2f}%")
 
+    # Merge requirements restated across sections so downstream drafting only handles each once
+    try:
+        deduplicate_requirements(rfp_name)
+    except Exception as e:
+        print(f"Error deduplicating requirements for {rfp_name}: {str(e)}")
+
 def start_extraction_thread(rfp_name):
     """
     Start the extraction process in a separate thread.
@@ -109,7 +104,7 @@ def start_extraction_thread(rfp_name):
     Args:
         rfp_name (str): The name of the RFP document to process.
     """
-    thread = threading.Thread(target=extraction_process, args=(rfp_name,))
+    thread = threading.Thread(target=propagate(extraction_process), args=(rfp_name,))
     thread.start()
 
 def get_extraction_progress(rfp_name):
@@ -122,11 +117,9 @@ def get_extraction_progress(rfp_name):
     Returns:
         float: The percentage of completed extractions.
     """
-    processed_query = f"SELECT VALUE COUNT(1) FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.requirements)"
-    processed_count = cosmos_manager.query_items(processed_query)[0]
+    processed_count = cosmos_manager.count_partition(rfp_name, conditions=["IS_DEFINED(c.requirements)"])
     
-    total_query = f"SELECT VALUE COUNT(1) FROM c WHERE c.partitionKey = '{rfp_name}' AND IS_DEFINED(c.section_content)"
-    total_count = cosmos_manager.query_items(total_query)[0]
+    total_count = cosmos_manager.count_partition(rfp_name, conditions=["IS_DEFINED(c.section_content)"])
     
     if total_count == 0:
         return 0
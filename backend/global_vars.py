@@ -9,8 +9,12 @@ completed_uploads = set()
 # Dictionary to store upload errors
 upload_errors = {}
 
+# Dictionary to store bulk drafting job progress, keyed by RFP name
+drafting_jobs = {}
+
 # Lock for thread-safe operations
 upload_lock = threading.Lock()
+drafting_lock = threading.Lock()
 
 def add_in_progress_upload(filename):
     with upload_lock:
@@ -48,4 +52,35 @@ def clear_completed_uploads():
 
 def has_in_progress_uploads():
     with upload_lock:
-        return len(in_progress_uploads) > 0
\ No newline at end of file
+        return len(in_progress_uploads) > 0
+
+def start_drafting_job(rfp_name):
+    """Register a drafting job; returns False if one is already running for this RFP."""
+    with drafting_lock:
+        job = drafting_jobs.get(rfp_name)
+        if job is not None and job["status"] == "Processing":
+            return False
+        drafting_jobs[rfp_name] = {"status": "Processing", "total": 0, "completed": 0, "failed": 0}
+        return True
+
+def set_drafting_total(rfp_name, total):
+    with drafting_lock:
+        if rfp_name in drafting_jobs:
+            drafting_jobs[rfp_name]["total"] = total
+
+def update_drafting_job(rfp_name, completed=0, failed=0):
+    with drafting_lock:
+        job = drafting_jobs.get(rfp_name)
+        if job:
+            job["completed"] += completed
+            job["failed"] += failed
+
+def finish_drafting_job(rfp_name, status="Complete"):
+    with drafting_lock:
+        if rfp_name in drafting_jobs:
+            drafting_jobs[rfp_name]["status"] = status
+
+def get_drafting_job(rfp_name):
+    with drafting_lock:
+        job = drafting_jobs.get(rfp_name)
+        return dict(job) if job else None
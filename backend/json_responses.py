@@ -0,0 +1,170 @@
+"""
+JSON response helpers for the Flask app.
+
+Section-heavy endpoints return large JSON payloads, where serialization time and transfer size
+dominate the page load. This module provides:
+
+    - OrjsonProvider, a Flask JSON provider backed by orjson, used when orjson is installed.
+    - compress_response, an after-request hook that compresses JSON and text responses with Brotli
+      (when installed and accepted by the client) or gzip.
+    - parse_pagination and parse_fields, shared parsing of `offset`/`limit` and `fields` arguments.
+"""
+
+# Standard library imports
+import gzip
+import os
+
+# Third-party imports
+from dotenv import load_dotenv
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Load environment variables
+load_dotenv()
+
+# Compression configuration
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson and falls back to Flask's defaults for other types."""
+
+    def _option(self, sort_keys):
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+
+    def dumps(self, obj, **kwargs):
+        option = self._option(kwargs.get("sort_keys", self.sort_keys))
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Build the body as bytes directly instead of going through a str
+        body = orjson.dumps(obj, default=self.default, option=self._option(self.sort_keys))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def configure_json(app):
+    """Use orjson for the app's JSON serialization when it is installed."""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """Return True when an Accept-Encoding header accepts `encoding` with a non-zero quality."""
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() != encoding:
+            continue
+        params = params.replace(" ", "")
+        if not params.startswith("q="):
+            return True
+        try:
+            return float(params[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a buffered JSON or text response for clients that accept it.
+
+    Streamed responses (server-sent events, blob downloads), responses that are already encoded and
+    small bodies are returned unchanged.
+
+    Args:
+        response (Response): The outgoing response.
+        accept_encoding (str): The request's Accept-Encoding header.
+
+    Returns:
+        Response: The same response, compressed when applicable.
+    """
+    if (response.status_code < 200 or response.status_code >= 300 or response.status_code == 204
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if brotli is not None and accepts_encoding(accept_encoding, "br"):
+        encoding = "br"
+    elif accepts_encoding(accept_encoding, "gzip"):
+        encoding = "gzip"
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    if encoding == "br":
+        data = brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    # The encoded body differs byte-wise from the identity body, so its ETag can only be weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def parse_pagination(args):
+    """
+    Parse `offset` and `limit` request arguments.
+
+    Args:
+        args: The request arguments.
+
+    Returns:
+        tuple: (offset, limit), where limit is None when not given.
+
+    Raises:
+        ValueError: If either argument is not an integer.
+    """
+    offset = max(int(args.get('offset', 0)), 0)
+    limit = args.get('limit')
+    limit = max(int(limit), 0) if limit else None
+    return offset, limit
+
+
+def parse_fields(args, allowed):
+    """
+    Parse a comma-separated `fields` request argument.
+
+    Args:
+        args: The request arguments.
+        allowed (list): The optional fields the endpoint can return.
+
+    Returns:
+        set: The requested fields, or all allowed fields when the argument is missing.
+
+    Raises:
+        ValueError: If an unknown field is requested.
+    """
+    fields = args.get('fields')
+    if not fields:
+        return set(allowed)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
@@ -0,0 +1,203 @@
+"""
+Requirements view module for RFP documents.
+
+Extracted requirements live inside each section document, so listing an RFP's requirements means
+reading every section and filtering `is_requirement == 'yes'` in Python. This module maintains a
+denormalized view instead, stored as one small Cosmos DB document per section (a shard holding the
+flat list of that section's requirements, each tagged with its section and index) plus a manifest
+document per RFP whose `updated_at` changes whenever any shard does. Sharding keeps every document
+well below the 2 MB item limit however many requirements an RFP has, and lets extraction and edits
+rewrite only the section they changed.
+
+Reads are served from an in-memory cache, validated on every request with a point read of the
+manifest, so a view updated by another worker is never served stale.
+"""
+
+# Standard library imports
+import os
+import re
+from datetime import datetime, timezone
+
+# Third-party imports
+from azure.cosmos import exceptions
+from dotenv import load_dotenv
+
+# Local imports
+from common.cache import TTLCache
+from common.cosmosdb import CosmosDBManager
+from common.lazy import LazyClient
+
+# Load environment variables
+load_dotenv()
+
+# Cache configuration; cached views are revalidated against the manifest, the TTL only bounds memory
+REQUIREMENTS_VIEW_CACHE_TTL_SECONDS = float(os.getenv("REQUIREMENTS_VIEW_CACHE_TTL_SECONDS", "300"))
+
+# Initialize CosmosDB manager
+cosmos_manager = LazyClient(CosmosDBManager)
+
+view_cache = TTLCache(ttl=REQUIREMENTS_VIEW_CACHE_TTL_SECONDS, max_entries=64, name="requirements_view")
+
+
+def requirements_view_id(rfp_name):
+    """Build the Cosmos DB id of an RFP's requirements view manifest."""
+    return f"{rfp_name} - requirements_view"
+
+
+def requirements_shard_id(rfp_name, section_id):
+    """Build the Cosmos DB id of the requirements view shard of one section."""
+    return f"{rfp_name} - requirements_view - {section_id}"
+
+
+def section_sort_key(section_id):
+    """Order sections naturally, so "2. Scope" comes before "10. Pricing"."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", str(section_id))]
+
+
+def section_entries(section_id, output):
+    """Return the requirements of a section's extraction output, tagged with the section and their index."""
+    return [{**req, "section_id": section_id, "index": index}
+            for index, req in enumerate(output or [])
+            if isinstance(req, dict) and req.get('is_requirement') == 'yes']
+
+
+def touch_manifest(rfp_name):
+    """Record that the view of an RFP changed, so every worker reloads it on its next read."""
+    manifest = {
+        'id': requirements_view_id(rfp_name),
+        'partitionKey': rfp_name,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    cosmos_manager.upsert_item(manifest)
+    view_cache.invalidate(rfp_name)
+    return manifest
+
+
+def update_section_view(rfp_name, section_id, requirements):
+    """
+    Store the view shard of one section after its requirements were extracted or edited.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+        section_id (str): The section the requirements belong to.
+        requirements: The section's `requirements` field (the extraction output, with `output`).
+    """
+    output = requirements.get('output') if isinstance(requirements, dict) else None
+    cosmos_manager.upsert_item({
+        'id': requirements_shard_id(rfp_name, section_id),
+        'partitionKey': rfp_name,
+        # Shards carry `view_section_id` and `entries` rather than `section_id` and `requirements`,
+        # so queries on section documents never match them
+        'view_section_id': section_id,
+        'entries': section_entries(section_id, output)
+    })
+    touch_manifest(rfp_name)
+
+
+def rebuild_requirements_view(rfp_name):
+    """
+    Rebuild and store every shard of the requirements view of an RFP from its section documents.
+
+    Only needed for RFPs extracted before the view was maintained per section; extraction and
+    edits keep the shards current with `update_section_view`. Callers must make sure the RFP has
+    sections, as this creates its manifest.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+
+    Returns:
+        dict: The stored manifest.
+    """
+    items = cosmos_manager.query_partition(rfp_name, "c.section_id, c.requirements.output",
+                                           conditions=["IS_DEFINED(c.requirements)"])
+    for item in items:
+        cosmos_manager.upsert_item({
+            'id': requirements_shard_id(rfp_name, item.get('section_id')),
+            'partitionKey': rfp_name,
+            'view_section_id': item.get('section_id'),
+            'entries': section_entries(item.get('section_id'), item.get('output'))
+        })
+    return touch_manifest(rfp_name)
+
+
+def read_manifest(rfp_name):
+    """Read the manifest of an RFP's view, or None if the view has never been built."""
+    try:
+        manifest = cosmos_manager.read_item(requirements_view_id(rfp_name), rfp_name)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    # Views stored as a single document held their entries in the manifest itself
+    return None if 'entries' in manifest else manifest
+
+
+def load_requirements_view(rfp_name, updated_at):
+    """Assemble the view of an RFP from its shards."""
+    shards = cosmos_manager.query_partition(rfp_name, "c.view_section_id, c.entries",
+                                            conditions=["IS_DEFINED(c.view_section_id)"])
+    shards.sort(key=lambda shard: section_sort_key(shard.get('view_section_id')))
+    return {
+        'entries': [entry for shard in shards for entry in shard.get('entries') or []],
+        'section_count': len(shards),
+        'updated_at': updated_at
+    }
+
+
+def get_requirements_view(rfp_name):
+    """
+    Get the requirements view of an RFP, from the cache when it is still current.
+
+    A point read of the manifest (about 1 RU) tells whether the cached view is current; the shards
+    are only queried when it changed. An RFP without a manifest only gets one built if it has
+    sections, since every partition key is listed as an RFP and a read must not create one.
+    """
+    manifest = read_manifest(rfp_name)
+    if manifest is None:
+        if not cosmos_manager.count_partition(rfp_name, conditions=["IS_DEFINED(c.section_content)"]):
+            return {'entries': [], 'section_count': 0, 'updated_at': None}
+        manifest = rebuild_requirements_view(rfp_name)
+
+    cached = view_cache.get(rfp_name)
+    if cached is not None and cached['updated_at'] == manifest['updated_at']:
+        return cached
+    view = load_requirements_view(rfp_name, manifest['updated_at'])
+    view_cache.set(rfp_name, view)
+    return view
+
+
+def query_requirements(rfp_name, section_id=None, section_name=None, page_number=None, offset=0, limit=None):
+    """
+    Filter and paginate the requirements of an RFP.
+
+    Args:
+        rfp_name (str): The name of the RFP document.
+        section_id (str): Optional section document id to filter on.
+        section_name (str): Optional section name to filter on (case-insensitive).
+        page_number (str): Optional page number to filter on.
+        offset (int): The number of matching requirements to skip.
+        limit (int): The maximum number of requirements to return; None returns all.
+
+    Returns:
+        dict: `requirements` (the requested page), `total` (all matches), `offset`, `limit`,
+        `section_count` and `updated_at` of the view.
+    """
+    view = get_requirements_view(rfp_name)
+    requirements = view.get('entries', [])
+
+    if section_id:
+        requirements = [req for req in requirements if req.get('section_id') == section_id]
+    if section_name:
+        section_name = section_name.lower()
+        requirements = [req for req in requirements if str(req.get('section_name', '')).lower() == section_name]
+    if page_number:
+        requirements = [req for req in requirements if str(req.get('page_number', '')) == str(page_number)]
+
+    total = len(requirements)
+    end = None if limit is None else offset + limit
+    return {
+        "requirements": requirements[offset:end],
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "section_count": view.get('section_count', 0),
+        "updated_at": view.get('updated_at')
+    }
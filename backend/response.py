@@ -1,23 +1,26 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, List, Any
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents.models import VectorizedQuery
-from openai import AzureOpenAI
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
+from common.cache import TTLCache
+from common.embeddings import generate_embeddings
+from common.lazy import LazyClient
+from common.llm_router import BATCH, INTERACTIVE, RoutedChatModel
+from common.metrics import BING, SEARCH, observe_upstream, upstream_hooks
+from common.tracing import current_span, propagate, traced
 from prompts import response_to_requirement_prompt, bing_search_query_rewrite_prompt
 
 load_dotenv()
 
-# Azure OpenAI Configuration
-aoai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-aoai_key = os.getenv("AZURE_OPENAI_API_KEY")
-aoai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-
 # Azure Cognitive Search Configuration
 ai_search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
 ai_search_key = os.getenv("AZURE_SEARCH_KEY")
@@ -29,62 +32,53 @@ search_url = "https://api.bing.microsoft.com/v7.0/search"
 bing_search_enabled = os.getenv("BING_SEARCH_ENABLED", "false").lower() == "true"
 knowledge_base_search_enabled = os.getenv("KNOWLEDGE_BASE_SEARCH_ENABLED", "false").lower() == "true"
 
+# Knowledge retrieval configuration
+bing_search_timeout = float(os.getenv("BING_SEARCH_TIMEOUT", "8"))
+knowledge_base_timeout = float(os.getenv("KNOWLEDGE_BASE_TIMEOUT", "8"))
+knowledge_cache_ttl = float(os.getenv("KNOWLEDGE_CACHE_TTL_SECONDS", "900"))
+
 # Initialize clients
-primary_llm = AzureChatOpenAI(
-    azure_deployment=aoai_deployment,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=aoai_key,
-    azure_endpoint=aoai_endpoint
-)
-
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=aoai_deployment,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=aoai_key,
-    azure_endpoint=aoai_endpoint,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
-
-aoai_client = AzureOpenAI(
-    azure_endpoint=aoai_endpoint,
-    api_key=aoai_key,
-    api_version="2023-05-15"
-)
-
-search_client = SearchClient(
+primary_llm = RoutedChatModel(INTERACTIVE)
+
+primary_llm_json = RoutedChatModel(INTERACTIVE, json_mode=True)
+
+# Bulk drafting runs as a batch workload so it never competes with interactive responses
+batch_llm = RoutedChatModel(BATCH)
+
+search_client = LazyClient(lambda: SearchClient(
     endpoint=ai_search_endpoint,
     index_name=ai_search_index,
-    credential=AzureKeyCredential(ai_search_key)
-)
+    credential=AzureKeyCredential(ai_search_key),
+    **upstream_hooks(SEARCH)
+))
 
-def generate_embeddings(text: str, model: str = "text-embedding-ada-002") -> List[float]:
-    """Generate embeddings for the given text using Azure OpenAI."""
-    return aoai_client.embeddings.create(input=[text], model=model).data[0].embedding
+# Pooled HTTP session so Bing requests reuse TLS connections
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
 
-def bing_search(requirement: str) -> List[Dict[str, str]]:
-    """Perform a Bing web search with LLM-rewritten query and return formatted results."""
-    # First, rewrite the requirement into a search query
-    messages = [
-        {"role": "system", "content": bing_search_query_rewrite_prompt},
-        {"role": "user", "content": requirement}
-    ]
-    
-    try:
-        # Get the rewritten search query
+# Shared pool for fanning out to knowledge sources; sized for several concurrent requests
+knowledge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="knowledge")
+
+# Caches keyed by requirement text (rewrites, KB results) and by search query (Bing results)
+query_rewrite_cache = TTLCache(ttl=knowledge_cache_ttl, name="query_rewrite")
+bing_results_cache = TTLCache(ttl=knowledge_cache_ttl, name="bing_results")
+kb_results_cache = TTLCache(ttl=knowledge_cache_ttl, name="knowledge_base_results")
+
+def rewrite_search_query(requirement: str) -> str:
+    """Rewrite a requirement into a web search query with the LLM, caching the result."""
+    def rewrite():
+        messages = [
+            {"role": "system", "content": bing_search_query_rewrite_prompt},
+            {"role": "user", "content": requirement}
+        ]
         response = primary_llm.invoke(messages)
-        search_query = response.content
-        print(f"Original requirement: {requirement}")
-        print(f"Rewritten search query: {search_query}")
-        
-        # Perform the Bing search with the rewritten query
+        return response.content
+
+    return query_rewrite_cache.get_or_set(requirement, rewrite)
+
+def bing_web_search(search_query: str) -> List[Dict[str, str]]:
+    """Run a Bing web search over the pooled session, caching the formatted results."""
+    def fetch():
         headers = {"Ocp-Apim-Subscription-Key": subscription_key}
         params = {
             "q": search_query,
@@ -93,8 +87,9 @@ def bing_search(requirement: str) -> List[Dict[str, str]]:
             "count": 15
         }
         
-        response = requests.get(search_url, headers=headers, params=params)
-        response.raise_for_status()
+        with observe_upstream(BING, "search"):
+            response = http_session.get(search_url, headers=headers, params=params, timeout=bing_search_timeout)
+            response.raise_for_status()
         search_results = response.json()
         
         formatted_results = []
@@ -104,15 +99,29 @@ def bing_search(requirement: str) -> List[Dict[str, str]]:
                     "source": "web",
                     "content": result["snippet"]
                 })
-                
         return formatted_results
+
+    return bing_results_cache.get_or_set(search_query, fetch)
+
+@traced("retrieval.bing")
+def bing_search(requirement: str) -> List[Dict[str, str]]:
+    """Perform a Bing web search with LLM-rewritten query and return formatted results."""
+    try:
+        # First, rewrite the requirement into a search query
+        search_query = rewrite_search_query(requirement)
+        print(f"Original requirement: {requirement}")
+        print(f"Rewritten search query: {search_query}")
+        
+        # Perform the Bing search with the rewritten query
+        return bing_web_search(search_query)
     except Exception as e:
         print(f"Error in Bing search: {str(e)}")
         return []
 
+@traced("retrieval.knowledge_base")
 def knowledge_base_query(requirement: str) -> List[Dict[str, Any]]:
     """Query the knowledge base using Azure Cognitive Search with the new index structure."""
-    try:
+    def query():
         # Generate embeddings for the requirement
         query_vector = generate_embeddings(requirement)
         vector_query = VectorizedQuery(
@@ -144,6 +153,9 @@ def knowledge_base_query(requirement: str) -> List[Dict[str, Any]]:
             formatted_results.append(formatted_result)
             
         return formatted_results
+
+    try:
+        return kb_results_cache.get_or_set(requirement, query)
     except Exception as e:
         print(f"Error in knowledge base query: {str(e)}")
         return []
@@ -169,27 +181,44 @@ def format_knowledge_for_llm(knowledge_results: Dict[str, List[Dict[str, Any]]])
     
     return "\n".join(formatted_text)
 
+@traced("retrieval.knowledge")
 def get_knowledge(requirement: str) -> Dict[str, List[Dict[str, Any]]]:
-    """Gather knowledge from multiple sources based on the requirement."""
-    results = {}
-    
+    """
+    Gather knowledge from multiple sources based on the requirement.
+
+    Enabled sources run concurrently. Each has its own timeout; a source that does not answer in
+    time is left out of the result (it keeps running in the background and fills its cache).
+    """
+    sources = {}
     if bing_search_enabled:
-        bing_results = bing_search(requirement)
-        if bing_results:
-            results["bing"] = bing_results
-    
+        sources["bing"] = (bing_search, bing_search_timeout)
     if knowledge_base_search_enabled:
-        kb_results = knowledge_base_query(requirement)
-        if kb_results:
-            results["kb"] = kb_results
-        
+        sources["kb"] = (knowledge_base_query, knowledge_base_timeout)
+
+    start = time.monotonic()
+    futures = {
+        source_type: (knowledge_executor.submit(propagate(source), requirement), timeout)
+        for source_type, (source, timeout) in sources.items()
+    }
+
+    results = {}
+    for source_type, (future, timeout) in futures.items():
+        try:
+            source_results = future.result(timeout=max(0.0, start + timeout - time.monotonic()))
+        except FutureTimeoutError:
+            print(f"Knowledge source '{source_type}' timed out after {timeout:g}s")
+            continue
+        if source_results:
+            results[source_type] = source_results
+
+    current_span().set_attributes({
+        "retrieval.sources": list(sources),
+        "retrieval.results": sum(len(source_results) for source_results in results.values()),
+    })
     return results
 
-def respond_to_requirement(user_message: str, requirement: str):
-    """Generate a response to a requirement using multiple knowledge sources."""
-    # Get knowledge from various sources
-    knowledge_results = get_knowledge(requirement)
-    
+def build_response_messages(user_message: str, requirement: str, knowledge_results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """Build the LLM messages for drafting a response to a requirement from gathered knowledge."""
     # Format the knowledge for the LLM
     knowledge_text = format_knowledge_for_llm(knowledge_results)
     
@@ -209,13 +238,39 @@ def respond_to_requirement(user_message: str, requirement: str):
     print(f"Sending to LLM: {llm_input}")
 
     # Prepare messages for the LLM
-    messages = [
+    return [
         {"role": "system", "content": response_to_requirement_prompt},
         {"role": "user", "content": llm_input}
     ]
+
+def draft_response(requirement: str, knowledge_results: Dict[str, List[Dict[str, Any]]], user_message: str = "") -> str:
+    """Draft a complete (non-streamed) response to a requirement, for bulk drafting jobs."""
+    messages = build_response_messages(user_message, requirement, knowledge_results)
+    return batch_llm.invoke(messages).content
+
+@traced("respond_to_requirement")
+def respond_to_requirement(user_message: str, requirement: str):
+    """Generate a response to a requirement using multiple knowledge sources."""
+    # Get knowledge from various sources
+    knowledge_results = get_knowledge(requirement)
+    messages = build_response_messages(user_message, requirement, knowledge_results)
     
     # Stream the response
     for chunk in primary_llm.stream(messages):
         yield chunk.content
 
-    return "success"
\ No newline at end of file
+    return "success"
+
+@traced("respond_to_requirement")
+async def arespond_to_requirement(user_message: str, requirement: str):
+    """
+    Async variant of `respond_to_requirement` for the ASGI server.
+
+    Knowledge retrieval runs in a worker thread (it already fans out with per-source timeouts); the
+    generation itself is streamed with `astream`, so a long response holds no thread while it streams.
+    """
+    knowledge_results = await asyncio.to_thread(get_knowledge, requirement)
+    messages = build_response_messages(user_message, requirement, knowledge_results)
+
+    async for chunk in primary_llm.astream(messages):
+        yield chunk.content
@@ -14,11 +14,14 @@ from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from azure.search.documents.models import VectorizedQuery
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from openai import AzureOpenAI
 
 # Local imports
 from common.cosmosdb import CosmosDBManager
+from common.embeddings import generate_embeddings
+from common.lazy import LazyClient
+from common.llm_router import INTERACTIVE, RoutedChatModel
+from common.metrics import SEARCH, upstream_hooks
+from common.tracing import propagate, traced
 from prompts import explanation_prompt, query_prompt
 
 # Load environment variables
@@ -29,44 +32,15 @@ AI_SEARCH_ENDPOINT = os.environ["AZURE_SEARCH_ENDPOINT"]
 AI_SEARCH_KEY = os.environ["AZURE_SEARCH_KEY"]
 AI_SEARCH_INDEX = os.environ["AZURE_SEARCH_INDEX_RESUMES"]
 
-# Azure OpenAI configuration
-AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-
 # Initialize clients
-search_client = SearchClient(AI_SEARCH_ENDPOINT, AI_SEARCH_INDEX, AzureKeyCredential(AI_SEARCH_KEY))
-
-aoai_client = AzureOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_KEY"),
-    api_version="2023-05-15"
-)
-
-primary_llm = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT
-)
-
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
-
-cosmos_manager = CosmosDBManager()
+search_client = LazyClient(lambda: SearchClient(AI_SEARCH_ENDPOINT, AI_SEARCH_INDEX, AzureKeyCredential(AI_SEARCH_KEY),
+                                                  **upstream_hooks(SEARCH)))
+
+primary_llm = RoutedChatModel(INTERACTIVE)
+
+primary_llm_json = RoutedChatModel(INTERACTIVE, json_mode=True)
+
+cosmos_manager = LazyClient(CosmosDBManager)
 
 def get_rfp_analysis(rfp_name):
     """
@@ -79,10 +53,8 @@ def get_rfp_analysis(rfp_name):
         str: The skills and experience requirements from the RFP analysis.
     """
     try:
-        query = "SELECT c.skills_and_experience FROM c WHERE c.partitionKey = @partitionKey"
-        parameters = [{"name": "@partitionKey", "value": rfp_name}]
-        
-        items = cosmos_manager.query_items(query, parameters)
+        items = cosmos_manager.query_partition(rfp_name, "c.skills_and_experience",
+                                               conditions=["IS_DEFINED(c.skills_and_experience)"])
         
         for item in items:
             if 'skills_and_experience' in item:
@@ -93,6 +65,7 @@ def get_rfp_analysis(rfp_name):
         print(f"Error retrieving RFP analysis: {str(e)}")
         return "An error occurred while fetching RFP analysis"
 
+@traced("search")
 def search(rfp_name, user_input):
     """
     Perform a search for matching resumes based on RFP requirements and user input.
@@ -132,7 +105,7 @@ def search(rfp_name, user_input):
     )
 
     with ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_result = {executor.submit(generate_explanation, result['content'], skills_and_experience): result for result in results}
+        future_to_result = {executor.submit(propagate(generate_explanation), result['content'], skills_and_experience): result for result in results}
         
         formatted_results = []
         for future in as_completed(future_to_result):
@@ -195,19 +168,6 @@ def generate_explanation(content, skills_and_experience):
             "relevant_projects": 0
         }
 
-def generate_embeddings(text, model="text-embedding-ada-002"):
-    """
-    Generate embeddings for the given text using Azure OpenAI.
-
-    Args:
-        text (str): The text to generate embeddings for.
-        model (str): The name of the embedding model to use.
-
-    Returns:
-        list: The generated embedding vector.
-    """
-    return aoai_client.embeddings.create(input=[text], model=model).data[0].embedding
-
 if __name__ == "__main__":
     # Example usage
     search("rfp_name", "user_input")
\ No newline at end of file
@@ -18,11 +18,14 @@ from io import BytesIO
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 
 # Local imports
 from common.adls import ADLSManager
 from common.cosmosdb import CosmosDBManager
+from common.lazy import LazyClient
+from common.llm_router import INTERACTIVE, RoutedChatModel
+from common.metrics import DOCUMENT_INTELLIGENCE, observe_upstream, upstream_hooks
+from common.tracing import span, traced
 from chunking import start_chunking_process
 from prompts import overview_prompt
 
@@ -33,40 +36,16 @@ load_dotenv()
 FORM_RECOGNIZER_ENDPOINT = os.getenv("FORM_RECOGNIZER_ENDPOINT")
 FORM_RECOGNIZER_KEY = os.getenv("FORM_RECOGNIZER_KEY")
 
-# Azure OpenAI configuration
-AOAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-
 # Initialize managers and clients
-adls_manager = ADLSManager()
-cosmos_db = CosmosDBManager()
-document_intelligence_client = DocumentIntelligenceClient(
-    FORM_RECOGNIZER_ENDPOINT, AzureKeyCredential(FORM_RECOGNIZER_KEY)
-)
-
-primary_llm = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT
-)
-
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=AOAI_DEPLOYMENT,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=AOAI_KEY,
-    azure_endpoint=AOAI_ENDPOINT,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
+adls_manager = LazyClient(ADLSManager)
+cosmos_db = LazyClient(CosmosDBManager)
+document_intelligence_client = LazyClient(lambda: DocumentIntelligenceClient(
+    FORM_RECOGNIZER_ENDPOINT, AzureKeyCredential(FORM_RECOGNIZER_KEY), **upstream_hooks(DOCUMENT_INTELLIGENCE)
+))
+
+primary_llm = RoutedChatModel(INTERACTIVE)
+
+primary_llm_json = RoutedChatModel(INTERACTIVE, json_mode=True)
 
 def read_pdf(input_file):
     """
@@ -85,11 +64,16 @@ def read_pdf(input_file):
     blob_url = f"https://{storage_account_name}.blob.core.windows.net/{storage_account_container}/{input_file}"
     print(f"Blob URL: {blob_url}")
     analyze_request = {"urlSource": blob_url}
-    poller = document_intelligence_client.begin_analyze_document("prebuilt-layout", analyze_request=analyze_request)
-    result = poller.result()
+    with span("document_intelligence.analyze_layout", rfp_name=input_file) as current:
+        # The individual submit and polling requests are recorded by the client hooks; this is the whole analysis
+        with observe_upstream(DOCUMENT_INTELLIGENCE, "analyze_layout"):
+            poller = document_intelligence_client.begin_analyze_document("prebuilt-layout", analyze_request=analyze_request)
+            result = poller.result()
+        current.set_attributes({"document.pages": len(result.pages or []), "document.paragraphs": len(result.paragraphs or [])})
     print("Successfully read the PDF from ADLS with doc intelligence.")
     return result
 
+@traced("upload.process_rfp")
 def process_rfp(file_content, original_filename):
     """
     Process an RFP document.
@@ -98,7 +82,8 @@ def process_rfp(file_content, original_filename):
     extracts skills and experience information using Azure OpenAI, and stores the results in Cosmos DB.
 
     Args:
-        file_content: The content of the file to process.
+        file_content: The content of the file to process, as bytes or a readable stream. Streams are
+            uploaded in blocks without being read fully into memory.
         original_filename: The original name of the file.
 
     Yields:
@@ -110,7 +95,8 @@ def process_rfp(file_content, original_filename):
     try:
         # Upload file to ADLS
         print("Uploading file to ADLS.")
-        upload_result = adls_manager.upload_to_blob(file_content, original_filename)
+        with span("adls.upload", rfp_name=original_filename):
+            upload_result = adls_manager.upload_to_blob(file_content, original_filename)
         print(f"Upload result: {upload_result['message']}")
 
         # Process with Document Intelligence
@@ -136,7 +122,8 @@ def process_rfp(file_content, original_filename):
             "skills_and_experience": final_response
         }
 
-        cosmos_db.create_item(skills_and_experience_json)
+        with span("cosmos.write", rfp_name=original_filename, **{"cosmos.items": 1}):
+            cosmos_db.create_item(skills_and_experience_json)
 
         return final_response
 
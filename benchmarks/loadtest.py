@@ -0,0 +1,332 @@
+"""
+Load test the HTTP API with concurrent analyst sessions, against the app wired to local stand-ins
+for every upstream service (see standins.py).
+
+Each virtual user replays the sessions of an analyst working on a new RFP, with think times
+between steps:
+
+    1. upload a synthetic RFP (POST /upload, streamed analysis)
+    2. start requirement extraction (POST /start-extraction) and poll GET /progress
+    3. browse the sections page by page (GET /get-rfp-sections)
+    4. ask questions about a section and about the whole RFP (POST /chat, streamed)
+    5. draft responses to extracted requirements (POST /respond-to-requirement, streamed)
+    6. look for matching staff (POST /search)
+
+The report shows, per endpoint, the request and error counts, throughput and latency percentiles,
+and for streaming endpoints the time to the first byte of the stream. With --baseline the run is
+compared with an earlier --json result and exits with status 1 when an endpoint's p95 latency or
+time to first byte regressed by more than --max-regression, or when errors exceed --max-error-rate,
+so it can gate changes that affect scaling.
+
+By default the app is served in this process (uvicorn for the ASGI app, or the threaded Werkzeug
+server with --server flask), since the stand-ins must run in the server's process. The load
+generator then shares the process with the server; for high user counts, serve the app with the
+stand-ins in one process (--serve) and point the load generator at it from another (--url).
+
+Usage:
+    python benchmarks/loadtest.py [--users 20] [--sessions 1] [--ramp-up 10] [--server asgi|flask]
+                                  [--pages 20] [--latency-scale 1.0] [--json results.json]
+                                  [--baseline baseline.json --max-regression 0.2]
+    python benchmarks/loadtest.py --serve [--port 5000]
+    python benchmarks/loadtest.py --url http://localhost:5000 --users 100
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import run
+import standins
+import synthetic
+
+STREAMING_ENDPOINTS = {"/upload", "/chat", "/respond-to-requirement"}
+SECTIONS_PAGE_SIZE = 20
+
+
+class Recorder:
+    """Thread-safe record of every request made, per endpoint."""
+
+    def __init__(self):
+        self.requests: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float, first_byte_seconds: Optional[float], status: Optional[int],
+            error: Optional[str] = None) -> None:
+        with self._lock:
+            self.requests.setdefault(endpoint, []).append({
+                "seconds": seconds, "first_byte_seconds": first_byte_seconds, "status": status, "error": error,
+            })
+
+    def summary(self, wall_seconds: float) -> Dict[str, Dict[str, Any]]:
+        """Counts, throughput and latency distributions per endpoint."""
+        with self._lock:
+            requests = {endpoint: list(entries) for endpoint, entries in self.requests.items()}
+        results = {}
+        for endpoint, entries in sorted(requests.items()):
+            succeeded = [entry for entry in entries if entry["error"] is None]
+            result = {
+                "requests": len(entries),
+                "errors": len(entries) - len(succeeded),
+                "throughput_per_second": round(len(entries) / wall_seconds, 3) if wall_seconds else 0.0,
+                "latency": run.distribution([entry["seconds"] for entry in succeeded]),
+            }
+            if endpoint in STREAMING_ENDPOINTS:
+                result["first_byte"] = run.distribution([entry["first_byte_seconds"] for entry in succeeded
+                                                         if entry["first_byte_seconds"] is not None])
+            errors = [entry["error"] for entry in entries if entry["error"] is not None]
+            if errors:
+                result["error_examples"] = sorted(set(errors))[:3]
+            results[endpoint] = result
+        return results
+
+
+class AnalystSession:
+    """One virtual user: a client, the recorder and the steps of an analyst session."""
+
+    def __init__(self, base_url: str, recorder: Recorder, args: argparse.Namespace, user: int):
+        self.client = httpx.Client(base_url=base_url, timeout=args.timeout)
+        self.recorder = recorder
+        self.args = args
+        self.user = user
+        self.rng = random.Random(synthetic.seed_of("loadtest", args.seed, user))
+
+    def think(self) -> None:
+        if self.args.think_time > 0:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_time)
+
+    def request(self, method: str, endpoint: str, **kwargs) -> Optional[bytes]:
+        """Make a request, read the whole (possibly streamed) response and record it; returns the body."""
+        started_at = time.perf_counter()
+        first_byte_seconds = None
+        chunks = []
+        try:
+            with self.client.stream(method, endpoint, **kwargs) as response:
+                for chunk in response.iter_bytes():
+                    if first_byte_seconds is None and chunk:
+                        first_byte_seconds = time.perf_counter() - started_at
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            self.recorder.add(endpoint, time.perf_counter() - started_at, first_byte_seconds, None,
+                              f"{type(e).__name__}: {str(e)}")
+            return None
+
+        seconds = time.perf_counter() - started_at
+        body = b"".join(chunks)
+        error = None
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}: {body[:200].decode('utf-8', 'replace')}"
+        elif endpoint == "/upload" and b"Error processing RFP" in body:
+            # process_rfp reports failures in its stream rather than with a status code
+            error = body[body.find(b"Error processing RFP"):][:200].decode("utf-8", "replace")
+        self.recorder.add(endpoint, seconds, first_byte_seconds, response.status_code, error)
+        return body if error is None else None
+
+    def json(self, body: Optional[bytes]) -> Dict[str, Any]:
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def run(self, session: int) -> None:
+        rfp_name = f"loadtest-{self.args.seed}-u{self.user}-s{session}.pdf"
+        document = synthetic.placeholder_pdf(self.args.pages, synthetic.seed_of(rfp_name) % 1000)
+
+        if self.request("POST", "/upload", files={"file": (rfp_name, document, "application/pdf")}) is None:
+            return
+        self.think()
+
+        self.request("POST", "/start-extraction", json={"rfp_name": rfp_name})
+        for _ in range(self.args.progress_polls):
+            self.think()
+            progress = self.json(self.request("GET", "/progress", params={"rfp_name": rfp_name}))
+            if progress.get("extraction_progress", 0) >= 100:
+                break
+
+        sections: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page = self.json(self.request("GET", "/get-rfp-sections", params={
+                "rfp_name": rfp_name, "offset": offset, "limit": SECTIONS_PAGE_SIZE, "fields": "requirements"}))
+            sections.extend(page.get("sections", []))
+            offset += SECTIONS_PAGE_SIZE
+            if offset >= page.get("total", 0):
+                break
+            self.think()
+
+        for index in range(self.args.chats):
+            self.think()
+            if index % 2 == 0 and sections:
+                message = f'Summarize the requirements of "{self.rng.choice(sections)["section_id"]}".'
+            else:
+                message = "What are the key deliverables and deadlines of this RFP?"
+            self.request("POST", "/chat", json={"message": message, "rfp_name": rfp_name})
+
+        requirements = [requirement["content"] for section in sections for requirement in section.get("requirements", [])
+                        if requirement.get("is_requirement") == "yes"]
+        for _ in range(self.args.responses):
+            self.think()
+            requirement = self.rng.choice(requirements) if requirements else synthetic.requirement_sentence(self.rng)
+            self.request("POST", "/respond-to-requirement", json={"requirement": requirement, "user_message": ""})
+
+        self.think()
+        self.request("POST", "/search", json={"rfpName": rfp_name, "feedback": "Public sector delivery experience"})
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def run_users(base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run `args.users` virtual users, started evenly over the ramp-up, and summarize their requests."""
+    recorder = Recorder()
+
+    def user(index: int) -> None:
+        time.sleep(args.ramp_up * index / max(1, args.users))
+        session = AnalystSession(base_url, recorder, args, index)
+        try:
+            for number in range(args.sessions):
+                session.run(number)
+        except Exception as e:
+            recorder.add("session", 0.0, None, None, f"{type(e).__name__}: {str(e)}")
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=user, args=(index,), name=f"loadtest-user-{index}") for index in range(args.users)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started_at
+    return {"wall_seconds": round(wall_seconds, 3), "endpoints": recorder.summary(wall_seconds)}
+
+
+def serve(args: argparse.Namespace) -> Any:
+    """Start the app on `args.port` in a background thread; returns the server."""
+    if args.server == "asgi":
+        import uvicorn
+        from asgi import app
+
+        server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port, log_level="warning"))
+        threading.Thread(target=server.run, name="loadtest-server", daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        return server
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server(args.host, args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    return server
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    """Render the per-endpoint results as a table."""
+    header = f"{'endpoint':<26}{'requests':>9}{'errors':>8}{'req/s':>8}" + "".join(f"{f'p{q} ms':>10}" for q in run.PERCENTILES)
+    header += f"{'max ms':>10}" + "".join(f"{f'ttfb p{q}':>10}" for q in run.PERCENTILES)
+    lines = [header, "-" * len(header)]
+    for endpoint, stats in result["endpoints"].items():
+        latency = stats["latency"]
+        line = f"{endpoint:<26}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_per_second']:>8.2f}"
+        line += "".join(f"{latency[f'p{q}_ms']:>10.1f}" for q in run.PERCENTILES) + f"{latency['max_ms']:>10.1f}"
+        if "first_byte" in stats:
+            line += "".join(f"{stats['first_byte'][f'p{q}_ms']:>10.1f}" for q in run.PERCENTILES)
+        lines.append(line)
+    lines.append(f"\nWall time: {result['wall_seconds']:.1f} s")
+    for endpoint, stats in result["endpoints"].items():
+        for error in stats.get("error_examples", []):
+            lines.append(f"{endpoint} error: {error}")
+    if result.get("stand_ins"):
+        lines.append("Stand-ins: " + ", ".join(f"{key}={value:,.0f}" for key, value in result["stand_ins"].items()))
+    return "\n".join(lines)
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float, max_error_rate: float) -> List[str]:
+    """
+    Compare a run with a baseline run.
+
+    Returns:
+        list: A description of every regression: p95 latency or time to first byte above the
+        baseline by more than `max_regression`, or an error rate above `max_error_rate`.
+    """
+    failures = []
+    for endpoint, stats in result["endpoints"].items():
+        if stats["requests"] and stats["errors"] / stats["requests"] > max_error_rate:
+            failures.append(f"{endpoint}: {stats['errors']} of {stats['requests']} requests failed")
+        reference = baseline.get("endpoints", {}).get(endpoint)
+        if reference is None:
+            continue
+        for metric in ("latency", "first_byte"):
+            current, previous = stats.get(metric, {}).get("p95_ms"), reference.get(metric, {}).get("p95_ms")
+            if current and previous and current > previous * (1 + max_regression):
+                failures.append(f"{endpoint}: {metric} p95 {current:.1f} ms vs {previous:.1f} ms in the baseline "
+                                f"(+{100 * (current / previous - 1):.0f}%)")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the HTTP API with concurrent analyst sessions.")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=1, help="Sessions each user runs, one after another")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds over which the users start")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between a user's requests")
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the uploaded synthetic RFPs")
+    parser.add_argument("--progress-polls", type=int, default=5, help="Maximum /progress polls per session")
+    parser.add_argument("--chats", type=int, default=2, help="Chat questions per session")
+    parser.add_argument("--responses", type=int, default=2, help="Requirement responses per session")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Request timeout in seconds")
+    parser.add_argument("--server", choices=["asgi", "flask"], default="asgi", help="How to serve the app in this process")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to serve the app on")
+    parser.add_argument("--port", type=int, default=5055, help="Port to serve the app on")
+    parser.add_argument("--serve", action="store_true", help="Only serve the app with the stand-ins, until interrupted")
+    parser.add_argument("--url", help="Load test an app already served with --serve instead of serving one")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Results of an earlier run (--json) to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed increase of p95 latency and time to first byte over the baseline")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="Allowed fraction of failed requests per endpoint")
+    parser.add_argument("--verbose", action="store_true", help="Show the backend's output")
+    run.add_stand_in_arguments(parser)
+    args = parser.parse_args()
+
+    stand_ins = None
+    base_url = args.url
+    if base_url is None:
+        base_url = f"http://{args.host}:{args.port}"
+        with run.quiet(args.verbose or args.serve):
+            stand_ins = standins.install(run.config_from_args(args))
+            server = serve(args)
+        print(f"Serving the app ({args.server}) with stand-ins at {base_url}", file=sys.stderr)
+        if args.serve:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                sys.exit(0)
+
+    print(f"Running {args.users} users x {args.sessions} sessions against {base_url}...", file=sys.stderr)
+    with run.quiet(args.verbose or args.url is not None):
+        result = run_users(base_url, args)
+    if stand_ins is not None:
+        result["stand_ins"] = stand_ins.stats()
+
+    print(format_report(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"arguments": vars(args), **result}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(result, json.load(f), args.max_regression, args.max_error_rate)
+    else:
+        failures = compare(result, {}, args.max_regression, args.max_error_rate)
+    if failures:
+        print("\nRegressions:\n" + "\n".join(f"  {failure}" for failure in failures))
+        sys.exit(1)
@@ -0,0 +1,332 @@
+"""
+Benchmark the backend's processing pipeline offline, against local stand-ins for every upstream
+service (see standins.py).
+
+Each scenario calls the same functions the routes call, a number of times with the given
+concurrency, and reports throughput and latency percentiles; streaming scenarios also report the
+time to the first chunk. The stand-ins' counters (LLM calls and tokens, Cosmos DB request units,
+Blob bytes, ...) are reported per scenario, which makes the cost of a change visible as well as its
+speed.
+
+Scenarios:
+    upload      upload a synthetic PDF, analyze it and stream the RFP analysis (process_rfp); the
+                background chunking it starts is waited for but not timed
+    chunking    split a synthetic layout into sections, validate and store them (chunking)
+    extraction  extract, merge and index the requirements of a stored RFP (extraction_process)
+    chat        answer questions about one section and about the whole RFP (run_interaction)
+    search      find and explain matching resumes (search)
+
+Latencies of the stand-ins are realistic defaults; scale them with --latency-scale, or set it to 0 to
+measure only the backend's own processing time.
+
+Usage:
+    python benchmarks/run.py [--scenarios upload,chat] [--iterations 20] [--concurrency 4]
+                             [--pages 40] [--latency-scale 1.0] [--json results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import standins
+import synthetic
+
+SCENARIOS = ["upload", "chunking", "extraction", "chat", "search"]
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile of the values, interpolating between the closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def distribution(seconds: List[float]) -> Dict[str, float]:
+    """Percentiles and maximum of a list of durations, in milliseconds."""
+    summary = {f"p{q}_ms": round(1000 * percentile(seconds, q), 1) for q in PERCENTILES}
+    summary["max_ms"] = round(1000 * max(seconds), 1) if seconds else 0.0
+    return summary
+
+
+class Sample:
+    """The outcome of one operation."""
+
+    def __init__(self, seconds: float, first_chunk_seconds: Optional[float] = None, error: Optional[str] = None):
+        self.seconds = seconds
+        self.first_chunk_seconds = first_chunk_seconds
+        self.error = error
+
+
+def timed(operation: Callable[[], Any]) -> Sample:
+    """Run an operation; if it returns an iterator, consume it and time its first chunk too."""
+    started_at = time.perf_counter()
+    first_chunk_seconds = None
+    try:
+        result = operation()
+        if hasattr(result, "__next__"):
+            for chunk in result:
+                if first_chunk_seconds is None:
+                    first_chunk_seconds = time.perf_counter() - started_at
+                if isinstance(chunk, str) and chunk.startswith("Error processing RFP"):
+                    # process_rfp reports failures in its stream rather than raising
+                    return Sample(time.perf_counter() - started_at, first_chunk_seconds, chunk.strip())
+        return Sample(time.perf_counter() - started_at, first_chunk_seconds)
+    except Exception as e:
+        return Sample(time.perf_counter() - started_at, first_chunk_seconds, f"{type(e).__name__}: {str(e)}")
+
+
+class Scenario:
+    """
+    A benchmark scenario: `setup` prepares the data for `count` operations, `operation(index)`
+    returns the callable timed for operation `index`.
+    """
+
+    def __init__(self, stand_ins: standins.StandIns, args: argparse.Namespace):
+        self.stand_ins = stand_ins
+        self.args = args
+
+    def setup(self, count: int) -> None:
+        pass
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        raise NotImplementedError
+
+    def teardown(self) -> None:
+        pass
+
+
+class UploadScenario(Scenario):
+    def setup(self, count: int) -> None:
+        import upload
+        self.upload = upload
+        self.threads = set(threading.enumerate())
+        # Generate the results Document Intelligence returns up front, as the service would
+        for index in range(count):
+            self.stand_ins.document_intelligence.prepare(self.args.pages, index)
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        document = io.BytesIO(synthetic.placeholder_pdf(self.args.pages, index))
+        return lambda: self.upload.process_rfp(document, f"benchmark-upload-{index}.pdf")
+
+    def teardown(self) -> None:
+        # Let the chunking threads started by the uploads finish before the next scenario
+        for thread in set(threading.enumerate()) - self.threads:
+            if not thread.daemon:
+                thread.join()
+
+
+class ChunkingScenario(Scenario):
+    def setup(self, count: int) -> None:
+        from azure.ai.documentintelligence.models import AnalyzeResult
+        import chunking
+        self.chunking = chunking
+        self.layout = AnalyzeResult(synthetic.generate_layout(self.args.pages, self.args.seed))
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        return lambda: self.chunking.chunking(self.layout, f"benchmark-chunking-{index}.pdf")
+
+
+class ExtractionScenario(Scenario):
+    def setup(self, count: int) -> None:
+        import extraction
+        self.extraction = extraction
+        # Every operation extracts a different RFP, as extraction stores its results on the RFP
+        for index in range(count):
+            self.stand_ins.seed_rfp(f"benchmark-extraction-{index}.pdf", self.args.pages, index)
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        return lambda: self.extraction.extraction_process(f"benchmark-extraction-{index}.pdf")
+
+
+class ChatScenario(Scenario):
+    rfp_name = "benchmark-chat.pdf"
+
+    def setup(self, count: int) -> None:
+        import chat
+        self.chat = chat
+        self.sections = list(self.stand_ins.seed_rfp(self.rfp_name, self.args.pages, self.args.seed))
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        # Alternate between questions about one section and questions needing the whole RFP
+        if index % 2 == 0:
+            message = f'Summarize the requirements of "{self.sections[index // 2 % len(self.sections)]}".'
+        else:
+            message = "What are the key deliverables and deadlines of this RFP?"
+        return lambda: self.chat.run_interaction(message, self.rfp_name)
+
+
+class SearchScenario(Scenario):
+    rfp_name = "benchmark-search.pdf"
+
+    def setup(self, count: int) -> None:
+        import search
+        self.search = search
+        self.stand_ins.seed_rfp(self.rfp_name, self.args.pages, self.args.seed)
+
+    def operation(self, index: int) -> Callable[[], Any]:
+        return lambda: self.search.search(self.rfp_name, f"Candidates with public sector experience {index}")
+
+
+SCENARIO_CLASSES = {
+    "upload": UploadScenario,
+    "chunking": ChunkingScenario,
+    "extraction": ExtractionScenario,
+    "chat": ChatScenario,
+    "search": SearchScenario,
+}
+
+
+def run_scenario(name: str, stand_ins: standins.StandIns, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run one scenario: the warm-up operations, then the measured ones, `args.concurrency` at a time.
+
+    Returns:
+        dict: Operation and error counts, throughput, latency percentiles (and time to first chunk
+        for streaming scenarios), the first errors and the stand-ins' counters.
+    """
+    scenario = SCENARIO_CLASSES[name](stand_ins, args)
+    total = args.warmup + args.iterations
+    scenario.setup(total)
+    try:
+        for index in range(args.warmup):
+            timed(scenario.operation(index))
+        stand_ins.reset()
+
+        operations = [scenario.operation(index) for index in range(args.warmup, total)]
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            samples = list(executor.map(timed, operations))
+        wall_seconds = time.perf_counter() - started_at
+    finally:
+        scenario.teardown()
+
+    succeeded = [sample for sample in samples if sample.error is None]
+    result = {
+        "operations": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(succeeded) / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency": distribution([sample.seconds for sample in succeeded]),
+    }
+    first_chunks = [sample.first_chunk_seconds for sample in succeeded if sample.first_chunk_seconds is not None]
+    if first_chunks:
+        result["first_chunk"] = distribution(first_chunks)
+    errors = [sample.error for sample in samples if sample.error is not None]
+    if errors:
+        result["error_examples"] = sorted(set(errors))[:3]
+    result["stand_ins"] = stand_ins.stats()
+    return result
+
+
+def format_report(results: Dict[str, Dict[str, Any]]) -> str:
+    """Render scenario results as a table, followed by the stand-ins' counters per scenario."""
+    header = f"{'scenario':<12}{'ops':>6}{'errors':>8}{'ops/s':>9}" + "".join(f"{f'p{q} ms':>10}" for q in PERCENTILES)
+    header += f"{'max ms':>10}{'first p50':>11}{'first p95':>11}"
+    lines = [header, "-" * len(header)]
+    for name, result in results.items():
+        latency = result["latency"]
+        first_chunk = result.get("first_chunk")
+        line = f"{name:<12}{result['operations']:>6}{result['errors']:>8}{result['throughput_per_second']:>9.2f}"
+        line += "".join(f"{latency[f'p{q}_ms']:>10.1f}" for q in PERCENTILES) + f"{latency['max_ms']:>10.1f}"
+        line += f"{first_chunk['p50_ms']:>11.1f}{first_chunk['p95_ms']:>11.1f}" if first_chunk else f"{'-':>11}{'-':>11}"
+        lines.append(line)
+
+    lines.append("")
+    for name, result in results.items():
+        counters = ", ".join(f"{key}={value:,.0f}" if float(value).is_integer() else f"{key}={value:,.1f}"
+                             for key, value in result["stand_ins"].items())
+        lines.append(f"{name}: {counters}")
+        for error in result.get("error_examples", []):
+            lines.append(f"  error: {error[:200]}")
+    return "\n".join(lines)
+
+
+def config_from_args(args: argparse.Namespace) -> standins.StandInConfig:
+    return standins.StandInConfig(
+        latency_scale=args.latency_scale,
+        seed=args.seed,
+        llm_first_token_seconds=args.llm_first_token,
+        llm_tokens_per_second=args.llm_tokens_per_second,
+        llm_throttle_rate=args.llm_throttle_rate,
+        llm_tpm=args.llm_tpm,
+        cosmos_ru_per_second=args.cosmos_ru_per_second,
+        di_seconds_per_page=args.di_seconds_per_page,
+    )
+
+
+def add_stand_in_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of the stand-ins, shared with the load test."""
+    defaults = standins.StandInConfig()
+    parser.add_argument("--latency-scale", type=float, default=defaults.latency_scale,
+                        help="Multiplier for every stand-in latency; 0 measures backend processing only")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed of the synthetic data")
+    parser.add_argument("--llm-first-token", type=float, default=defaults.llm_first_token_seconds,
+                        help="Seconds until an LLM response starts")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=defaults.llm_tokens_per_second,
+                        help="LLM generation speed")
+    parser.add_argument("--llm-throttle-rate", type=float, default=defaults.llm_throttle_rate,
+                        help="Fraction of LLM requests answered with 429")
+    parser.add_argument("--llm-tpm", type=int, default=defaults.llm_tpm,
+                        help="Tokens-per-minute limit of the stand-in deployment, enforced by the router")
+    parser.add_argument("--cosmos-ru-per-second", type=float, default=defaults.cosmos_ru_per_second,
+                        help="Provisioned Cosmos DB throughput; 0 for unlimited")
+    parser.add_argument("--di-seconds-per-page", type=float, default=defaults.di_seconds_per_page,
+                        help="Document Intelligence analysis time per page")
+
+
+@contextlib.contextmanager
+def quiet(verbose: bool):
+    """Silence the backend's progress prints, logs and warnings unless verbose."""
+    if verbose:
+        yield
+        return
+    logging.disable(logging.INFO)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+    logging.disable(logging.NOTSET)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backend against local stand-ins for its upstream services.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--iterations", type=int, default=20, help="Measured operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Operations run at the same time")
+    parser.add_argument("--warmup", type=int, default=2, help="Operations run before measuring")
+    parser.add_argument("--pages", type=int, default=40, help="Pages of the synthetic RFPs")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the backend's output")
+    add_stand_in_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIO_CLASSES]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    stand_ins = standins.install(config_from_args(args))
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        with quiet(args.verbose):
+            results[name] = run_scenario(name, stand_ins, args)
+
+    print(format_report(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"arguments": vars(args), "scenarios": results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
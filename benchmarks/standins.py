@@ -0,0 +1,1288 @@
+"""
+Local stand-ins for every upstream service the backend calls, for benchmarks and load tests.
+
+The stand-ins replace the network, not the code: the backend modules run unchanged with their real
+clients, and only the bottom layer is swapped so no request leaves the process:
+
+    Azure OpenAI           the real LangChain/OpenAI clients (built by the LLM router's own
+                           `build_azure_client`) over an `httpx.MockTransport`; chat completions
+                           wait a configurable time to first token, then stream at a configurable
+                           token rate, and answer every prompt in `prompts.py` with output of the
+                           shape its caller parses (JSON section verdicts, requirements, search
+                           queries, tool calls, ...). Embeddings return deterministic vectors.
+    Cosmos DB              an in-memory container behind the real CosmosDBManager and
+                           AsyncCosmosDBManager. It evaluates the SQL the backend issues, charges
+                           request units per operation (see the RU model below), can enforce a
+                           provisioned RU/s budget with 429s and retries, and reports every request
+                           to the managers' metrics and RU accounting hooks like the SDK does.
+    Blob Storage           the real BlobServiceClient over an in-memory azure-core transport
+                           (Put Blob, Put Block, Put Block List, Get Blob with ranges, Get
+                           Properties, List Blobs), with per-request latency and a bandwidth limit.
+    AI Search              the real SearchClient over an in-memory transport serving synthetic
+                           resume and knowledge base documents.
+    Document Intelligence  the real DocumentIntelligenceClient over an in-memory transport. Layout
+                           analysis of an uploaded blob runs as a long-running operation taking a
+                           configurable time per page, and returns a synthetic `AnalyzeResult` with
+                           as many pages as the uploaded placeholder PDF declares (synthetic.py).
+
+Import this module before any backend module: it points every service setting at the stand-ins,
+whatever the local .env contains, so a benchmark can never reach a real Azure resource. Tuning
+settings (worker counts, batch sizes, cache sizes, ...) are left to the environment so their
+effect can be measured. Then call `install(StandInConfig(...))`.
+
+The RU model is an approximation meant for comparing query shapes and code changes, not for
+predicting a bill: point reads cost 1 RU per KB, writes 5.5 RU per KB, and query pages 2.8 RU plus
+0.02 RU per document scanned and 0.4 RU per KB returned. Cross-partition queries fan out to every
+physical partition.
+"""
+
+import asyncio
+import base64
+import email.utils
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# Service settings always point at the stand-ins
+SERVICE_ENVIRONMENT = {
+    "AZURE_OPENAI_ENDPOINT": "https://standin.openai.azure.com/",
+    "AZURE_OPENAI_API_KEY": "standin",
+    "AZURE_OPENAI_KEY": "standin",
+    "AZURE_OPENAI_DEPLOYMENT_NAME": "standin-gpt-4o",
+    "AZURE_OPENAI_DEPLOYMENTS": "",
+    "AZURE_SEARCH_ENDPOINT": "https://standin.search.windows.net",
+    "AZURE_SEARCH_KEY": "standin",
+    "AZURE_SEARCH_INDEX_RESUMES": "resumes",
+    "AZURE_SEARCH_INDEX_KB": "knowledge",
+    "FORM_RECOGNIZER_ENDPOINT": "https://standin.cognitiveservices.azure.com/",
+    "FORM_RECOGNIZER_KEY": "standin",
+    "COSMOS_HOST": "https://standin.documents.azure.com:443/",
+    "COSMOS_MASTER_KEY": base64.b64encode(b"standin").decode(),
+    "COSMOS_DATABASE_ID": "rfp",
+    "COSMOS_CONTAINER_ID": "rfp",
+    "STORAGE_ACCOUNT_NAME": "standin",
+    "STORAGE_ACCOUNT_KEY": base64.b64encode(b"standin").decode(),
+    "STORAGE_ACCOUNT_CONTAINER_RFP": "rfp",
+    "STORAGE_ACCOUNT_RESUME_CONTAINER": "resumes",
+    "BING_SEARCH_ENABLED": "false",
+    "BING_SEARCH_KEY": "",
+}
+# Defaults that keep runs comparable; set them explicitly to benchmark other values
+DEFAULT_ENVIRONMENT = {
+    "EMBEDDING_CACHE_DIR": "",
+    "BLOB_CACHE_DIR": "",
+    "TRACING_EXPORTER": "none",
+    "KNOWLEDGE_BASE_SEARCH_ENABLED": "true",
+}
+os.environ.update(SERVICE_ENVIRONMENT)
+for name, value in DEFAULT_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+# Make the backend modules importable from the benchmarks
+sys.path.append(BACKEND_DIR)
+
+import httpx
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline import PipelineContext, PipelineRequest, PipelineResponse
+from azure.core.pipeline.transport import HttpRequest, HttpResponse, HttpTransport
+from azure.core.utils import CaseInsensitiveDict
+from azure.cosmos import exceptions as cosmos_exceptions
+
+import synthetic
+from common.metrics import BLOB, COSMOS, DOCUMENT_INTELLIGENCE, SEARCH, upstream_hooks
+
+CHARS_PER_TOKEN = 4
+
+READ_RU_PER_KB = 1.0
+WRITE_RU_PER_KB = 5.5
+QUERY_PAGE_RU = 2.8
+QUERY_RU_PER_SCANNED_DOCUMENT = 0.02
+QUERY_RU_PER_KB = 0.4
+# The Cosmos SDK retries throttled requests up to 9 times by default
+COSMOS_THROTTLE_RETRIES = 9
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+class StandInConfig:
+    """
+    Latencies, rates and sizes of the stand-ins.
+
+    Every latency is multiplied by `latency_scale`; 0 removes all waits, which leaves only the
+    backend's own CPU time (useful for profiling).
+    """
+
+    def __init__(self, latency_scale: float = 1.0, seed: int = 0,
+                 llm_first_token_seconds: float = 0.4, llm_tokens_per_second: float = 80.0,
+                 llm_completion_tokens: int = 300, llm_throttle_rate: float = 0.0,
+                 llm_retry_after_seconds: float = 1.0, llm_tpm: Optional[int] = None,
+                 llm_rpm: Optional[int] = None, embedding_seconds: float = 0.05,
+                 embedding_dimensions: int = 1536, cosmos_seconds: float = 0.006,
+                 cosmos_ru_per_second: float = 0.0, cosmos_physical_partitions: int = 4,
+                 cosmos_page_size: int = 100, blob_seconds: float = 0.02,
+                 blob_megabytes_per_second: float = 60.0, search_seconds: float = 0.08,
+                 search_documents: int = 500, di_seconds_per_page: float = 0.1,
+                 di_poll_seconds: float = 0.25):
+        self.latency_scale = latency_scale
+        self.seed = seed
+        self.llm_first_token_seconds = llm_first_token_seconds
+        self.llm_tokens_per_second = llm_tokens_per_second
+        self.llm_completion_tokens = llm_completion_tokens
+        self.llm_throttle_rate = llm_throttle_rate
+        self.llm_retry_after_seconds = llm_retry_after_seconds
+        self.llm_tpm = llm_tpm
+        self.llm_rpm = llm_rpm
+        self.embedding_seconds = embedding_seconds
+        self.embedding_dimensions = embedding_dimensions
+        self.cosmos_seconds = cosmos_seconds
+        self.cosmos_ru_per_second = cosmos_ru_per_second
+        self.cosmos_physical_partitions = max(1, cosmos_physical_partitions)
+        self.cosmos_page_size = max(1, cosmos_page_size)
+        self.blob_seconds = blob_seconds
+        self.blob_megabytes_per_second = blob_megabytes_per_second
+        self.search_seconds = search_seconds
+        self.search_documents = search_documents
+        self.di_seconds_per_page = di_seconds_per_page
+        self.di_poll_seconds = di_poll_seconds
+
+    def scaled(self, seconds: float) -> float:
+        return max(0.0, seconds * self.latency_scale)
+
+
+class Counters:
+    """Thread-safe totals of what the stand-ins served."""
+
+    def __init__(self):
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self._values.items()))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+def http_date(timestamp: Optional[float] = None) -> str:
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def new_etag() -> str:
+    return f'"0x{uuid.uuid4().hex[:15].upper()}"'
+
+
+# ---------------------------------------------------------------------------------------------
+# Azure OpenAI
+# ---------------------------------------------------------------------------------------------
+
+class LLMStandIn:
+    """
+    Chat completions and embeddings served to the real OpenAI clients through `httpx.MockTransport`.
+
+    Responses are chosen by the system prompt, so each caller receives output it can parse.
+    """
+
+    def __init__(self, config: StandInConfig, counters: Counters):
+        self.config = config
+        self.counters = counters
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self.http_client = httpx.Client(transport=httpx.MockTransport(self.handle))
+        self.http_async_client = httpx.AsyncClient(transport=httpx.MockTransport(self.ahandle))
+
+        import prompts
+        # (system prompt, responder) pairs; a system message starting with the prompt selects it
+        self.responders: List[Tuple[str, Callable[[str], Any]]] = [
+            (prompts.toc_prompt, self.table_of_contents),
+            (prompts.section_validator_prompt_with_toc, self.section_verdict),
+            (prompts.section_validator_prompt, self.section_verdict),
+            (prompts.content_parsing_prompt, self.parsed_content),
+            (prompts.overview_prompt, self.overview),
+            (prompts.query_prompt, self.search_query),
+            (prompts.explanation_prompt, self.explanation),
+            (prompts.bing_search_query_rewrite_prompt, lambda text: synthetic.filler_text(12, text)),
+        ]
+
+    def client_factory(self, deployment: Any, json_mode: bool) -> Any:
+        """`LLMRouter` client factory: the production client, sending its requests to the stand-in."""
+        from common.llm_router import build_azure_client
+        return build_azure_client(deployment, json_mode, http_client=self.http_client,
+                                  http_async_client=self.http_async_client)
+
+    def embeddings_client(self) -> Any:
+        """An `AzureOpenAI` client for the embedding service, sending its requests to the stand-in."""
+        from openai import AzureOpenAI
+        return AzureOpenAI(azure_endpoint=SERVICE_ENVIRONMENT["AZURE_OPENAI_ENDPOINT"],
+                           api_key=SERVICE_ENVIRONMENT["AZURE_OPENAI_API_KEY"], api_version="2024-02-01",
+                           http_client=self.http_client)
+
+    # Request handling
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        if request.url.path.endswith("/embeddings"):
+            time.sleep(self.config.scaled(self.config.embedding_seconds))
+            return self.embeddings(body)
+        throttled = self.throttle()
+        if throttled is not None:
+            return throttled
+        completion, prompt_tokens = self.complete(body)
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                                  content=self.stream_events(completion, body, time.sleep))
+        time.sleep(self.generation_seconds(completion))
+        return self.completion_response(completion, prompt_tokens, body)
+
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        if request.url.path.endswith("/embeddings"):
+            await asyncio.sleep(self.config.scaled(self.config.embedding_seconds))
+            return self.embeddings(body)
+        throttled = self.throttle()
+        if throttled is not None:
+            return throttled
+        completion, prompt_tokens = self.complete(body)
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                                  content=self.astream_events(completion, body))
+        await asyncio.sleep(self.generation_seconds(completion))
+        return self.completion_response(completion, prompt_tokens, body)
+
+    def throttle(self) -> Optional[httpx.Response]:
+        if self.config.llm_throttle_rate <= 0:
+            return None
+        with self._rng_lock:
+            throttled = self._rng.random() < self.config.llm_throttle_rate
+        if not throttled:
+            return None
+        self.counters.add("llm.throttled")
+        retry_after_ms = int(1000 * self.config.scaled(self.config.llm_retry_after_seconds))
+        return httpx.Response(429, headers={"retry-after-ms": str(retry_after_ms)},
+                              json={"error": {"code": "429", "message": "Rate limit is exceeded."}})
+
+    def generation_seconds(self, completion: Dict[str, Any]) -> float:
+        tokens = completion_tokens(completion)
+        return self.config.scaled(self.config.llm_first_token_seconds + tokens / self.config.llm_tokens_per_second)
+
+    def complete(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """Choose the completion for a request; returns (message, prompt tokens)."""
+        messages = body.get("messages") or []
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // CHARS_PER_TOKEN
+        system = next((str(m.get("content") or "") for m in messages if m.get("role") == "system"), "")
+        user = next((str(m.get("content") or "") for m in reversed(messages) if m.get("role") == "user"), "")
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+
+        if body.get("tools"):
+            completion = self.tool_call(body["tools"], user)
+        else:
+            responder = next((respond for prompt, respond in self.responders if system.startswith(prompt.strip()[:200])), None)
+            if responder is not None:
+                content = responder(user)
+            elif json_mode:
+                content = {"answer": synthetic.filler_text(40, user)}
+            else:
+                content = synthetic.filler_text(self.config.llm_completion_tokens, user)
+            completion = {"role": "assistant", "content": content if isinstance(content, str) else json.dumps(content)}
+
+        self.counters.add("llm.requests")
+        self.counters.add("llm.prompt_tokens", prompt_tokens)
+        self.counters.add("llm.completion_tokens", completion_tokens(completion))
+        return completion, prompt_tokens
+
+    def completion_response(self, completion: Dict[str, Any], prompt_tokens: int, body: Dict[str, Any]) -> httpx.Response:
+        output_tokens = completion_tokens(completion)
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": completion,
+                "finish_reason": "tool_calls" if completion.get("tool_calls") else "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens,
+                      "total_tokens": prompt_tokens + output_tokens},
+        })
+
+    def stream_chunks(self, completion: Dict[str, Any], body: Dict[str, Any]) -> Iterator[Tuple[float, bytes]]:
+        """(delay, server-sent event) pairs of a streamed completion: one token per event."""
+        header = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                  "created": int(time.time()), "model": body.get("model") or "gpt-4o"}
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            chunk = {**header, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        self.counters.add("llm.streams")
+        first = self.config.scaled(self.config.llm_first_token_seconds)
+        per_token = self.config.scaled(1 / self.config.llm_tokens_per_second)
+        if completion.get("tool_calls"):
+            calls = [{"index": index, **call} for index, call in enumerate(completion["tool_calls"])]
+            yield first, event({"role": "assistant", "tool_calls": calls})
+            yield 0.0, event({}, "tool_calls")
+        else:
+            tokens = re.findall(r"\S+\s*", completion["content"]) or [""]
+            yield first, event({"role": "assistant", "content": ""})
+            for token in tokens:
+                yield per_token, event({"content": token})
+            yield 0.0, event({}, "stop")
+        yield 0.0, b"data: [DONE]\n\n"
+
+    def stream_events(self, completion: Dict[str, Any], body: Dict[str, Any], sleep: Callable[[float], None]) -> Iterator[bytes]:
+        for delay, data in self.stream_chunks(completion, body):
+            if delay:
+                sleep(delay)
+            yield data
+
+    async def astream_events(self, completion: Dict[str, Any], body: Dict[str, Any]):
+        for delay, data in self.stream_chunks(completion, body):
+            if delay:
+                await asyncio.sleep(delay)
+            yield data
+
+    def embeddings(self, body: Dict[str, Any]) -> httpx.Response:
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.counters.add("embeddings.requests")
+        self.counters.add("embeddings.inputs", len(inputs))
+        data = [{"object": "embedding", "index": index, "embedding": self.vector(str(text))}
+                for index, text in enumerate(inputs)]
+        tokens = sum(len(str(text)) for text in inputs) // CHARS_PER_TOKEN
+        return httpx.Response(200, json={"object": "list", "data": data, "model": body.get("model"),
+                                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def vector(self, text: str) -> List[float]:
+        rng = random.Random(synthetic.seed_of("embedding", text))
+        return [round(rng.uniform(-0.05, 0.05), 6) for _ in range(self.config.embedding_dimensions)]
+
+    # Responders
+
+    def tool_call(self, tools: List[Dict[str, Any]], user: str) -> Dict[str, Any]:
+        """Call `get_sections` for a quoted section name in the question, `get_full_rfp` otherwise."""
+        names = [tool.get("function", tool).get("name") for tool in tools]
+        quoted = re.search(r"\"([^\"]+)\"", user)
+        if quoted and "get_sections" in names:
+            name, arguments = "get_sections", {"sections": quoted.group(1)}
+        else:
+            name, arguments = ("get_full_rfp" if "get_full_rfp" in names else names[0]), {}
+        call = {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)}}
+        return {"role": "assistant", "content": None, "tool_calls": [call]}
+
+    def table_of_contents(self, text: str) -> str:
+        headings = [line for line in text.splitlines() if synthetic.is_valid_heading(line)]
+        return "\n".join(f"{heading} ..... {index + 1}" for index, heading in enumerate(headings)) or "No table of contents found."
+
+    def section_verdict(self, text: str) -> Dict[str, str]:
+        section = text.rsplit("Section to validate:", 1)[-1].strip()
+        valid = synthetic.is_valid_heading(section)
+        return {
+            "thought_process": f"The heading '{section}' {'matches' if valid else 'does not match'} the table of contents.",
+            "answer": "yes" if valid else "no",
+        }
+
+    def parsed_content(self, text: str) -> Dict[str, Any]:
+        """Requirements as the content parser returns them: one entry per requirement sentence."""
+        output: List[Dict[str, Any]] = []
+        pending: List[Dict[str, Any]] = []
+        page = ""
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("Page Number:"):
+                page = line[len("Page Number:"):].strip()
+                for entry in pending:
+                    entry["page_number"] = page
+                pending = []
+                continue
+            sentences = re.split(r"(?<=\.)\s+", line)
+            requirements = [s for s in sentences if re.search(r"\b(shall|must|required)\b", s)]
+            informative = " ".join(s for s in sentences if s not in requirements)
+            entries = [(sentence, "yes") for sentence in requirements] + ([(informative, "no")] if informative else [])
+            for content, is_requirement in entries:
+                entry = {"section_name": f"Part {len(output) // 5 + 1}", "page_number": page,
+                         "section_number": "", "content": content, "is_requirement": is_requirement}
+                output.append(entry)
+                pending.append(entry)
+        return {"analysis": f"Found {len(output)} pieces of content.", "output": output}
+
+    def overview(self, text: str) -> str:
+        items = max(1, self.config.llm_completion_tokens // 40)
+        lines = ["## Analysis", "", "### Most Important Skills and Experience"]
+        for index in range(items):
+            lines.append(f"{index + 1}. **{synthetic.filler_text(3, (text[:200], index, 'title'))}**: "
+                         f"{synthetic.filler_text(34, (text[:200], index))}")
+        return "\n".join(lines)
+
+    def search_query(self, text: str) -> Dict[str, str]:
+        return {"search_query": synthetic.filler_text(16, text), "filter": ""}
+
+    def explanation(self, text: str) -> Dict[str, Any]:
+        rng = random.Random(synthetic.seed_of("explanation", text))
+        return {"explanation": synthetic.filler_text(70, text), "relevant_projects": rng.randint(0, 6)}
+
+
+def completion_tokens(completion: Dict[str, Any]) -> int:
+    if completion.get("tool_calls"):
+        return sum(len(call["function"]["arguments"]) + 8 for call in completion["tool_calls"]) // CHARS_PER_TOKEN
+    return max(1, len(completion.get("content") or "") // CHARS_PER_TOKEN)
+
+
+# ---------------------------------------------------------------------------------------------
+# Azure SDK transports
+# ---------------------------------------------------------------------------------------------
+
+class StandInResponse(HttpResponse):
+    """An azure-core transport response with an in-memory body."""
+
+    def __init__(self, request: Any, status_code: int, headers: Optional[Dict[str, str]] = None,
+                 body: bytes = b"", reason: str = "OK"):
+        super().__init__(request, None)
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.headers.setdefault("Content-Length", str(len(body)))
+        self.reason = reason
+        self.content_type = self.headers.get("Content-Type")
+        self._body = body
+
+    def body(self) -> bytes:
+        return self._body
+
+    def json(self) -> Any:
+        return json.loads(self._body)
+
+    def stream_download(self, pipeline: Any, **kwargs) -> "BodyStream":
+        return BodyStream(self)
+
+
+class BodyStream:
+    """The streamed body of a `StandInResponse`, as the SDKs' streaming downloads consume it."""
+
+    def __init__(self, response: StandInResponse, block_size: int = 4 * 1024 * 1024):
+        self.response = response
+        self.content_length = len(response.body())
+        self._chunks = iter([response.body()[i:i + block_size] for i in range(0, self.content_length, block_size)])
+
+    def __len__(self) -> int:
+        return self.content_length
+
+    def __iter__(self) -> "BodyStream":
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def json_response(request: Any, status_code: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> StandInResponse:
+    return StandInResponse(request, status_code, {"Content-Type": "application/json; charset=utf-8", **(headers or {})},
+                           json.dumps(payload).encode("utf-8"))
+
+
+def request_body(request: Any) -> bytes:
+    """The body of an SDK request, whatever form the SDK gave it."""
+    data = getattr(request, "data", None)
+    if data is None:
+        data = getattr(request, "content", None)
+    if data is None:
+        return b""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    if hasattr(data, "read"):
+        return data.read()
+    return b"".join(data)
+
+
+class StandInTransport(HttpTransport):
+    """Base class of the in-memory transports: `send` delegates to `handle` without any I/O."""
+
+    service = ""
+
+    def __init__(self, config: StandInConfig, counters: Counters):
+        self.config = config
+        self.counters = counters
+
+    def __enter__(self) -> "StandInTransport":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def send(self, request: Any, **kwargs) -> StandInResponse:
+        self.counters.add(f"{self.service}.requests")
+        return self.handle(request)
+
+    def handle(self, request: Any) -> StandInResponse:
+        raise NotImplementedError
+
+
+class BlobStandIn(StandInTransport):
+    """Block blobs held in memory, served with the Blob service REST API."""
+
+    service = "blob"
+
+    def __init__(self, config: StandInConfig, counters: Counters):
+        super().__init__(config, counters)
+        self.blobs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.blocks: Dict[Tuple[str, str], Dict[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, container: str, name: str) -> Optional[bytes]:
+        with self._lock:
+            blob = self.blobs.get((container, name))
+        return blob["data"] if blob else None
+
+    def get_url(self, url: str) -> Optional[bytes]:
+        container, name = blob_path(url)
+        return self.get(container, name) if name else None
+
+    def wait(self, size: int) -> None:
+        bandwidth = self.config.blob_megabytes_per_second * 1024 * 1024
+        time.sleep(self.config.scaled(self.config.blob_seconds + (size / bandwidth if bandwidth > 0 else 0)))
+
+    def handle(self, request: Any) -> StandInResponse:
+        url = urlparse(request.url)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        container, name = blob_path(request.url)
+        body = request_body(request)
+        self.wait(len(body))
+        self.counters.add("blob.bytes_in", len(body))
+        comp = query.get("comp")
+
+        if request.method == "PUT" and query.get("restype") == "container":
+            return StandInResponse(request, 201, {"ETag": new_etag(), "Last-Modified": http_date()})
+        if request.method == "GET" and query.get("restype") == "container" and comp == "list":
+            return self.list_blobs(request, container, query.get("prefix", ""))
+        if request.method == "PUT" and comp == "block":
+            with self._lock:
+                self.blocks.setdefault((container, name), {})[query["blockid"]] = body
+            return StandInResponse(request, 201, {"Content-MD5": base64.b64encode(hashlib.md5(body).digest()).decode()})
+        if request.method == "PUT" and comp == "blocklist":
+            block_ids = [element.text for element in ElementTree.fromstring(body)]
+            with self._lock:
+                staged = self.blocks.pop((container, name), {})
+                missing = [block_id for block_id in block_ids if block_id not in staged]
+                if missing:
+                    return self.error(request, 400, "InvalidBlockList", "The specified block list is invalid.")
+                data = b"".join(staged[block_id] for block_id in block_ids)
+            return self.store(request, container, name, data)
+        if request.method == "PUT" and comp is None:
+            return self.store(request, container, name, body)
+        if request.method in ("GET", "HEAD") and comp is None:
+            return self.download(request, container, name)
+        if request.method == "DELETE" and comp is None:
+            with self._lock:
+                blob = self.blobs.pop((container, name), None)
+            if blob is None:
+                return self.error(request, 404, "BlobNotFound", "The specified blob does not exist.")
+            return StandInResponse(request, 202)
+        return self.error(request, 400, "UnsupportedOperation", f"{request.method} {request.url} is not supported by the stand-in.")
+
+    def store(self, request: Any, container: str, name: str, data: bytes) -> StandInResponse:
+        metadata = {key[len("x-ms-meta-"):]: value for key, value in request.headers.items() if key.lower().startswith("x-ms-meta-")}
+        blob = {
+            "data": data,
+            "etag": new_etag(),
+            "last_modified": http_date(),
+            "content_type": request.headers.get("x-ms-blob-content-type", "application/octet-stream"),
+            "content_md5": request.headers.get("x-ms-blob-content-md5"),
+            "metadata": metadata,
+        }
+        with self._lock:
+            self.blobs[(container, name)] = blob
+        return StandInResponse(request, 201, {"ETag": blob["etag"], "Last-Modified": blob["last_modified"],
+                                              "x-ms-request-server-encrypted": "true"})
+
+    def download(self, request: Any, container: str, name: str) -> StandInResponse:
+        with self._lock:
+            blob = self.blobs.get((container, name))
+        if blob is None:
+            return self.error(request, 404, "BlobNotFound", "The specified blob does not exist.")
+        if_match = request.headers.get("If-Match")
+        if if_match and if_match not in ("*", blob["etag"]):
+            return self.error(request, 412, "ConditionNotMet", "The condition specified using HTTP conditional header(s) is not met.")
+
+        data = blob["data"]
+        headers = {
+            "Content-Type": blob["content_type"],
+            "ETag": blob["etag"],
+            "Last-Modified": blob["last_modified"],
+            "Accept-Ranges": "bytes",
+            "x-ms-blob-type": "BlockBlob",
+            **{f"x-ms-meta-{key}": value for key, value in blob["metadata"].items()},
+        }
+        if blob["content_md5"]:
+            headers["Content-MD5"] = blob["content_md5"]
+        if request.method == "HEAD":
+            return StandInResponse(request, 200, {**headers, "Content-Length": str(len(data))})
+
+        status = 200
+        byte_range = re.match(r"bytes=(\d+)-(\d*)", request.headers.get("x-ms-range") or request.headers.get("Range") or "")
+        if byte_range:
+            start = int(byte_range.group(1))
+            end = min(int(byte_range.group(2)) if byte_range.group(2) else len(data) - 1, len(data) - 1)
+            if start >= len(data) and data:
+                return self.error(request, 416, "InvalidRange", "The range specified is invalid for the current size of the resource.")
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+            status = 206
+        self.wait(len(data))
+        self.counters.add("blob.bytes_out", len(data))
+        return StandInResponse(request, status, headers, data)
+
+    def list_blobs(self, request: Any, container: str, prefix: str) -> StandInResponse:
+        with self._lock:
+            entries = sorted((name, blob) for (blob_container, name), blob in self.blobs.items()
+                             if blob_container == container and name.startswith(prefix))
+        blobs = "".join(
+            f"<Blob><Name>{escape(name)}</Name><Properties><Last-Modified>{blob['last_modified']}</Last-Modified>"
+            f"<Etag>{escape(blob['etag'])}</Etag><Content-Length>{len(blob['data'])}</Content-Length>"
+            f"<Content-Type>{escape(blob['content_type'])}</Content-Type><BlobType>BlockBlob</BlobType></Properties></Blob>"
+            for name, blob in entries
+        )
+        body = (f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ServiceEndpoint="{escape(request.url)}" '
+                f'ContainerName="{escape(container)}"><Prefix>{escape(prefix)}</Prefix><Blobs>{blobs}</Blobs>'
+                f'<NextMarker /></EnumerationResults>')
+        return StandInResponse(request, 200, {"Content-Type": "application/xml"}, body.encode("utf-8"))
+
+    def error(self, request: Any, status: int, code: str, message: str) -> StandInResponse:
+        body = f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+        return StandInResponse(request, status, {"Content-Type": "application/xml", "x-ms-error-code": code},
+                               body.encode("utf-8"), reason=code)
+
+
+def blob_path(url: str) -> Tuple[str, str]:
+    """(container, blob name) of a blob or container URL."""
+    parts = unquote(urlparse(url).path).lstrip("/").split("/", 1)
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+class SearchStandIn(StandInTransport):
+    """AI Search queries over synthetic resume and knowledge base documents."""
+
+    service = "search"
+
+    def __init__(self, config: StandInConfig, counters: Counters):
+        super().__init__(config, counters)
+        self.indexes = {
+            SERVICE_ENVIRONMENT["AZURE_SEARCH_INDEX_RESUMES"]: synthetic.resume_documents(config.search_documents, config.seed),
+            SERVICE_ENVIRONMENT["AZURE_SEARCH_INDEX_KB"]: synthetic.knowledge_documents(config.search_documents, config.seed),
+        }
+
+    def handle(self, request: Any) -> StandInResponse:
+        time.sleep(self.config.scaled(self.config.search_seconds))
+        index = re.search(r"/indexes\('([^']+)'\)|/indexes/([^/]+)/", request.url)
+        documents = self.indexes.get((index.group(1) or index.group(2)) if index else "")
+        if documents is None or not request.url.split("?")[0].endswith("search.post.search"):
+            return json_response(request, 404, {"error": {"code": "", "message": f"{request.url} is not served by the stand-in."}})
+
+        query = json.loads(request_body(request) or b"{}")
+        top = int(query.get("top") or 50)
+        rng = random.Random(synthetic.seed_of("search", query.get("search"), json.dumps(query.get("vectorQueries"))[:64]))
+        hits = rng.sample(documents, min(top, len(documents)))
+        select = [field.strip() for field in (query.get("select") or "").split(",") if field.strip()]
+        results = []
+        for rank, document in enumerate(hits):
+            fields = {key: value for key, value in document.items() if not select or key in select}
+            results.append({"@search.score": round(1.0 / (rank + 1), 4), **fields})
+        self.counters.add("search.queries")
+        return json_response(request, 200, {"value": results})
+
+
+class DocumentIntelligenceStandIn(StandInTransport):
+    """Layout analysis of blobs in the Blob stand-in, as a long-running operation."""
+
+    service = "document_intelligence"
+
+    def __init__(self, config: StandInConfig, counters: Counters, blob: BlobStandIn):
+        super().__init__(config, counters)
+        self.blob = blob
+        self.operations: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[Tuple[int, int], bytes] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, pages: int, seed: int) -> bytes:
+        """Generate (once) the serialized result for a document, so it is not built while serving."""
+        key = (pages, seed)
+        with self._lock:
+            result = self._results.get(key)
+        if result is None:
+            result = json.dumps(synthetic.generate_layout(pages, seed)).encode("utf-8")
+            with self._lock:
+                self._results[key] = result
+        return result
+
+    def handle(self, request: Any) -> StandInResponse:
+        url = urlparse(request.url)
+        if request.method == "POST" and url.path.endswith(":analyze"):
+            return self.analyze(request)
+        operation_id = url.path.rsplit("/", 1)[-1]
+        if request.method == "GET" and "/analyzeResults/" in url.path:
+            return self.poll(request, operation_id)
+        return json_response(request, 404, {"error": {"code": "NotFound", "message": "Resource not found."}})
+
+    def analyze(self, request: Any) -> StandInResponse:
+        time.sleep(self.config.scaled(self.config.blob_seconds))
+        source = json.loads(request_body(request) or b"{}")
+        if source.get("base64Source"):
+            data = base64.b64decode(source["base64Source"])
+        else:
+            data = self.blob.get_url(source.get("urlSource", ""))
+        if data is None:
+            return json_response(request, 400, {"error": {
+                "code": "InvalidRequest", "message": "Invalid request.",
+                "innererror": {"code": "InvalidContent", "message": "Could not download the file from the given URL."}}})
+
+        document = synthetic.parse_placeholder_pdf(data) or {"pages": max(1, len(data) // 50_000), "seed": 0}
+        operation_id = uuid.uuid4().hex
+        with self._lock:
+            self.operations[operation_id] = {
+                **document,
+                "created": time.time(),
+                "ready_at": time.monotonic() + self.config.scaled(self.config.di_seconds_per_page * document["pages"]),
+            }
+        self.counters.add("document_intelligence.analyses")
+        self.counters.add("document_intelligence.pages", document["pages"])
+        location = request.url.split("?")[0].replace(":analyze", f"/analyzeResults/{operation_id}")
+        return StandInResponse(request, 202, {"Operation-Location": f"{location}?{urlparse(request.url).query}",
+                                              "apim-request-id": operation_id, **self.retry_after()})
+
+    def poll(self, request: Any, operation_id: str) -> StandInResponse:
+        with self._lock:
+            operation = self.operations.get(operation_id)
+        if operation is None:
+            return json_response(request, 404, {"error": {"code": "NotFound", "message": "Resource not found."}})
+        created = email.utils.formatdate(operation["created"], usegmt=True)
+        status = {"createdDateTime": created, "lastUpdatedDateTime": http_date()}
+        if time.monotonic() < operation["ready_at"]:
+            return json_response(request, 200, {"status": "running", **status}, self.retry_after())
+
+        with self._lock:
+            self.operations.pop(operation_id, None)
+        result = self.prepare(operation["pages"], operation["seed"])
+        envelope = json.dumps({"status": "succeeded", **status}).encode("utf-8")
+        body = envelope[:-1] + b', "analyzeResult": ' + result + b"}"
+        return StandInResponse(request, 200, {"Content-Type": "application/json; charset=utf-8"}, body)
+
+    def retry_after(self) -> Dict[str, str]:
+        # Zero would make the poller fall back to its own interval
+        return {"retry-after-ms": str(max(1, int(1000 * self.config.scaled(self.config.di_poll_seconds))))}
+
+
+# ---------------------------------------------------------------------------------------------
+# Cosmos DB
+# ---------------------------------------------------------------------------------------------
+
+UNDEFINED = object()
+
+QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<distinct>DISTINCT\s+)?(?P<value>VALUE\s+)?(?P<select>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\S+)\s+LIMIT\s+(?P<limit>\S+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+PATH = r"c(?:\.\w+)*"
+DEFINED_PATTERN = re.compile(rf"^(NOT\s+)?IS_DEFINED\(({PATH})\)$", re.IGNORECASE)
+FUNCTION_PATTERN = re.compile(rf"^(NOT\s+)?(CONTAINS|STARTSWITH|ARRAY_CONTAINS)\(({PATH}),\s*(.+?)\)$", re.IGNORECASE)
+COMPARISON_PATTERN = re.compile(rf"^({PATH})\s*(=|!=|<>|<=|>=|<|>)\s*(.+)$")
+
+
+def lookup(document: Any, path: str) -> Any:
+    value = document
+    for segment in path.split(".")[1:]:
+        if not isinstance(value, dict) or segment not in value:
+            return UNDEFINED
+        value = value[segment]
+    return value
+
+
+def operand(text: str) -> Callable[[Dict[str, Any]], Any]:
+    """A query operand (parameter or literal) as a function of the query parameters."""
+    text = text.strip()
+    if text.startswith("@"):
+        return lambda parameters: parameters.get(text, UNDEFINED)
+    if text[:1] in ("'", '"'):
+        literal = text[1:-1]
+    elif text.lower() in ("true", "false", "null"):
+        literal = {"true": True, "false": False, "null": None}[text.lower()]
+    else:
+        literal = float(text) if "." in text else int(text)
+    return lambda parameters: literal
+
+
+def compare(operator: str, left: Any, right: Any) -> bool:
+    if left is UNDEFINED or right is UNDEFINED:
+        return False
+    if operator == "=":
+        return left == right
+    if operator in ("!=", "<>"):
+        return left != right
+    try:
+        return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[operator]
+    except TypeError:
+        return False
+
+
+def predicate(text: str) -> Callable[[Dict[str, Any], Dict[str, Any]], bool]:
+    text = text.strip()
+    match = DEFINED_PATTERN.match(text)
+    if match:
+        negate, path = bool(match.group(1)), match.group(2)
+        return lambda document, parameters: (lookup(document, path) is not UNDEFINED) != negate
+    match = FUNCTION_PATTERN.match(text)
+    if match:
+        negate, function, path, argument = bool(match.group(1)), match.group(2).upper(), match.group(3), operand(match.group(4))
+
+        def call(document: Dict[str, Any], parameters: Dict[str, Any]) -> bool:
+            value, needle = lookup(document, path), argument(parameters)
+            if function == "CONTAINS":
+                result = isinstance(value, str) and isinstance(needle, str) and needle in value
+            elif function == "STARTSWITH":
+                result = isinstance(value, str) and isinstance(needle, str) and value.startswith(needle)
+            else:
+                result = isinstance(value, list) and needle in value
+            return result != negate
+        return call
+    match = COMPARISON_PATTERN.match(text)
+    if match:
+        path, operator, right = match.group(1), match.group(2), operand(match.group(3))
+        return lambda document, parameters: compare(operator, lookup(document, path), right(parameters))
+    raise ValueError(f"Predicate not supported by the Cosmos DB stand-in: {text}")
+
+
+class CompiledQuery:
+    """A query of the SQL subset the backend uses, compiled for evaluation over documents."""
+
+    def __init__(self, query: str):
+        match = QUERY_PATTERN.match(query)
+        if not match or re.search(r"\s(OR|JOIN)\s", query, re.IGNORECASE):
+            raise ValueError(f"Query not supported by the Cosmos DB stand-in: {query}")
+        self.distinct = bool(match.group("distinct"))
+        self.value = bool(match.group("value"))
+        select = match.group("select").strip()
+        self.count = select.upper() == "COUNT(1)"
+        self.star = select == "*"
+        self.fields = [field.strip() for field in select.split(",")] if not (self.count or self.star) else []
+        for field in self.fields:
+            if not re.fullmatch(PATH, field):
+                raise ValueError(f"Projection not supported by the Cosmos DB stand-in: {field}")
+        where = match.group("where")
+        self.predicates = [predicate(clause) for clause in re.split(r"\s+AND\s+", where, flags=re.IGNORECASE)] if where else []
+        order = (match.group("order") or "").split()
+        self.order_path = order[0] if order else None
+        self.order_descending = len(order) > 1 and order[1].upper() == "DESC"
+        self.offset = operand(match.group("offset")) if match.group("offset") else None
+        self.limit = operand(match.group("limit")) if match.group("limit") else None
+
+    def matches(self, document: Dict[str, Any], parameters: Dict[str, Any]) -> bool:
+        return all(check(document, parameters) for check in self.predicates)
+
+    def project(self, document: Dict[str, Any]) -> Any:
+        if self.star:
+            return document
+        if self.value:
+            return lookup(document, self.fields[0])
+        projected = {}
+        for field in self.fields:
+            value = lookup(document, field)
+            if value is not UNDEFINED:
+                projected[field.rsplit(".", 1)[-1]] = value
+        return projected
+
+    def run(self, documents: List[Dict[str, Any]], parameters: Dict[str, Any]) -> List[Any]:
+        matched = [document for document in documents if self.matches(document, parameters)]
+        if self.count:
+            return [len(matched)]
+        if self.order_path:
+            defined = [d for d in matched if lookup(d, self.order_path) is not UNDEFINED]
+            defined.sort(key=lambda d: lookup(d, self.order_path), reverse=self.order_descending)
+            matched = defined
+        results = [self.project(document) for document in matched]
+        results = [result for result in results if result is not UNDEFINED]
+        if self.distinct:
+            seen = set()
+            unique = []
+            for result in results:
+                key = json.dumps(result, sort_keys=True)
+                if key not in seen:
+                    seen.add(key)
+                    unique.append(result)
+            results = unique
+        if self.offset is not None:
+            start = int(self.offset(parameters))
+            results = results[start:start + int(self.limit(parameters))]
+        return results
+
+
+class ProvisionedThroughput:
+    """A provisioned RU/s budget: requests beyond it are throttled with a retry-after delay."""
+
+    def __init__(self, ru_per_second: float):
+        self.ru_per_second = ru_per_second
+        self.available = ru_per_second
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, charge: float) -> float:
+        """Consume `charge` RUs if available and return 0, or return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.ru_per_second, self.available + (now - self.updated_at) * self.ru_per_second)
+            self.updated_at = now
+            if self.available >= charge:
+                self.available -= charge
+                return 0.0
+            return (min(charge, self.ru_per_second) - self.available) / self.ru_per_second
+
+
+class InMemoryContainer:
+    """
+    A Cosmos DB container held in memory, with the `ContainerProxy` methods the managers call.
+
+    Every request waits the configured latency, is charged request units (see the module
+    docstring), and is passed to the same raw request/response hooks the managers give the real
+    client, so the metrics and RU accounting see the same calls they would in production.
+    """
+
+    def __init__(self, config: StandInConfig, counters: Counters, hooks: Dict[str, Callable[[Any], None]]):
+        self.config = config
+        self.counters = counters
+        self.hooks = hooks
+        self.url = (f"{SERVICE_ENVIRONMENT['COSMOS_HOST'].rstrip('/')}/dbs/{SERVICE_ENVIRONMENT['COSMOS_DATABASE_ID']}"
+                    f"/colls/{SERVICE_ENVIRONMENT['COSMOS_CONTAINER_ID']}/docs")
+        self.throughput = ProvisionedThroughput(config.cosmos_ru_per_second) if config.cosmos_ru_per_second > 0 else None
+        # partition key -> id -> serialized document
+        self.partitions: Dict[Any, Dict[str, str]] = {}
+        self._queries: Dict[str, CompiledQuery] = {}
+        self._lock = threading.Lock()
+
+    # Storage
+
+    def load(self, documents: List[Dict[str, Any]]) -> None:
+        """Store documents directly, without latency, charges or hooks (for seeding)."""
+        for document in documents:
+            key, text, _ = self._prepare(document)
+            with self._lock:
+                self.partitions.setdefault(key[0], {})[key[1]] = text
+
+    def _prepare(self, body: Dict[str, Any]) -> Tuple[Tuple[Any, str], str, float]:
+        if "id" not in body:
+            raise cosmos_exceptions.CosmosHttpResponseError(status_code=400, message="The input content is invalid because the required properties - 'id; ' - are missing")
+        document = {key: value for key, value in body.items() if key not in SYSTEM_PROPERTIES}
+        document.update({"_rid": uuid.uuid4().hex[:16], "_self": "", "_etag": new_etag(),
+                         "_attachments": "attachments/", "_ts": int(time.time())})
+        text = json.dumps(document)
+        return (body.get("partitionKey"), str(body["id"])), text, write_charge(len(text))
+
+    def _commit(self, key: Tuple[Any, str], text: str, overwrite: bool) -> Dict[str, Any]:
+        with self._lock:
+            partition = self.partitions.setdefault(key[0], {})
+            if not overwrite and key[1] in partition:
+                raise cosmos_exceptions.CosmosResourceExistsError(status_code=409, message="Entity with the specified id already exists in the system.")
+            partition[key[1]] = text
+        return json.loads(text)
+
+    def _read(self, item: str, partition_key: Any) -> str:
+        with self._lock:
+            text = self.partitions.get(partition_key, {}).get(str(item))
+        if text is None:
+            raise cosmos_exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist in the system.")
+        return text
+
+    def _delete(self, item: str, partition_key: Any) -> None:
+        with self._lock:
+            if self.partitions.get(partition_key, {}).pop(str(item), None) is None:
+                raise cosmos_exceptions.CosmosResourceNotFoundError(status_code=404, message="Entity with the specified id does not exist in the system.")
+
+    def _pages(self, query: str, parameters: Optional[List[Dict[str, Any]]], partition_key: Any) -> List[Tuple[List[Any], float]]:
+        """Run a query and split its results into the (items, charge) pages the service would return."""
+        compiled = self._queries.get(query)
+        if compiled is None:
+            compiled = self._queries.setdefault(query, CompiledQuery(query))
+        values = {parameter["name"]: parameter["value"] for parameter in parameters or []}
+
+        with self._lock:
+            if partition_key is not None:
+                ranges = [list(self.partitions.get(partition_key, {}).values())]
+            else:
+                ranges = [[] for _ in range(self.config.cosmos_physical_partitions)]
+                for key, documents in self.partitions.items():
+                    ranges[synthetic.seed_of(key) % len(ranges)].extend(documents.values())
+
+        pages = []
+        if compiled.count or compiled.distinct or compiled.order_path or compiled.offset is not None:
+            # Aggregates, DISTINCT, ORDER BY and OFFSET are merged across partitions by the SDK
+            documents = [json.loads(text) for texts in ranges for text in texts]
+            scanned = [len(texts) for texts in ranges]
+            results = compiled.run(documents, values)
+            pages.extend(self._split(results, scanned))
+        else:
+            for texts in ranges:
+                results = compiled.run([json.loads(text) for text in texts], values)
+                pages.extend(self._split(results, [len(texts)]))
+        return pages
+
+    def _split(self, results: List[Any], scanned: List[int]) -> List[Tuple[List[Any], float]]:
+        size = self.config.cosmos_page_size
+        chunks = [results[i:i + size] for i in range(0, len(results), size)] or [[]]
+        pages = []
+        for index, chunk in enumerate(chunks):
+            charge = QUERY_PAGE_RU + QUERY_RU_PER_KB * len(json.dumps(chunk)) / 1024
+            if index == 0:
+                charge += QUERY_RU_PER_SCANNED_DOCUMENT * sum(scanned) + QUERY_PAGE_RU * (len(scanned) - 1)
+            pages.append((chunk, round(charge, 2)))
+        return pages
+
+    # Requests
+
+    def _exchange(self, method: str, headers: Dict[str, str], charge: float) -> Iterator[float]:
+        """
+        One request to the service: yields the delays to wait (latency, then any throttling
+        back-off) and reports every attempt to the hooks.
+        """
+        for attempt in range(COSMOS_THROTTLE_RETRIES + 1):
+            request = PipelineRequest(HttpRequest(method, self.url, headers=headers), PipelineContext(None))
+            self.hooks["raw_request_hook"](request)
+            yield self.config.scaled(self.config.cosmos_seconds)
+            wait = self.throughput.reserve(charge) if self.throughput is not None else 0.0
+            if not wait:
+                self._respond(request, 200, {"x-ms-request-charge": str(charge)})
+                self.counters.add("cosmos.requests")
+                self.counters.add("cosmos.request_units", charge)
+                return
+            self._respond(request, 429, {"x-ms-request-charge": "0", "x-ms-retry-after-ms": str(int(wait * 1000))})
+            self.counters.add("cosmos.throttled")
+            if attempt == COSMOS_THROTTLE_RETRIES:
+                raise cosmos_exceptions.CosmosHttpResponseError(status_code=429, message="Request rate is large.")
+            yield wait
+
+    def _respond(self, request: PipelineRequest, status: int, headers: Dict[str, str]) -> None:
+        response = StandInResponse(request.http_request, status, headers)
+        self.hooks["raw_response_hook"](PipelineResponse(request.http_request, response, request.context))
+
+    def _wait(self, delays: Iterator[float]) -> None:
+        for delay in delays:
+            time.sleep(delay)
+
+    # ContainerProxy methods
+
+    def create_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        key, text, charge = self._prepare(body)
+        self._wait(self._exchange("POST", {}, charge))
+        return self._commit(key, text, overwrite=False)
+
+    def upsert_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        key, text, charge = self._prepare(body)
+        self._wait(self._exchange("POST", {"x-ms-documentdb-is-upsert": "True"}, charge))
+        return self._commit(key, text, overwrite=True)
+
+    def replace_item(self, item: Any, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        key, text, charge = self._prepare(body)
+        self._read(key[1], key[0])
+        self._wait(self._exchange("PUT", {}, charge))
+        return self._commit(key, text, overwrite=True)
+
+    def read_item(self, item: Any, partition_key: Any, **kwargs) -> Dict[str, Any]:
+        text = self._read(item, partition_key)
+        self._wait(self._exchange("GET", {}, read_charge(len(text))))
+        return json.loads(text)
+
+    def delete_item(self, item: Any, partition_key: Any, **kwargs) -> None:
+        text = self._read(item, partition_key)
+        self._wait(self._exchange("DELETE", {}, write_charge(len(text))))
+        self._delete(item, partition_key)
+
+    def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None,
+                    partition_key: Any = None, **kwargs) -> Iterator[Any]:
+        for items, charge in self._pages(query, parameters, partition_key):
+            self._wait(self._exchange("POST", QUERY_HEADERS, charge))
+            yield from items
+
+
+class AsyncInMemoryContainer:
+    """The `azure.cosmos.aio` view of an `InMemoryContainer`: same data, awaited latencies."""
+
+    def __init__(self, container: InMemoryContainer):
+        self.container = container
+
+    async def _wait(self, delays: Iterator[float]) -> None:
+        for delay in delays:
+            await asyncio.sleep(delay)
+
+    async def create_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        key, text, charge = self.container._prepare(body)
+        await self._wait(self.container._exchange("POST", {}, charge))
+        return self.container._commit(key, text, overwrite=False)
+
+    async def upsert_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        key, text, charge = self.container._prepare(body)
+        await self._wait(self.container._exchange("POST", {"x-ms-documentdb-is-upsert": "True"}, charge))
+        return self.container._commit(key, text, overwrite=True)
+
+    async def read_item(self, item: Any, partition_key: Any, **kwargs) -> Dict[str, Any]:
+        text = self.container._read(item, partition_key)
+        await self._wait(self.container._exchange("GET", {}, read_charge(len(text))))
+        return json.loads(text)
+
+    async def delete_item(self, item: Any, partition_key: Any, **kwargs) -> None:
+        text = self.container._read(item, partition_key)
+        await self._wait(self.container._exchange("DELETE", {}, write_charge(len(text))))
+        self.container._delete(item, partition_key)
+
+    async def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None,
+                          partition_key: Any = None, **kwargs):
+        for items, charge in self.container._pages(query, parameters, partition_key):
+            await self._wait(self.container._exchange("POST", QUERY_HEADERS, charge))
+            for item in items:
+                yield item
+
+    async def close(self) -> None:
+        pass
+
+
+QUERY_HEADERS = {"x-ms-documentdb-isquery": "True", "Content-Type": "application/query+json"}
+
+
+def read_charge(size: int) -> float:
+    return round(READ_RU_PER_KB * max(1.0, size / 1024), 2)
+
+
+def write_charge(size: int) -> float:
+    return round(WRITE_RU_PER_KB * max(1.0, size / 1024), 2)
+
+
+# ---------------------------------------------------------------------------------------------
+# Installation
+# ---------------------------------------------------------------------------------------------
+
+class StandIns:
+    """The installed stand-ins, their shared counters and helpers to seed them."""
+
+    def __init__(self, config: StandInConfig):
+        from common.cosmos_usage import record_response
+
+        self.config = config
+        self.counters = Counters()
+        self.llm = LLMStandIn(config, self.counters)
+        self.blob = BlobStandIn(config, self.counters)
+        self.search = SearchStandIn(config, self.counters)
+        self.document_intelligence = DocumentIntelligenceStandIn(config, self.counters, self.blob)
+        # The hooks the Cosmos DB managers give their client: metrics and RU accounting
+        self.cosmos = InMemoryContainer(config, self.counters, upstream_hooks(COSMOS, record_response))
+
+    def stats(self) -> Dict[str, float]:
+        return self.counters.snapshot()
+
+    def reset(self) -> None:
+        self.counters.reset()
+
+    def rfp_blob_url(self, rfp_name: str) -> str:
+        return (f"https://{SERVICE_ENVIRONMENT['STORAGE_ACCOUNT_NAME']}.blob.core.windows.net/"
+                f"{SERVICE_ENVIRONMENT['STORAGE_ACCOUNT_CONTAINER_RFP']}/{rfp_name}")
+
+    def seed_rfp(self, rfp_name: str, pages: int, seed: int = 0, analysis: bool = True) -> Dict[str, str]:
+        """
+        Store a processed RFP as upload and chunking leave it: its sections, table of contents
+        and (optionally) its analysis. Returns the sections.
+        """
+        sections = synthetic.sections_of(synthetic.generate_layout(pages, seed, include_words=False))
+        documents = [{"id": f"{rfp_name} - {heading}", "partitionKey": rfp_name, "section_id": heading,
+                      "section_content": content} for heading, content in sections.items()]
+        documents.append({"id": f"{rfp_name} - TOC", "partitionKey": rfp_name,
+                          "table_of_contents": "\n".join(sections)})
+        if analysis:
+            documents.append({"id": f"{rfp_name}_analysis", "partitionKey": rfp_name,
+                              "skills_and_experience": self.llm.overview(rfp_name)})
+        self.cosmos.load(documents)
+        return sections
+
+
+def install(config: Optional[StandInConfig] = None) -> StandIns:
+    """
+    Wire the stand-ins into the backend: the LLM router and embedding service, the Cosmos DB and
+    ADLS managers, and the Search and Document Intelligence clients of the route modules.
+
+    Must run before the backend creates its clients (i.e. before any request is handled).
+    """
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from azure.search.documents import SearchClient
+    from azure.storage.blob import BlobServiceClient
+
+    from common.adls import ADLSManager
+    from common.cosmosdb import CosmosDBManager
+    from common.cosmosdb_async import AsyncCosmosDBManager
+    from common.embeddings import EmbeddingService
+    from common.llm_router import Deployment, LLMRouter
+    import response
+    import search
+    import upload
+
+    config = config or StandInConfig()
+    standins = StandIns(config)
+
+    deployment = Deployment("standin", SERVICE_ENVIRONMENT["AZURE_OPENAI_DEPLOYMENT_NAME"],
+                            SERVICE_ENVIRONMENT["AZURE_OPENAI_ENDPOINT"], SERVICE_ENVIRONMENT["AZURE_OPENAI_API_KEY"],
+                            tpm=config.llm_tpm, rpm=config.llm_rpm)
+    LLMRouter().configure(deployments=[deployment], client_factory=standins.llm.client_factory)
+    EmbeddingService().client = standins.llm.embeddings_client()
+
+    # The managers are singletons; install ones whose container is the stand-in
+    manager = object.__new__(CosmosDBManager)
+    manager.client = manager.database = None
+    manager.container = standins.cosmos
+    CosmosDBManager._instance = manager
+    CosmosDBManager._is_initialized = True
+
+    async def create_async_manager(cls):
+        async_manager = object.__new__(cls)
+        async_manager.credential = async_manager.database = None
+        async_manager.container = async_manager.client = AsyncInMemoryContainer(standins.cosmos)
+        return async_manager
+    AsyncCosmosDBManager._create = classmethod(create_async_manager)
+
+    adls_manager = ADLSManager()
+    adls_manager.blob_service_client = BlobServiceClient(
+        f"https://{SERVICE_ENVIRONMENT['STORAGE_ACCOUNT_NAME']}.blob.core.windows.net",
+        credential={"account_name": SERVICE_ENVIRONMENT["STORAGE_ACCOUNT_NAME"], "account_key": SERVICE_ENVIRONMENT["STORAGE_ACCOUNT_KEY"]},
+        transport=standins.blob, **adls_manager._download_options(), **upstream_hooks(BLOB))
+
+    search_credential = AzureKeyCredential(SERVICE_ENVIRONMENT["AZURE_SEARCH_KEY"])
+    search.search_client = SearchClient(SERVICE_ENVIRONMENT["AZURE_SEARCH_ENDPOINT"], SERVICE_ENVIRONMENT["AZURE_SEARCH_INDEX_RESUMES"],
+                                        search_credential, transport=standins.search, **upstream_hooks(SEARCH))
+    response.search_client = SearchClient(SERVICE_ENVIRONMENT["AZURE_SEARCH_ENDPOINT"], SERVICE_ENVIRONMENT["AZURE_SEARCH_INDEX_KB"],
+                                          search_credential, transport=standins.search, **upstream_hooks(SEARCH))
+    upload.document_intelligence_client = DocumentIntelligenceClient(
+        SERVICE_ENVIRONMENT["FORM_RECOGNIZER_ENDPOINT"], AzureKeyCredential(SERVICE_ENVIRONMENT["FORM_RECOGNIZER_KEY"]),
+        transport=standins.document_intelligence, **upstream_hooks(DOCUMENT_INTELLIGENCE))
+
+    return standins
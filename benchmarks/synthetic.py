@@ -0,0 +1,302 @@
+"""
+Synthetic data for the benchmark stand-ins.
+
+Everything is generated deterministically from a seed, so two runs with the same options send the
+backend exactly the same documents and prompts:
+
+    - RFP documents as Document Intelligence `analyzeResult` JSON with N pages: page headers,
+      numbered section headings (plus a few false headings such as table captions, which the
+      section validator should reject), body paragraphs mixing "shall" requirements with
+      informative text, page numbers and footers, and per-page words with polygons so the result
+      is as large as a real layout analysis
+    - the placeholder "PDF" bytes that are uploaded for a document, which carry its page count so
+      the Document Intelligence stand-in can analyze what was uploaded
+    - resume and knowledge base documents for the AI Search stand-in
+    - filler text of a given token count for LLM completions
+"""
+
+import hashlib
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+SECTION_TOPICS = [
+    "Introduction", "Background", "Scope of Work", "Technical Requirements", "Staffing Plan",
+    "Project Management", "Security Requirements", "Data Migration", "Training", "Reporting",
+    "Quality Assurance", "Deliverables", "Transition Plan", "Service Levels", "Evaluation Criteria",
+    "Pricing", "Submission Instructions", "Terms and Conditions",
+]
+SUBSECTION_TOPICS = [
+    "Fulfillment", "Call Center Operations", "Case Management", "Document Management", "Integration",
+    "Accessibility", "Disaster Recovery", "Performance Monitoring", "Knowledge Transfer", "Key Personnel",
+]
+FALSE_HEADINGS = ["Table {n}: Hourly Rates", "Figure {n}: System Context", "Exhibit {n}", "CONFIDENTIAL"]
+
+ACTORS = ["The Contractor", "The Offeror", "The Vendor", "The selected firm"]
+OBLIGATIONS = ["shall", "must", "shall", "will be required to"]
+ACTIONS = [
+    "provide", "maintain", "deliver", "document", "implement", "support", "report on", "monitor",
+    "staff", "configure", "migrate", "test", "secure", "train users on",
+]
+OBJECTS = [
+    "the case management system", "a staffing plan for all key personnel", "monthly status reports",
+    "a disaster recovery plan", "role-based access controls", "the customer service center",
+    "the data migration from the legacy platform", "accessibility conformance with WCAG 2.1 AA",
+    "a quality assurance surveillance plan", "service level metrics", "the integration interfaces",
+    "end-user training materials", "an incident response procedure", "a transition-out plan",
+]
+QUALIFIERS = [
+    "within thirty (30) calendar days of contract award", "in accordance with Department standards",
+    "for the full period of performance", "no later than two (2) business days after each request",
+    "at no additional cost to the Department", "as described in Attachment B", "on a monthly basis",
+]
+INFORMATIVE = [
+    "The Department currently serves approximately {n},000 residents through this program.",
+    "This section describes the responsibilities and tasks of the contractor.",
+    "The existing system was implemented in {y} and is hosted on premises.",
+    "Questions regarding this solicitation should be submitted in writing.",
+    "The period of performance is {n} years with two optional renewal years.",
+    "Historical call volumes are provided for informational purposes only.",
+]
+FILLER_WORDS = [
+    "experience", "program", "management", "delivery", "stakeholder", "engagement", "requirements",
+    "compliance", "security", "operations", "transition", "quality", "reporting", "integration",
+    "modernization", "cloud", "data", "platform", "service", "levels", "staffing", "training",
+    "migration", "governance", "risk", "analytics", "customer", "support", "infrastructure", "the",
+    "and", "with", "for", "across", "proven", "large-scale", "public", "sector", "agency", "teams",
+]
+JOB_TITLES = [
+    "Program Manager", "Solution Architect", "Data Engineer", "Business Analyst", "Security Engineer",
+    "Project Manager", "Cloud Engineer", "QA Lead", "Change Management Lead", "Software Engineer",
+]
+
+# Restated requirements: a share of every document's requirements is drawn from this pool, so the
+# same requirement appears in several sections as it does in real RFPs
+SHARED_REQUIREMENT_COUNT = 30
+SHARED_REQUIREMENT_RATE = 0.15
+
+PDF_HEADER = b"%PDF-1.7\n"
+PDF_PAGES = re.compile(rb"^%benchmark pages=(\d+) seed=(\d+)$", re.MULTILINE)
+
+
+def seed_of(*parts: Any) -> int:
+    """A stable seed derived from the given values (Python's `hash` is randomized per process)."""
+    return int.from_bytes(hashlib.sha256("\x1f".join(map(str, parts)).encode("utf-8")).digest()[:8], "big")
+
+
+def filler_text(tokens: int, seed: Any = 0) -> str:
+    """Roughly `tokens` tokens of plausible proposal text."""
+    rng = random.Random(seed_of("filler", seed))
+    words = []
+    for index in range(max(1, tokens)):
+        word = rng.choice(FILLER_WORDS)
+        words.append(word.capitalize() if index == 0 or words[-1].endswith(".") else word)
+        if rng.random() < 0.08:
+            words[-1] += "."
+    return " ".join(words)
+
+
+def requirement_sentence(rng: random.Random) -> str:
+    return f"{rng.choice(ACTORS)} {rng.choice(OBLIGATIONS)} {rng.choice(ACTIONS)} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}."
+
+
+SHARED_REQUIREMENTS = [requirement_sentence(random.Random(seed_of("shared", index))) for index in range(SHARED_REQUIREMENT_COUNT)]
+
+
+def informative_sentence(rng: random.Random) -> str:
+    return rng.choice(INFORMATIVE).format(n=rng.randint(2, 90), y=rng.randint(2004, 2019))
+
+
+def body_paragraph(rng: random.Random, requirement_rate: float) -> str:
+    sentences = []
+    for _ in range(rng.randint(2, 4)):
+        if rng.random() < requirement_rate:
+            if rng.random() < SHARED_REQUIREMENT_RATE:
+                sentences.append(rng.choice(SHARED_REQUIREMENTS))
+            else:
+                sentences.append(requirement_sentence(rng))
+        else:
+            sentences.append(informative_sentence(rng))
+    return " ".join(sentences)
+
+
+def generate_layout(pages: int, seed: int = 0, paragraphs_per_page: int = 6, pages_per_section: int = 2,
+                    requirement_rate: float = 0.5, false_heading_rate: float = 0.1,
+                    include_words: bool = True) -> Dict[str, Any]:
+    """
+    Generate the `analyzeResult` of a prebuilt-layout analysis of an RFP.
+
+    Args:
+        pages (int): Number of pages.
+        seed (int): Seed of the document's content.
+        paragraphs_per_page (int): Body paragraphs per page.
+        pages_per_section (int): Pages between top-level section headings.
+        requirement_rate (float): Share of sentences that are requirements.
+        false_heading_rate (float): Share of pages with a paragraph wrongly labelled as a heading.
+        include_words (bool): Include per-page words with polygons, as the real service does.
+
+    Returns:
+        dict: The `analyzeResult` JSON, ready to be served or loaded with `AnalyzeResult(...)`.
+    """
+    rng = random.Random(seed_of("layout", pages, seed))
+    content: List[str] = []
+    offset = 0
+    paragraphs: List[Dict[str, Any]] = []
+    page_texts: List[tuple] = []
+    page_entries: List[Dict[str, Any]] = []
+    section_number = 0
+    subsection_number = 0
+
+    def add(role: Optional[str], text: str, page_number: int, top: float) -> None:
+        nonlocal offset
+        paragraph = {
+            "spans": [{"offset": offset, "length": len(text)}],
+            "boundingRegions": [{"pageNumber": page_number, "polygon": [1.0, top, 7.5, top, 7.5, top + 0.4, 1.0, top + 0.4]}],
+            "content": text,
+        }
+        if role:
+            paragraph["role"] = role
+        paragraphs.append(paragraph)
+        content.append(text)
+        page_texts.append((offset, text))
+        offset += len(text) + 1
+
+    for page_number in range(1, pages + 1):
+        page_offset = offset
+        page_texts.clear()
+        top = 0.3
+        add("pageHeader", f"Request for Proposal {seed:04d} - Confidential", page_number, top)
+
+        if (page_number - 1) % pages_per_section == 0:
+            section_number += 1
+            subsection_number = 0
+            topic = SECTION_TOPICS[(section_number - 1) % len(SECTION_TOPICS)]
+            role = "title" if page_number == 1 else "sectionHeading"
+            top += 0.6
+            add(role, f"{section_number}. {topic}", page_number, top)
+
+        for index in range(paragraphs_per_page):
+            top += 1.2
+            if index == paragraphs_per_page // 2 and rng.random() < 0.6:
+                subsection_number += 1
+                topic = rng.choice(SUBSECTION_TOPICS)
+                add("sectionHeading", f"{section_number}.{subsection_number} {topic}", page_number, top)
+            if index == 1 and rng.random() < false_heading_rate:
+                add("sectionHeading", rng.choice(FALSE_HEADINGS).format(n=rng.randint(1, 40)), page_number, top)
+            add(None, body_paragraph(rng, requirement_rate), page_number, top)
+
+        add("pageNumber", f"Page {page_number} of {pages}", page_number, 10.2)
+        add("pageFooter", "Issued by the Department of Administrative Services", page_number, 10.6)
+
+        page: Dict[str, Any] = {
+            "pageNumber": page_number,
+            "angle": 0,
+            "width": 8.5,
+            "height": 11,
+            "unit": "inch",
+            "spans": [{"offset": page_offset, "length": offset - page_offset}],
+        }
+        if include_words:
+            page["words"] = page_words(page_texts)
+        page_entries.append(page)
+
+    return {
+        "apiVersion": "2024-02-29-preview",
+        "modelId": "prebuilt-layout",
+        "stringIndexType": "textElements",
+        "content": "\n".join(content),
+        "pages": page_entries,
+        "paragraphs": paragraphs,
+    }
+
+
+def page_words(page_texts: List[tuple]) -> List[Dict[str, Any]]:
+    """Words of a page's (offset, text) paragraphs, laid out left to right, top to bottom."""
+    words = []
+    x, y = 1.0, 0.3
+    for start, text in page_texts:
+        for match in re.finditer(r"\S+", text):
+            width = 0.08 * len(match.group())
+            if x + width > 7.5:
+                x, y = 1.0, y + 0.2
+            words.append({
+                "content": match.group(),
+                "polygon": [x, y, x + width, y, x + width, y + 0.15, x, y + 0.15],
+                "confidence": 0.99,
+                "span": {"offset": start + match.start(), "length": len(match.group())},
+            })
+            x += width + 0.05
+    return words
+
+
+def sections_of(layout: Dict[str, Any]) -> Dict[str, str]:
+    """
+    The valid sections of a generated document and their content, as chunking stores them.
+
+    Used to seed Cosmos DB directly for scenarios that start after chunking.
+    """
+    sections: Dict[str, str] = {}
+    current = None
+    for paragraph in layout["paragraphs"]:
+        role = paragraph.get("role")
+        if role in ("title", "sectionHeading") and is_valid_heading(paragraph["content"]):
+            current = paragraph["content"]
+            sections[current] = ""
+            continue
+        if current is None or role in ("pageHeader", "pageFooter"):
+            continue
+        if role == "pageNumber":
+            sections[current] += f"Page Number: {paragraph['content']}\n"
+            continue
+        sections[current] += paragraph["content"] + "\n"
+    return sections
+
+
+def is_valid_heading(text: str) -> bool:
+    """Generated headings are numbered; false headings (captions, banners) are not."""
+    return bool(re.match(r"\d+(\.\d+)*\.? ", text))
+
+
+def placeholder_pdf(pages: int, seed: int = 0, bytes_per_page: int = 50_000) -> bytes:
+    """Bytes uploaded for a generated document: a PDF-like header naming its page count, padded to size."""
+    header = PDF_HEADER + f"%benchmark pages={pages} seed={seed}\n".encode()
+    padding = max(0, pages * bytes_per_page - len(header))
+    return header + random.Random(seed_of("pdf", pages, seed)).randbytes(padding)
+
+
+def parse_placeholder_pdf(data: bytes) -> Optional[Dict[str, int]]:
+    """The page count and seed of a placeholder PDF, or None for other content."""
+    match = PDF_PAGES.search(data[:256])
+    if not data.startswith(PDF_HEADER) or not match:
+        return None
+    return {"pages": int(match.group(1)), "seed": int(match.group(2))}
+
+
+def resume_documents(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Documents of the resume index."""
+    documents = []
+    for index in range(count):
+        rng = random.Random(seed_of("resume", seed, index))
+        documents.append({
+            "id": f"resume-{index:04d}",
+            "sourceFileName": f"resume-{index:04d}.pdf",
+            "jobTitle": rng.choice(JOB_TITLES),
+            "experienceLevel": rng.randint(1, 25),
+            "content": filler_text(400, ("resume", seed, index)),
+        })
+    return documents
+
+
+def knowledge_documents(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Documents of the knowledge base index."""
+    documents = []
+    for index in range(count):
+        rng = random.Random(seed_of("knowledge", seed, index))
+        documents.append({
+            "id": f"kb-{index:04d}",
+            "sourceFileName": f"past-proposal-{index // 20:03d}.pdf",
+            "sourceFilePage": rng.randint(1, 120),
+            "date": f"20{rng.randint(18, 24)}-{rng.randint(1, 12):02d}-01T00:00:00Z",
+            "content": filler_text(250, ("knowledge", seed, index)),
+        })
+    return documents
@@ -0,0 +1,435 @@
+"""
+Shared indexing pipeline for the indexing scripts.
+
+The pipeline runs three overlapping stages:
+
+    1. prepare  - per-item work such as layout analysis and LLM extraction, run on a thread pool
+    2. index    - documents from many items are embedded in one batch and uploaded with a single
+                  `upload_documents` call (hundreds of documents per call)
+    3. finalize - optional per-item work once all of an item's documents are indexed
+
+Each stage retries failed items with exponential backoff, documents rejected by the search
+service are re-uploaded on their own, and progress/throughput is printed as the run goes.
+
+`run_incremental` adds change detection on top: an `IndexingManifest` stored on local disk
+remembers the content hash, ETag and last-modified time of every indexed blob together with the
+ids of the index documents built from it. Only new or changed blobs are sent through the
+pipeline, and the index documents of removed blobs (or of chunks a changed blob no longer has)
+are deleted.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from common.embeddings import generate_embeddings_batch
+
+
+def with_retries(func, *args, attempts=3, backoff=2.0, description=""):
+    """
+    Call a function, retrying with exponential backoff when it raises.
+
+    Args:
+        func: The function to call.
+        *args: Positional arguments for the function.
+        attempts (int): The maximum number of attempts.
+        backoff (float): The delay in seconds before the first retry; doubled on each retry.
+        description (str): A label used in retry messages.
+
+    Returns:
+        The function's return value. The last exception is re-raised once attempts are exhausted.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = backoff * (2 ** (attempt - 1))
+            print(f"Attempt {attempt}/{attempts} failed for {description}: {str(e)}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class IndexingProgress:
+    """Thread-safe counters and a periodic progress/throughput report for an indexing run."""
+
+    def __init__(self, total=None, report_interval=30.0):
+        self.total = total
+        self.report_interval = report_interval
+        self.succeeded = 0
+        self.failed: Dict[str, str] = {}
+        self.documents_uploaded = 0
+        self.start_time = time.monotonic()
+        self._last_report = self.start_time
+        self._lock = threading.Lock()
+
+    def record_success(self, item, documents=0):
+        with self._lock:
+            self.succeeded += 1
+            self.documents_uploaded += documents
+        self._maybe_report()
+
+    def record_failure(self, item, stage, error):
+        with self._lock:
+            self.failed[item] = f"{stage}: {error}"
+        print(f"Error processing {item} during {stage}: {error}")
+        self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_report < self.report_interval:
+                return
+            self._last_report = now
+        self.report()
+
+    def report(self, final=False):
+        with self._lock:
+            elapsed = time.monotonic() - self.start_time
+            done = self.succeeded + len(self.failed)
+            rate = done / elapsed * 60 if elapsed > 0 else 0.0
+            total = f"/{self.total}" if self.total is not None else ""
+            message = (f"{'Finished' if final else 'Progress'}: {done}{total} items "
+                       f"({self.succeeded} succeeded, {len(self.failed)} failed), "
+                       f"{self.documents_uploaded} documents uploaded in {elapsed:.0f}s "
+                       f"({rate:.1f} items/min)")
+            if not final and self.total and rate > 0:
+                message += f", ~{(self.total - done) / rate:.1f} min remaining"
+        print(message)
+        if final and self.failed:
+            print("Failed items:")
+            for item, reason in self.failed.items():
+                print(f"  {item} - {reason}")
+
+
+class IndexingPipeline:
+    """
+    Run items through prepare -> batched embed/upload -> finalize with concurrent stages.
+
+    Args:
+        search_client: The Azure AI Search client documents are uploaded with.
+        prepare: Called with an item; returns a list of (document, text_to_embed) pairs.
+        finalize: Optional; called with an item and its document ids once all of its documents are indexed.
+        vector_field (str): The document field the embedding is written to.
+        key_field (str): The document key field of the index.
+        prepare_workers (int): Concurrent prepare calls (layout analysis, LLM extraction).
+        upload_workers (int): Concurrent embed/upload batches.
+        upload_batch_size (int): Documents per `upload_documents` call.
+        max_attempts (int): Attempts per stage before an item is marked as failed.
+    """
+
+    def __init__(self, search_client, prepare: Callable[[Any], List[Tuple[Dict[str, Any], str]]],
+                 finalize: Optional[Callable[[Any, List[str]], None]] = None, vector_field="searchVector", key_field="id",
+                 prepare_workers=8, upload_workers=2, upload_batch_size=200, max_attempts=3):
+        self.search_client = search_client
+        self.prepare = prepare
+        self.finalize = finalize
+        self.vector_field = vector_field
+        self.key_field = key_field
+        self.prepare_workers = prepare_workers
+        self.upload_workers = upload_workers
+        self.upload_batch_size = upload_batch_size
+        self.max_attempts = max_attempts
+        self._remaining: Dict[Any, int] = {}
+        self._document_ids: Dict[Any, List[str]] = {}
+        self._item_failed = set()
+        self._lock = threading.Lock()
+
+    def run(self, items: Iterable[Any], total=None) -> IndexingProgress:
+        """
+        Index all items and print a final report.
+
+        Args:
+            items: The items (e.g. blob names) to index.
+            total (int): The number of items, if known, for progress reporting.
+
+        Returns:
+            IndexingProgress: The counters for the finished run.
+        """
+        progress = IndexingProgress(total=total)
+        pending: List[Tuple[Any, Dict[str, Any], str]] = []
+        upload_futures = []
+        prepare_futures = {}
+        submitted = 0
+
+        with ThreadPoolExecutor(max_workers=self.prepare_workers) as prepare_pool, \
+                ThreadPoolExecutor(max_workers=self.upload_workers) as upload_pool:
+
+            def submit_upload(batch):
+                nonlocal upload_futures
+                # Hold prepare results back while uploads are behind, so prepared documents do not pile up
+                upload_futures = [future for future in upload_futures if not future.done()]
+                while len(upload_futures) >= self.upload_workers * 2:
+                    wait(upload_futures, return_when=FIRST_COMPLETED)
+                    upload_futures = [future for future in upload_futures if not future.done()]
+                upload_futures.append(upload_pool.submit(self._index_batch, batch, progress))
+
+            def collect(done):
+                nonlocal pending
+                for future in done:
+                    item = prepare_futures.pop(future)
+                    try:
+                        prepared = future.result()
+                    except Exception as e:
+                        progress.record_failure(item, "prepare", e)
+                        continue
+
+                    if not prepared:
+                        self._finalize(item, progress)
+                        continue
+
+                    with self._lock:
+                        self._remaining[item] = len(prepared)
+                        self._document_ids[item] = [document[self.key_field] for document, _ in prepared]
+                    pending.extend((item, document, text) for document, text in prepared)
+
+                    while len(pending) >= self.upload_batch_size:
+                        batch, pending = pending[:self.upload_batch_size], pending[self.upload_batch_size:]
+                        submit_upload(batch)
+
+            # Items are submitted through a bounded window and finished ones are collected as the
+            # iterable is consumed, so uploads start (and prepared documents are released) while a
+            # lazy listing is still paging
+            for item in items:
+                prepare_futures[prepare_pool.submit(with_retries, self.prepare, item, attempts=self.max_attempts,
+                                                    description=f"prepare {item}")] = item
+                submitted += 1
+                if len(prepare_futures) >= self.prepare_workers * 2:
+                    done, _ = wait(prepare_futures, return_when=FIRST_COMPLETED)
+                    collect(done)
+            if progress.total is None:
+                progress.total = submitted
+
+            while prepare_futures:
+                done, _ = wait(prepare_futures, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            if pending:
+                submit_upload(pending)
+            wait(upload_futures)
+
+        progress.report(final=True)
+        return progress
+
+    def _index_batch(self, batch, progress):
+        items = {item for item, _, _ in batch}
+        try:
+            vectors = with_retries(generate_embeddings_batch, [text for _, _, text in batch],
+                                   attempts=self.max_attempts, description=f"embedding {len(batch)} documents")
+        except Exception as e:
+            for item in items:
+                self._fail(item, "embedding", e, progress)
+            return
+
+        documents = []
+        for (_, document, _), vector in zip(batch, vectors):
+            document[self.vector_field] = vector
+            documents.append(document)
+
+        try:
+            failed_keys = self._upload(documents)
+        except Exception as e:
+            for item in items:
+                self._fail(item, "upload", e, progress)
+            return
+
+        for item, document, _ in batch:
+            if document[self.key_field] in failed_keys:
+                self._fail(item, "upload", f"document {document[self.key_field]} was rejected", progress)
+                continue
+            with self._lock:
+                if item in self._item_failed:
+                    continue
+                self._remaining[item] -= 1
+                done = self._remaining[item] == 0
+            if done:
+                self._finalize(item, progress)
+
+    def _upload(self, documents):
+        """Upload documents, re-sending only the ones the service rejected. Returns the keys that never succeeded."""
+        remaining = documents
+        for attempt in range(1, self.max_attempts + 1):
+            results = with_retries(self.search_client.upload_documents, remaining, attempts=self.max_attempts,
+                                   description=f"upload of {len(remaining)} documents")
+            failed_keys = {result.key for result in results if not result.succeeded}
+            remaining = [document for document in remaining if document[self.key_field] in failed_keys]
+            if not remaining:
+                return set()
+            if attempt < self.max_attempts:
+                print(f"{len(remaining)} documents were rejected; retrying them")
+                time.sleep(2.0 * attempt)
+        return {document[self.key_field] for document in remaining}
+
+    def _finalize(self, item, progress):
+        document_ids = self._document_ids.get(item, [])
+        if self.finalize:
+            try:
+                with_retries(self.finalize, item, document_ids, attempts=self.max_attempts,
+                             description=f"finalize {item}")
+            except Exception as e:
+                progress.record_failure(item, "finalize", e)
+                return
+        progress.record_success(item, len(document_ids))
+
+    def _fail(self, item, stage, error, progress):
+        with self._lock:
+            if item in self._item_failed:
+                return
+            self._item_failed.add(item)
+        progress.record_failure(item, stage, error)
+
+
+def blob_fingerprint(blob):
+    """Return the change-detection fields of a listed blob: content MD5 (hex), ETag and last-modified time."""
+    content_settings = getattr(blob, "content_settings", None)
+    content_md5 = getattr(content_settings, "content_md5", None) if content_settings else None
+    last_modified = getattr(blob, "last_modified", None)
+    return {
+        "content_md5": bytes(content_md5).hex() if content_md5 else None,
+        "etag": getattr(blob, "etag", None),
+        "last_modified": last_modified.isoformat() if last_modified else None
+    }
+
+
+class IndexingManifest:
+    """
+    Local record of what has been indexed: blob name -> fingerprint and index document ids.
+
+    The manifest is a JSON file that is rewritten atomically. Entries are recorded from the
+    pipeline's worker threads, so all access is guarded by a lock and the file is flushed every
+    `save_every` changes as well as at the end of a run.
+
+    Args:
+        path (str): The manifest file path.
+        save_every (int): The number of recorded changes between saves.
+    """
+
+    def __init__(self, path, save_every=50):
+        self.path = path
+        self.save_every = save_every
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("blobs", {})
+
+    def blob_names(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def document_ids(self, blob_name):
+        with self._lock:
+            return list(self._entries.get(blob_name, {}).get("document_ids", []))
+
+    def needs_indexing(self, blob_name, fingerprint):
+        """Return True when a blob is new or its content has changed since it was indexed."""
+        with self._lock:
+            entry = self._entries.get(blob_name)
+        if entry is None:
+            return True
+        # Compare content hashes when both sides have one so metadata-only changes are skipped
+        if fingerprint.get("content_md5") and entry.get("content_md5"):
+            return fingerprint["content_md5"] != entry["content_md5"]
+        return fingerprint.get("etag") != entry.get("etag")
+
+    def record(self, blob_name, fingerprint, document_ids):
+        with self._lock:
+            self._entries[blob_name] = {
+                **fingerprint,
+                "document_ids": list(document_ids),
+                "indexed_at": datetime.now(timezone.utc).isoformat()
+            }
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def remove(self, blob_name):
+        with self._lock:
+            self._entries.pop(blob_name, None)
+            self._unsaved += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._unsaved += 1
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"blobs": self._entries}, indent=1)
+            self._unsaved = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def delete_documents(search_client, document_ids, key_field="id", batch_size=1000):
+    """Delete index documents by key in batches."""
+    document_ids = list(document_ids)
+    for start in range(0, len(document_ids), batch_size):
+        batch = [{key_field: document_id} for document_id in document_ids[start:start + batch_size]]
+        with_retries(search_client.delete_documents, batch, description=f"delete of {len(batch)} documents")
+
+
+def run_incremental(pipeline, manifest, blobs, full=False, legacy_ids=None):
+    """
+    Index only new or changed blobs and remove index documents for deleted blobs.
+
+    Args:
+        pipeline (IndexingPipeline): The pipeline used to index changed blobs. Its `finalize`
+            callback is replaced by one that records the blob in the manifest.
+        manifest (IndexingManifest): The manifest of previously indexed blobs.
+        blobs: The blobs currently in storage (objects with name, etag, last_modified and content_settings).
+            May be a lazy iterable such as a paged listing; it is consumed while indexing runs.
+        full (bool): Re-index every blob regardless of the manifest.
+        legacy_ids: Optional; called with a blob name, returns the ids an earlier version of the
+            indexer stored for it. They are deleted once the blob is indexed with no manifest entry.
+
+    Returns:
+        IndexingProgress: The counters for the run.
+    """
+    current: Dict[str, Dict[str, Any]] = {}
+
+    def changed_blobs():
+        # Consumed lazily by the pipeline, so indexing starts while the listing is still paging
+        for blob in blobs:
+            fingerprint = blob_fingerprint(blob)
+            current[blob.name] = fingerprint
+            if full or manifest.needs_indexing(blob.name, fingerprint):
+                yield blob.name
+
+    def record(blob_name, document_ids):
+        # Drop documents the previous version produced that the new version no longer has
+        previous_ids = manifest.document_ids(blob_name)
+        if not previous_ids and legacy_ids:
+            previous_ids = legacy_ids(blob_name)
+        stale_ids = set(previous_ids) - set(document_ids)
+        if stale_ids:
+            delete_documents(pipeline.search_client, stale_ids, key_field=pipeline.key_field)
+        manifest.record(blob_name, current[blob_name], document_ids)
+
+    pipeline.finalize = record
+    try:
+        progress = pipeline.run(changed_blobs())
+        print(f"{len(current)} blobs in storage: {progress.total} new or changed, "
+              f"{len(current) - progress.total} unchanged")
+
+        removed = [name for name in manifest.blob_names() if name not in current]
+        if removed:
+            removed_ids = [document_id for name in removed for document_id in manifest.document_ids(name)]
+            delete_documents(pipeline.search_client, removed_ids, key_field=pipeline.key_field)
+            for name in removed:
+                manifest.remove(name)
+            print(f"Deleted {len(removed_ids)} index documents for {len(removed)} removed blobs")
+        return progress
+    finally:
+        manifest.save()
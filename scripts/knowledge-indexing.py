@@ -27,16 +27,23 @@ from dotenv import load_dotenv
 from azure.core.credentials import AzureKeyCredential  
 from azure.identity import DefaultAzureCredential
 
-from openai import AzureOpenAI  
 from langchain_openai import AzureChatOpenAI
 
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult
 from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
 
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import uuid
+import sys
 from dotenv import load_dotenv 
 
+# Make the shared backend modules (common/*) importable from this script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from common.adls import wait_for_copy
+from indexing_pipeline import IndexingManifest, IndexingPipeline, run_incremental
+
 load_dotenv()
 
 # Storage settings
@@ -57,6 +64,16 @@ aoai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 aoai_key = os.getenv("AZURE_OPENAI_API_KEY")
 aoai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 
+# Chunking settings (in characters)
+chunk_size = int(os.getenv("KNOWLEDGE_CHUNK_SIZE", "2000"))
+chunk_overlap = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "200"))
+
+# Indexing pipeline settings
+indexing_workers = int(os.getenv("INDEXING_WORKERS", "8"))
+indexing_upload_workers = int(os.getenv("INDEXING_UPLOAD_WORKERS", "2"))
+indexing_upload_batch_size = int(os.getenv("INDEXING_UPLOAD_BATCH_SIZE", "200"))
+indexing_manifest_dir = os.getenv("INDEXING_MANIFEST_DIR", os.path.join(".cache", "indexing"))
+
 # Initialize DefaultAzureCredential
 credential = DefaultAzureCredential()
 
@@ -83,15 +100,6 @@ search_client = SearchClient(
     AzureKeyCredential(ai_search_key)
 )
 
-aoai_client = AzureOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"), 
-    api_key=os.getenv("AZURE_OPENAI_KEY"),  
-    api_version="2023-05-15"
-)
-
-def generate_embeddings(text, model="text-embedding-ada-002"):
-    return aoai_client.embeddings.create(input=[text], model=model).data[0].embedding
-
 def read_pdf(input_file):
     # Generate SAS token for Document Intelligence to access the blob
     container_client = blob_service_client.get_container_client(container_name)
@@ -106,7 +114,75 @@ def read_pdf(input_file):
     poller = document_intelligence_client.begin_analyze_document("prebuilt-layout", analyze_request=analyze_request)
     result: AnalyzeResult = poller.result()
     
-    return result.content
+    return result
+
+def get_page_paragraphs(adi_result_object):
+    """Return (page_number, text) pairs for the body paragraphs of an analysis result, in reading order."""
+    paragraphs = []
+    for paragraph in adi_result_object.paragraphs or []:
+        if paragraph.role in ["pageHeader", "pageFooter", "pageNumber"]:
+            continue
+        page_number = paragraph.bounding_regions[0].page_number if paragraph.bounding_regions else 1
+        paragraphs.append((page_number, paragraph.content))
+
+    if not paragraphs and adi_result_object.content:
+        paragraphs.append((1, adi_result_object.content))
+    return paragraphs
+
+def split_text(text, size, overlap):
+    """Split a single oversized paragraph into overlapping windows of at most `size` characters."""
+    step = max(1, size - overlap)
+    return [text[start:start + size] for start in range(0, max(len(text) - overlap, 1), step)]
+
+def chunk_document(adi_result_object, size=None, overlap=None):
+    """
+    Split a document into overlapping chunks along paragraph boundaries.
+
+    Paragraphs are packed into chunks of up to `size` characters. Each new chunk starts with the
+    trailing paragraphs of the previous one, up to `overlap` characters, so context is not lost at
+    chunk boundaries. Every chunk keeps the page number of its first paragraph.
+
+    Args:
+        adi_result_object: The document analysis result object.
+        size (int): The maximum chunk size in characters.
+        overlap (int): The number of characters carried over between consecutive chunks.
+
+    Returns:
+        list: A list of (page_number, chunk_text) tuples.
+    """
+    size = size or chunk_size
+    overlap = chunk_overlap if overlap is None else overlap
+
+    units = []
+    for page_number, text in get_page_paragraphs(adi_result_object):
+        if len(text) > size:
+            units.extend((page_number, piece) for piece in split_text(text, size, overlap))
+        else:
+            units.append((page_number, text))
+
+    chunks = []
+    current = []
+    current_length = 0
+    for page_number, text in units:
+        if current and current_length + len(text) + 1 > size:
+            chunks.append((current[0][0], "\n".join(unit_text for _, unit_text in current)))
+
+            # Carry the trailing paragraphs over as overlap, leaving room for the next paragraph
+            carried = []
+            carried_length = 0
+            for unit in reversed(current):
+                if carried_length + len(unit[1]) > overlap or carried_length + len(unit[1]) + len(text) + 2 > size:
+                    break
+                carried.insert(0, unit)
+                carried_length += len(unit[1]) + 1
+            current, current_length = carried, carried_length
+
+        current.append((page_number, text))
+        current_length += len(text) + 1
+
+    if current:
+        chunks.append((current[0][0], "\n".join(unit_text for _, unit_text in current)))
+    return chunks
 
 def create_index():
     try:
@@ -154,77 +230,104 @@ def create_index():
     result = search_index_client.create_or_update_index(index)
     print("Index has been created")
 
-def generate_document_id(blob_name):
-    """Generate a unique, deterministic ID for a document."""
-    unique_string = f"{blob_name}"
+def generate_document_id(blob_name, chunk_index=0):
+    """Generate a unique, deterministic ID for a document chunk."""
+    unique_string = f"{blob_name}|{chunk_index}"
     return hashlib.md5(unique_string.encode()).hexdigest()
 
-def list_blobs_in_folder(container_client, folder_name):
-    return [blob for blob in container_client.list_blobs() if blob.name.startswith(folder_name)]
+def legacy_document_ids(blob_name):
+    """IDs earlier versions indexed a blob under, as a single whole-document entry."""
+    return [hashlib.md5(blob_name.encode()).hexdigest()]
+
+def list_blobs_in_folder(container_client, folder_name, results_per_page=5000):
+    """Stream the blobs under a folder; the prefix is filtered server-side and pages are fetched lazily."""
+    yield from container_client.list_blobs(name_starts_with=folder_name, results_per_page=results_per_page)
 
 def move_blob(container_client, source_blob_name, destination_blob_name):
     source_blob = container_client.get_blob_client(source_blob_name)
     destination_blob = container_client.get_blob_client(destination_blob_name)
     
-    destination_blob.start_copy_from_url(source_blob.url)
+    copy = destination_blob.start_copy_from_url(source_blob.url)
+    # Only delete the source once the server-side copy has completed
+    wait_for_copy(destination_blob, copy)
     source_blob.delete_blob()
 
-def populate_index():
+def prepare_document(blob_name):
+    """Analyze one document and build an index document (without the vector) for each of its chunks."""
+    print(f"Processing {blob_name}")
+    adi_result_object = read_pdf(blob_name)
+    chunks = chunk_document(adi_result_object)
+    current_date = datetime.now(timezone.utc).isoformat()
+    fileName = os.path.basename(blob_name)
+    print(f"Split {blob_name} into {len(chunks)} chunks")
+
+    prepared = []
+    for chunk_index, (page_number, chunk_text) in enumerate(chunks):
+        document = {
+            "id": generate_document_id(blob_name, chunk_index),
+            "date": current_date,
+            "content": chunk_text,
+            "sourceFileName": fileName,
+            "sourceFilePage": page_number
+        }
+        prepared.append((document, chunk_text))
+    return prepared
+
+def populate_index(full=False):
+    """Index new or changed blobs in the 'source' folder and remove index entries for deleted blobs."""
     print("Populating index...")
     container_client = blob_service_client.get_container_client(container_name)
     
+    # Blobs are streamed into the pipeline as the listing pages arrive
     stage_blobs = list_blobs_in_folder(container_client, "source/")
-    print(f"Found {len(stage_blobs)} blobs in the 'source' folder")
-    
-    for blob in stage_blobs:
-        print(f"Processing {blob.name}")
-        
-        try:
-            full_text = read_pdf(blob.name)
-            searchVector = generate_embeddings(full_text)
-            current_date = datetime.now(timezone.utc).isoformat()
-            document_id = generate_document_id(blob.name)
-            fileName = os.path.basename(blob.name)
-            
-            # For simplicity, setting page number to 1
-            # You might want to modify this based on your actual PDF parsing logic
-            page_number = 1
-            
-            document = {
-                "id": document_id,
-                "date": current_date,
-                "content": full_text,
-                "sourceFileName": fileName,
-                "sourceFilePage": page_number,
-                "searchVector": searchVector
-            }
-            
-            search_client.upload_documents(documents=[document])
-            
-            # Move the processed file to the 'processed' folder
-            destination_blob_name = blob.name.replace("source/", "processed/")
-            move_blob(container_client, blob.name, destination_blob_name)
-            
-            print(f"Successfully processed and moved {blob.name}")
-        
-        except Exception as e:
-            print(f"Error processing {blob.name}: {str(e)}")
+
+    pipeline = IndexingPipeline(
+        search_client,
+        prepare=prepare_document,
+        prepare_workers=indexing_workers,
+        upload_workers=indexing_upload_workers,
+        upload_batch_size=indexing_upload_batch_size
+    )
+    manifest = IndexingManifest(os.path.join(indexing_manifest_dir, f"{ai_search_index}.json"))
+    # Blobs indexed before documents were chunked have a whole-document entry to replace
+    run_incremental(pipeline, manifest, stage_blobs, full=full, legacy_ids=legacy_document_ids)
 
 def reset_processed_files():
-    """Move all files from the 'processed' folder back to the 'source' folder."""
+    """
+    Move all files from the 'processed' folder back to the 'source' folder.
+
+    Earlier versions of this script moved indexed blobs to 'processed/'. The incremental indexer
+    leaves blobs in 'source/', so this is only needed once to migrate those older blobs.
+    """
     container_client = blob_service_client.get_container_client(container_name)
     
     processed_blobs = list_blobs_in_folder(container_client, "processed/")
     
-    for blob in processed_blobs:
+    def move_back(blob):
         source_blob_name = blob.name
         destination_blob_name = source_blob_name.replace("processed/", "source/")
         
         try:
+            # Move the blob back to the 'source' folder
             move_blob(container_client, source_blob_name, destination_blob_name)
+            return True
         except Exception as e:
             print(f"Error moving {source_blob_name} back to 'source': {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=indexing_workers) as executor:
+        results = list(executor.map(move_back, processed_blobs))
+    print(f"Moved {sum(results)} of {len(results)} blobs back to 'source'")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index new or changed documents into Azure AI Search.")
+    parser.add_argument("--full", action="store_true", help="re-index every document, ignoring the local manifest")
+    parser.add_argument("--migrate-processed", action="store_true",
+                        help="first move blobs left in 'processed/' by earlier versions back to 'source/'")
+    args = parser.parse_args()
+
+    if args.migrate_processed:
+        reset_processed_files()
+
     create_index()
-    populate_index()
\ No newline at end of file
+    populate_index(full=args.full)
@@ -0,0 +1,83 @@
+"""
+Profile the backend's startup time.
+
+Imports `app` in a fresh interpreter with `python -X importtime`, then reports the total time until
+the Flask app is importable and the modules that contribute most to it, both by cumulative time
+(a module plus everything it imports) and by self time. Route-module preloading is disabled for the
+measurement so the report reflects what happens before the server can accept its first request.
+
+Usage:
+    python scripts/profile-startup.py [--top 25] [--module app]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def profile_import(module_name):
+    """
+    Import a backend module in a subprocess and collect its import-time profile.
+
+    Returns:
+        tuple: (wall_seconds, rows) where rows are (self_us, cumulative_us, depth, module) tuples.
+    """
+    env = dict(os.environ, PRELOAD_ROUTE_MODULES="false")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        # Import failures are reported after the timing lines; show the traceback
+        sys.stderr.write(result.stderr.split("import time:")[-1])
+        raise SystemExit(f"Importing {module_name} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return wall_seconds, rows
+
+
+def top_level_package(module):
+    return module.split(".")[0]
+
+
+def report(module_name, wall_seconds, rows, top):
+    print(f"Importing '{module_name}' took {wall_seconds:.2f}s wall time "
+          f"(including interpreter startup), {len(rows)} modules imported")
+
+    print(f"\nTop {top} modules by cumulative import time:")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {name}")
+
+    print(f"\nTop {top} modules by self import time:")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: row[0], reverse=True)[:top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+
+    packages = {}
+    for self_us, _, _, name in rows:
+        package = top_level_package(name)
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"\nTop {top} packages by total self import time:")
+    for package, total_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {total_us / 1000:9.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report where backend startup time is spent.")
+    parser.add_argument("--module", default="app", help="backend module to import (default: app)")
+    parser.add_argument("--top", type=int, default=25, help="number of entries per table")
+    args = parser.parse_args()
+
+    wall_seconds, rows = profile_import(args.module)
+    report(args.module, wall_seconds, rows, args.top)
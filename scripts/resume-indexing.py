@@ -29,9 +29,7 @@ import os
 from dotenv import load_dotenv  
 from azure.core.credentials import AzureKeyCredential  
 
-from openai import AzureOpenAI  
 import os
-from langchain_openai import AzureChatOpenAI
 import itertools
 
 
@@ -44,6 +42,15 @@ from azure.core.credentials import AzureKeyCredential
 import tiktoken
 from dotenv import load_dotenv 
 import requests
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+# Make the shared backend modules (common/*) importable from this script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from common.adls import wait_for_copy
+from common.llm_router import BATCH, RoutedChatModel
+from indexing_pipeline import IndexingManifest, IndexingPipeline, run_incremental
 
 load_dotenv()
 
@@ -58,10 +65,11 @@ ai_search_endpoint = os.environ["AZURE_SEARCH_ENDPOINT"]
 ai_search_key = os.environ["AZURE_SEARCH_KEY"]
 ai_search_index = os.environ["AZURE_SEARCH_INDEX"]
 
-# Azure OpenAI
-aoai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-aoai_key = os.getenv("AZURE_OPENAI_API_KEY")
-aoai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+# Indexing pipeline settings
+indexing_workers = int(os.getenv("INDEXING_WORKERS", "8"))
+indexing_upload_workers = int(os.getenv("INDEXING_UPLOAD_WORKERS", "2"))
+indexing_upload_batch_size = int(os.getenv("INDEXING_UPLOAD_BATCH_SIZE", "200"))
+indexing_manifest_dir = os.getenv("INDEXING_MANIFEST_DIR", os.path.join(".cache", "indexing"))
 
 endpoint = form_recognizer_endpoint
 credential = AzureKeyCredential(form_recognizer_key)
@@ -71,36 +79,13 @@ document_intelligence_client = DocumentIntelligenceClient(endpoint, credential)
 search_index_client = SearchIndexClient(ai_search_endpoint, AzureKeyCredential(ai_search_key))
 search_client = SearchClient(ai_search_endpoint, ai_search_index, AzureKeyCredential(ai_search_key))
 
-aoai_client = AzureOpenAI(
-        azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT"), 
-        api_key=os.getenv("AZURE_OPENAI_KEY"),  
-        api_version="2023-05-15"
-        )
 
 
 
-primary_llm = AzureChatOpenAI(
-    azure_deployment=aoai_deployment,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=aoai_key,
-    azure_endpoint=aoai_endpoint
-)
+# Indexing is a batch workload: it is routed to the deployments reserved for batch jobs
+primary_llm = RoutedChatModel(BATCH)
 
-primary_llm_json = AzureChatOpenAI(
-    azure_deployment=aoai_deployment,
-    api_version="2024-05-01-preview",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=aoai_key,
-    azure_endpoint=aoai_endpoint,
-    model_kwargs={"response_format": {"type": "json_object"}}
-)
+primary_llm_json = RoutedChatModel(BATCH, json_mode=True)
 
 resume_indexing_prompt = """You are an AI assistant. Your job is to read the input resume, 
 and output certain info in valid JSON format. Here is what you should be extracting:
@@ -163,9 +148,6 @@ Assistant: {'experienceLevel': 'mid', 'jobTitle': 'General Contractor', 'skills_
 
 """
 
-def generate_embeddings(text, model="text-embedding-ada-002"): # model = "deployment_name"
-    return aoai_client.embeddings.create(input = [text], model=model).data[0].embedding
-
 def get_creation_date(pdf_file):
 
         print(f"Attempting to open {pdf_file}")
@@ -274,98 +256,102 @@ def generate_document_id(blob_name):
     unique_string = f"{blob_name}"  # Use first 100 characters of content for uniqueness
     return hashlib.md5(unique_string.encode()).hexdigest()
 
-def list_blobs_in_folder(container_client, folder_name):
-    return [blob for blob in container_client.list_blobs() if blob.name.startswith(folder_name)]
+def list_blobs_in_folder(container_client, folder_name, results_per_page=5000):
+    """Stream the blobs under a folder; the prefix is filtered server-side and pages are fetched lazily."""
+    yield from container_client.list_blobs(name_starts_with=folder_name, results_per_page=results_per_page)
 
 def move_blob(source_container_client, destination_container_client, source_blob_name, destination_blob_name):
     source_blob = source_container_client.get_blob_client(source_blob_name)
     destination_blob = destination_container_client.get_blob_client(destination_blob_name)
     
-    destination_blob.start_copy_from_url(source_blob.url)
+    copy = destination_blob.start_copy_from_url(source_blob.url)
+    # Only delete the source once the server-side copy has completed
+    wait_for_copy(destination_blob, copy)
     source_blob.delete_blob()
 
-def populate_index():
+def prepare_resume(blob_name):
+    """Run layout analysis and LLM extraction for one resume and build its index document (without the vector)."""
+    print(f"Processing {blob_name}")
+    full_text = read_pdf(blob_name)
+    extraction_json = llm_extraction(full_text)
+
+    experienceLevel = extraction_json["experienceLevel"]
+    jobTitle = extraction_json["jobTitle"]
+    skills_and_experience = extraction_json["skills_and_experience"]
+    skills_and_experience_str = ", ".join(skills_and_experience)
+    current_date = datetime.now(timezone.utc).isoformat()
+    document_id = generate_document_id(blob_name)
+    fileName = os.path.basename(blob_name)
+    print(f"Extracted {blob_name}: {jobTitle} ({experienceLevel}) - {skills_and_experience_str}")
+
+    document = {
+        "id": document_id,
+        "date": current_date,
+        "jobTitle": jobTitle,
+        "experienceLevel": experienceLevel,
+        "content": full_text,
+        "sourceFileName": fileName
+    }
+
+    # The search vector is generated from the extracted skills, in batches, by the pipeline
+    return [(document, skills_and_experience_str)]
+
+def populate_index(full=False):
+    """Index new or changed blobs in the 'source' folder and remove index entries for deleted blobs."""
     print("Populating index...")
     blob_service_client = BlobServiceClient.from_connection_string(connect_str)
     container_client = blob_service_client.get_container_client(container_name)
     
+    # Blobs are streamed into the pipeline as the listing pages arrive
     stage_blobs = list_blobs_in_folder(container_client, "source/")
-    print(f"Found {len(stage_blobs)} blobs in the 'source' folder")
-    
-    for blob in stage_blobs:
-        print(f"Processing {blob.name}")
-        print(blob.name)
-        
-        try:
-            full_text = read_pdf(blob.name)
-            extraction_json = llm_extraction(full_text)
 
-            
-            experienceLevel = extraction_json["experienceLevel"]
-            jobTitle = extraction_json["jobTitle"]
-            skills_and_experience = extraction_json["skills_and_experience"]
-            skills_and_experience_str = ", ".join(skills_and_experience)
-            searchVector = generate_embeddings(skills_and_experience_str)
-            current_date = datetime.now(timezone.utc).isoformat()
-            document_id = generate_document_id(blob.name)
-            fileName = os.path.basename(blob.name)
-            print(f"Extracted experience level: {experienceLevel}")
-            print(f"Extracted job title: {jobTitle}")
-            print(f"Extracted skills and experience: {skills_and_experience_str}")
-            print(f"Current date: {current_date}")
-            
-            document = {
-                "id": document_id,
-                "date": current_date,
-                "jobTitle": jobTitle,
-                "experienceLevel": experienceLevel,
-                "content": full_text,
-                "sourceFileName": fileName,
-                "searchVector": searchVector
-            }
-            
-            search_client.upload_documents(documents=[document])
-            
-            # Move the processed file to the 'processed' folder
-            destination_blob_name = blob.name.replace("source/", "processed/")
-            move_blob(container_client, container_client, blob.name, destination_blob_name)
-            
-            print(f"Successfully processed and moved {blob.name}")
-        
-        except Exception as e:
-            print(f"Error processing {blob.name}: {str(e)}")
+    pipeline = IndexingPipeline(
+        search_client,
+        prepare=prepare_resume,
+        prepare_workers=indexing_workers,
+        upload_workers=indexing_upload_workers,
+        upload_batch_size=indexing_upload_batch_size
+    )
+    manifest = IndexingManifest(os.path.join(indexing_manifest_dir, f"{ai_search_index}.json"))
+    run_incremental(pipeline, manifest, stage_blobs, full=full)
 
 def reset_processed_files():
-    """Move all files from the 'processed' folder back to the 'source' folder."""
+    """
+    Move all files from the 'processed' folder back to the 'source' folder.
+
+    Earlier versions of this script moved indexed blobs to 'processed/'. The incremental indexer
+    leaves blobs in 'source/', so this is only needed once to migrate those older blobs.
+    """
     blob_service_client = BlobServiceClient.from_connection_string(connect_str)
     container_client = blob_service_client.get_container_client(container_name)
     
     processed_blobs = list_blobs_in_folder(container_client, "processed/")
     
-    for blob in processed_blobs:
+    def move_back(blob):
         source_blob_name = blob.name
         destination_blob_name = source_blob_name.replace("processed/", "source/")
         
         try:
             # Move the blob back to the 'source' folder
             move_blob(container_client, container_client, source_blob_name, destination_blob_name)
-
+            return True
         except Exception as e:
             print(f"Error moving {source_blob_name} back to 'source': {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=indexing_workers) as executor:
+        results = list(executor.map(move_back, processed_blobs))
+    print(f"Moved {sum(results)} of {len(results)} blobs back to 'source'")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index new or changed documents into Azure AI Search.")
+    parser.add_argument("--full", action="store_true", help="re-index every document, ignoring the local manifest")
+    parser.add_argument("--migrate-processed", action="store_true",
+                        help="first move blobs left in 'processed/' by earlier versions back to 'source/'")
+    args = parser.parse_args()
 
-    #reset_processed_files()
+    if args.migrate_processed:
+        reset_processed_files()
 
     create_index()
-
-    populate_index()
-
-    
-
-    
-    
-
-
-    
-
+    populate_index(full=args.full)